@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Record a module run against a real homeserver, then benchmark it offline.
+
+    # once, against the real homeserver
+    python benchmarks/bench_replay.py record room.json.gz room args.json
+    # as often as needed, without network, at recorded or scaled latency
+    python benchmarks/bench_replay.py replay room.json.gz room args.json --runs 20 --latency 0
+    python benchmarks/bench_replay.py replay room.json.gz room args.json --profile profiles/
+
+``args.json`` holds the module arguments (or pass them inline as JSON). The
+cassette keeps no access token or password, replaying ignores ``matrix_uri``.
+Playbooks record and replay the same way through ``ANSIBLE_MATRIX_CASSETTE``,
+``ANSIBLE_MATRIX_CASSETTE_MODE`` and ``ANSIBLE_MATRIX_CASSETTE_LATENCY``.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import ensure_collection_importable, run_module  # noqa: E402
+
+
+def load_args(value: str) -> Dict[str, Any]:
+    if os.path.exists(value):
+        with open(value) as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("cassette", help="cassette file, gzipped when ending with .gz")
+    parser.add_argument("module", help="module name, e.g. room")
+    parser.add_argument("args", help="module arguments as JSON or path to a JSON file")
+    parser.add_argument("--check", action="store_true", help="run the module in check mode")
+    parser.add_argument("--runs", type=int, default=10, help="replays to time")
+    parser.add_argument("--latency", type=float, default=1.0, help="factor applied to the recorded latency")
+    parser.add_argument("--profile", metavar="DIR", help="profile the first replay into this directory")
+    args = parser.parse_args()
+
+    ensure_collection_importable()
+    from ansible_collections.eraga.matrix.plugins.module_utils.cassette import ANSIBLE_MATRIX_CASSETTE_ENV, \
+        ANSIBLE_MATRIX_CASSETTE_LATENCY_ENV, ANSIBLE_MATRIX_CASSETTE_MODE_ENV
+
+    os.environ[ANSIBLE_MATRIX_CASSETTE_ENV] = args.cassette
+    os.environ[ANSIBLE_MATRIX_CASSETTE_MODE_ENV] = args.mode
+    os.environ[ANSIBLE_MATRIX_CASSETTE_LATENCY_ENV] = str(args.latency)
+    module_args = load_args(args.args)
+
+    if args.mode == "record":
+        module_run = run_module(args.module, module_args, check_mode=args.check)
+        print("recorded {} run ({}) in {:.3f} s to {}".format(
+            args.module, module_run.status, module_run.seconds, args.cassette
+        ))
+        sys.exit(1 if module_run.failed else 0)
+
+    seconds = []
+    for i in range(args.runs):
+        module_run = run_module(args.module, module_args, check_mode=args.check,
+                                profile_dir=args.profile if i == 0 else None)
+        if module_run.failed:
+            print("replay {} failed: {}".format(i, module_run.result.get('msg')))
+            sys.exit(1)
+        seconds.append(module_run.seconds)
+
+    print("{} replays of {} at latency x{}: min {:.4f} s, median {:.4f} s, max {:.4f} s".format(
+        args.runs, args.module, args.latency, min(seconds), statistics.median(seconds), max(seconds)
+    ))
+
+
+if __name__ == '__main__':
+    main()
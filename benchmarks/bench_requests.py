@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Request counts and wall time of every module against the mock homeserver.
+
+Each module runs its create, update and no-op scenario (plus check mode) in
+sequence on one seeded MockSynapse, the exact number of requests per scenario
+is what regressions are caught on:
+
+    python benchmarks/bench_requests.py --save baseline.json
+    python benchmarks/bench_requests.py --compare baseline.json
+
+``--compare`` exits with 1 when a scenario needs more requests than recorded
+in the baseline, or fails where it used to succeed.
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import matrix_args, run_module  # noqa: E402
+from mock_synapse import MockSynapse  # noqa: E402
+
+# (module, scenario, module arguments, check mode)
+Scenario = Tuple[str, str, Dict[str, Any], bool]
+
+
+def scenarios(synapse: MockSynapse, members: int) -> List[Scenario]:
+    base = matrix_args(synapse)
+    levels = {"user{}".format(i): 0 for i in range(members)}
+    new_levels = dict(levels, **{"user{}".format(members): 50})
+
+    room_update = dict(base, alias="room0", name="Renamed room", topic="Updated", room_members=new_levels)
+    user_update = dict(base, login="user0", displayname="Renamed user")
+    community_update = dict(base, localpart="bench", name="Bench", description="Updated",
+                            members=["user0", "user1"], rooms=["room0"])
+    space_update = dict(base, localpart="bench_space", name="Bench space", topic="Updated",
+                        rooms=[synapse.aliases[synapse.room_alias("room0")]])
+
+    return [
+        ("room", "create", dict(base, alias="bench_room", name="Bench room", topic="Created",
+                                room_members=levels), False),
+        ("room", "update", room_update, False),
+        ("room", "noop", room_update, False),
+        ("room", "check", dict(base, alias="room0"), True),
+
+        ("send", "text", dict(base, room="room0", text="Hello **world**"), False),
+        ("send", "check", dict(base, room="room0", text="Hello **world**"), True),
+
+        ("user", "update", user_update, False),
+        ("user", "noop", user_update, False),
+        ("user", "check", dict(base, login="user0"), True),
+
+        ("community", "create", dict(base, localpart="bench", name="Bench", description="Created",
+                                     members=["user0"]), False),
+        ("community", "update", community_update, False),
+        ("community", "noop", community_update, False),
+
+        ("space", "create", dict(base, localpart="bench_space", name="Bench space", topic="Created"), False),
+        ("space", "update", space_update, False),
+        ("space", "noop", space_update, False),
+    ]
+
+
+def run(members: int, max_invites: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+    synapse = MockSynapse(max_invites=max_invites)
+    synapse.seed(rooms=1, members=members, users=members + 1)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    with synapse:
+        for module, scenario, args, check_mode in scenarios(synapse, members):
+            synapse.reset_requests()
+            module_run = run_module(module, args, check_mode=check_mode)
+            results["{}/{}".format(module, scenario)] = {
+                'status': module_run.status,
+                'requests': synapse.request_count,
+                'seconds': round(module_run.seconds, 4),
+                'endpoints': dict(sorted(synapse.requests.items())),
+                'msg': module_run.result.get('msg'),
+            }
+
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]]) -> List[str]:
+    regressions = []
+    for key, expected in baseline.items():
+        actual = results.get(key)
+        if actual is None:
+            regressions.append("{}: scenario is gone".format(key))
+            continue
+
+        if actual['requests'] > expected['requests']:
+            regressions.append("{}: went from {} to {} requests".format(key, expected['requests'], actual['requests']))
+
+        if actual['status'] == "failed" and expected['status'] != "failed":
+            regressions.append("{}: fails now with {}".format(key, actual['msg']))
+
+    return regressions
+
+
+def print_table(results: Dict[str, Dict[str, Any]], verbose: bool = False):
+    print("{:<20} {:<8} {:>8} {:>9}".format("scenario", "status", "requests", "seconds"))
+    for key, result in results.items():
+        print("{:<20} {:<8} {:>8} {:>9.3f}".format(key, result['status'], result['requests'], result['seconds']))
+        if verbose:
+            for endpoint, count in result['endpoints'].items():
+                print("    {:>5}  {}".format(count, endpoint))
+            if result['status'] == "failed":
+                print("    {}".format(result['msg']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=100, help="members of the seeded room")
+    parser.add_argument("--max-invites", type=int, default=None, help="createRoom invite limit of the homeserver")
+    parser.add_argument("--save", metavar="FILE", help="write the results as JSON baseline")
+    parser.add_argument("--compare", metavar="FILE", help="fail on regressions against a JSON baseline")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print requests per endpoint")
+    args = parser.parse_args()
+
+    results = run(args.members, args.max_invites)
+    print_table(results, args.verbose)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f))
+        for regression in regressions:
+            print("REGRESSION {}".format(regression))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
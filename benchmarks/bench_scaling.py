@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Scaling curve of the bulk reconciliation paths, 10 to 10k members or children.
+
+Every case and size runs in a subprocess of its own against a fresh
+MockSynapse with injected per-request latency, so that peak RSS is measured
+per size. Time and request count per member must not grow faster than
+linearly between sizes:
+
+    python benchmarks/bench_scaling.py
+    python benchmarks/bench_scaling.py --sizes 10 100 1000 --latency 0.005 --budgets budgets.json
+
+A budgets file caps each case and size, e.g.
+``{"set_power_members": {"10000": {"seconds": 30, "requests": 10010, "rss_mb": 400}}}``.
+The process exits with 1 when scaling is worse than linear or a budget is exceeded.
+Peak RSS includes the in-process stand-in, growth is the increase while the case ran.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import ensure_collection_importable, matrix_client  # noqa: E402
+from mock_synapse import MockSynapse  # noqa: E402
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+
+
+def peak_rss_mb() -> float:
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+async def measured(synapse: MockSynapse, operation: Callable[[], Awaitable[Any]]) -> Dict[str, float]:
+    synapse.reset_requests()
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    await operation()
+    seconds = time.perf_counter() - start
+    rss_peak = peak_rss_mb()
+    return {
+        'seconds': round(seconds, 4),
+        'requests': synapse.request_count,
+        'rss_mb': round(rss_peak, 1),
+        'rss_growth_mb': round(rss_peak - rss_before, 1),
+    }
+
+
+def member_logins(size: int) -> List[str]:
+    return ["user{}".format(i) for i in range(size)]
+
+
+async def set_power_members(synapse: MockSynapse, size: int) -> Dict[str, float]:
+    """Room with the bot alone, every member is invited and gets a power level."""
+    from ansible_collections.eraga.matrix.plugins.module_utils.room import AnsibleMatrixRoom
+
+    synapse.seed(users=size)
+    synapse.add_room(alias="scale", name="Scale")
+
+    room = AnsibleMatrixRoom(matrix_client(synapse), "scale", changes={})
+    async with room:
+        levels = {login: 0 for login in member_logins(size)}
+        return await measured(synapse, lambda: room.set_power_members(levels))
+
+
+async def community_set_members(synapse: MockSynapse, size: int) -> Dict[str, float]:
+    """Community with the bot alone, every member is invited."""
+    from ansible_collections.eraga.matrix.plugins.module_utils.community import AnsibleMatrixCommunity
+
+    synapse.seed(users=size)
+    synapse.add_group("scale", name="Scale")
+
+    community = AnsibleMatrixCommunity(matrix_client(synapse), "scale", changes={})
+    async with community:
+        return await measured(synapse, lambda: community.set_members(member_logins(size)))
+
+
+async def space_update_rooms(synapse: MockSynapse, size: int) -> Dict[str, float]:
+    """Empty space, every room is added as a child by alias."""
+    from ansible_collections.eraga.matrix.plugins.module_utils.space import AnsibleMatrixSpace
+
+    synapse.add_space("scale")
+    aliases = []
+    for i in range(size):
+        synapse.add_room(alias="child{}".format(i))
+        aliases.append(synapse.room_alias("child{}".format(i)))
+
+    space = AnsibleMatrixSpace(matrix_client(synapse), "scale", changes={})
+    async with space:
+        return await measured(synapse, lambda: space._update_rooms(aliases))
+
+
+CASES: Dict[str, Callable[[MockSynapse, int], Awaitable[Dict[str, float]]]] = {
+    'set_power_members': set_power_members,
+    'community_set_members': community_set_members,
+    'space_update_rooms': space_update_rooms,
+}
+
+
+def run_case(case: str, size: int, latency: float) -> Dict[str, float]:
+    ensure_collection_importable()
+    synapse = MockSynapse(latency=latency)
+    with synapse:
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(CASES[case](synapse, size))
+        finally:
+            loop.close()
+
+
+def run_case_subprocess(case: str, size: int, latency: float) -> Dict[str, Any]:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run", case, "--sizes", str(size), "--latency", str(latency)],
+        stdout=subprocess.PIPE, universal_newlines=True
+    )
+    if output.returncode != 0:
+        return {'error': "exit code {}".format(output.returncode)}
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def check(results: Dict[str, Dict[int, Dict[str, Any]]], tolerance: float,
+          budgets: Dict[str, Dict[str, Dict[str, float]]]) -> List[str]:
+    violations = []
+    for case, by_size in results.items():
+        sizes = sorted(size for size in by_size if 'error' not in by_size[size])
+        violations.extend(
+            "{} at {}: {}".format(case, size, by_size[size]['error']) for size in by_size if 'error' in by_size[size]
+        )
+
+        # Cost per member may shrink as fixed overhead amortizes, it must not grow
+        for smaller, larger in zip(sizes, sizes[1:]):
+            for metric in ('seconds', 'requests'):
+                per_unit_small = by_size[smaller][metric] / smaller
+                per_unit_large = by_size[larger][metric] / larger
+                if per_unit_small > 0 and per_unit_large > per_unit_small * tolerance:
+                    violations.append("{} {}: {:.4g} per member at {} vs {:.4g} at {}, worse than linear".format(
+                        case, metric, per_unit_large, larger, per_unit_small, smaller
+                    ))
+
+        for size in sizes:
+            budget = budgets.get(case, {}).get(str(size), {})
+            for metric, key in (('seconds', 'seconds'), ('requests', 'requests'), ('rss_mb', 'rss_mb')):
+                if metric in budget and by_size[size][key] > budget[metric]:
+                    violations.append("{} at {}: {} {} over budget {}".format(
+                        case, size, key, by_size[size][key], budget[metric]
+                    ))
+
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=sorted(CASES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument("--latency", type=float, default=0.001, help="seconds added to every response")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="allowed growth factor of the per-member cost between sizes")
+    parser.add_argument("--budgets", metavar="FILE", help="JSON budgets per case and size")
+    parser.add_argument("--save", metavar="FILE", help="write the results as JSON")
+    parser.add_argument("--run", choices=sorted(CASES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_case(args.run, args.sizes[0], args.latency)))
+        return
+
+    results: Dict[str, Dict[int, Dict[str, Any]]] = {}
+    print("{:<24} {:>6} {:>9} {:>9} {:>9} {:>9}".format("case", "size", "seconds", "requests", "rss_mb", "growth"))
+    for case in args.cases:
+        results[case] = {}
+        for size in sorted(args.sizes):
+            result = results[case][size] = run_case_subprocess(case, size, args.latency)
+            if 'error' in result:
+                print("{:<24} {:>6} {}".format(case, size, result['error']))
+                continue
+            print("{:<24} {:>6} {:>9.3f} {:>9} {:>9.1f} {:>9.1f}".format(
+                case, size, result['seconds'], result['requests'], result['rss_mb'], result['rss_growth_mb']
+            ))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    budgets = {}
+    if args.budgets:
+        with open(args.budgets) as f:
+            budgets = json.load(f)
+
+    violations = check(results, args.tolerance, budgets)
+    for violation in violations:
+        print("FAIL {}".format(violation))
+    if violations:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Send throughput and latency of AnsibleMatrixRoom.send_text and the send module.
+
+Two modes, each against a plain and an encrypted room of the stand-in:
+
+* ``send_text``: one joined client sends ``--messages`` messages, ``--concurrency``
+  at a time. This is the raw per-message cost.
+* ``module``: ``--module-runs`` complete ``eraga.matrix.send`` runs spread over
+  ``--forks`` processes, the way Ansible fans out alert notifications. Every
+  run pays for alias resolution, sync and (encrypted) the crypto store.
+
+    python benchmarks/bench_send.py --latency 0.01 --send-rate 50
+
+Latency percentiles are end to end per message or per module run, 429
+responses of the rate limiter are retried by nio and counted.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import ensure_collection_importable, matrix_args, matrix_client, run_module  # noqa: E402
+from mock_synapse import MockSynapse  # noqa: E402
+
+ROOMS = {
+    'plain': dict(alias="alerts", encrypted=False),
+    'encrypted': dict(alias="alerts_e2e", encrypted=True),
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summary(latencies: List[float], seconds: float, synapse: MockSynapse) -> Dict[str, Any]:
+    return {
+        'count': len(latencies),
+        'seconds': seconds,
+        'per_second': len(latencies) / seconds if seconds else 0.0,
+        'p50': percentile(latencies, 50),
+        'p90': percentile(latencies, 90),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies),
+        'rate_limited': synapse.rate_limited,
+    }
+
+
+async def bench_send_text(synapse: MockSynapse, alias: str, messages: int, concurrency: int,
+                          store_path: Optional[str]) -> Tuple[List[float], float]:
+    ensure_collection_importable()
+    from ansible_collections.eraga.matrix.plugins.module_utils.room import AnsibleMatrixRoom
+
+    room = AnsibleMatrixRoom(matrix_client(synapse, store_path=store_path), alias, changes={})
+    async with room:
+        synapse.reset_requests()
+        latencies: List[float] = []
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send(i: int):
+            async with semaphore:
+                start = time.perf_counter()
+                await room.send_text("Alert {}: **disk full** on `host{}`".format(i, i))
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[send(i) for i in range(messages)])
+        return latencies, time.perf_counter() - start
+
+
+def module_send(args: Dict[str, Any]) -> Tuple[float, str]:
+    module_run = run_module("send", args)
+    return module_run.seconds, module_run.status
+
+
+def bench_module(synapse: MockSynapse, alias: str, runs: int, forks: int,
+                 store_path: Optional[str]) -> Tuple[List[float], float, int]:
+    args = dict(matrix_args(synapse), room=alias, matrix_store_path=store_path)
+    jobs = [dict(args, text="Alert {}: **disk full**".format(i)) for i in range(runs)]
+
+    synapse.reset_requests()
+    start = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(forks) as pool:
+        results = pool.map(module_send, jobs)
+    seconds = time.perf_counter() - start
+
+    failed = len([status for _, status in results if status == "failed"])
+    return [latency for latency, _ in results], seconds, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", nargs="+", choices=sorted(ROOMS), default=sorted(ROOMS))
+    parser.add_argument("--members", type=int, default=50, help="members of each room")
+    parser.add_argument("--messages", type=int, default=500, help="messages sent through send_text")
+    parser.add_argument("--concurrency", type=int, default=10, help="send_text calls in flight")
+    parser.add_argument("--module-runs", type=int, default=50, help="send module runs")
+    parser.add_argument("--forks", type=int, default=5, help="processes running the send module")
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds added to every response")
+    parser.add_argument("--send-rate", type=float, default=None, help="messages per second before 429")
+    parser.add_argument("--send-burst", type=int, default=10, help="messages accepted at once")
+    args = parser.parse_args()
+
+    synapse = MockSynapse(latency=args.latency, send_rate=args.send_rate, send_burst=args.send_burst)
+    synapse.seed(users=args.members)
+    members = {synapse.user_id("user{}".format(i)): 0 for i in range(args.members)}
+    for room in args.rooms:
+        synapse.add_room(name=room, members=members, **ROOMS[room])
+
+    print("{:<10} {:<10} {:>6} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>6}".format(
+        "mode", "room", "count", "seconds", "per_sec", "p50_ms", "p90_ms", "p99_ms", "max_ms", "429s"
+    ))
+
+    def report(mode: str, room: str, result: Dict[str, Any], failed: Optional[int] = None):
+        print("{:<10} {:<10} {:>6} {:>8.2f} {:>8.1f} {:>8.1f} {:>8.1f} {:>8.1f} {:>8.1f} {:>6}{}".format(
+            mode, room, result['count'], result['seconds'], result['per_second'],
+            result['p50'] * 1000, result['p90'] * 1000, result['p99'] * 1000, result['max'] * 1000,
+            result['rate_limited'], " ({} failed)".format(failed) if failed else ""
+        ))
+
+    with synapse, tempfile.TemporaryDirectory(prefix="eraga-matrix-store-") as store:
+        for room in args.rooms:
+            alias = ROOMS[room]['alias']
+            # Only encrypted rooms need the crypto store, and with it its per-bot lock
+            store_path = store if ROOMS[room]['encrypted'] else None
+
+            loop = asyncio.new_event_loop()
+            try:
+                latencies, seconds = loop.run_until_complete(
+                    bench_send_text(synapse, alias, args.messages, args.concurrency, store_path)
+                )
+            finally:
+                loop.close()
+            report("send_text", room, summary(latencies, seconds, synapse))
+
+            latencies, seconds, failed = bench_module(synapse, alias, args.module_runs, args.forks, store_path)
+            report("module", room, summary(latencies, seconds, synapse), failed)
+
+
+if __name__ == '__main__':
+    main()
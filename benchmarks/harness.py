@@ -0,0 +1,122 @@
+"""Run collection modules in-process the way Ansible runs them.
+
+The collection is made importable as ``ansible_collections.eraga.matrix``
+straight from the checkout, module arguments are handed over through
+``_ANSIBLE_ARGS`` and the JSON a module prints on exit is captured.
+"""
+import asyncio
+import contextlib
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def ensure_collection_importable():
+    """Put ``ansible_collections/eraga/matrix`` pointing at this checkout on ``sys.path``."""
+    parts = ROOT.split(os.sep)
+    if parts[-3:-2] == ["ansible_collections"]:
+        path = os.sep.join(parts[:-3])
+    else:
+        path = tempfile.mkdtemp(prefix="eraga-matrix-bench-")
+        namespace = os.path.join(path, "ansible_collections", "eraga")
+        os.makedirs(namespace)
+        os.symlink(ROOT, os.path.join(namespace, "matrix"))
+
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+class ModuleRun(object):
+    def __init__(self, result: Dict[str, Any], seconds: float):
+        self.result = result
+        self.seconds = seconds
+
+    @property
+    def failed(self) -> bool:
+        return bool(self.result.get('failed'))
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.result.get('changed'))
+
+    @property
+    def status(self) -> str:
+        if self.failed:
+            return "failed"
+        return "changed" if self.changed else "ok"
+
+
+def run_module(name: str, args: Dict[str, Any], check_mode: bool = False,
+               profile_dir: Optional[str] = None) -> ModuleRun:
+    """Run ``eraga.matrix.<name>`` with ``args`` in a fresh event loop.
+
+    Exceptions escaping the module are reported as a failed result instead of
+    being raised, the same way Ansible shows a module traceback. With
+    ``profile_dir`` the run is profiled like ``ANSIBLE_MATRIX_PROFILE_DIR`` does.
+    """
+    ensure_collection_importable()
+    from ansible.module_utils import basic
+    from ansible.module_utils.common.text.converters import to_bytes
+    from ansible_collections.eraga.matrix.plugins.module_utils.profiling import AnsibleMatrixProfiler
+
+    module = importlib.import_module("ansible_collections.eraga.matrix.plugins.modules.{}".format(name))
+
+    module_args = dict(args)
+    module_args['_ansible_check_mode'] = check_mode
+    module_args['_ansible_remote_tmp'] = tempfile.gettempdir()
+    module_args['_ansible_keep_remote_files'] = False
+    basic._ANSIBLE_ARGS = to_bytes(json.dumps({'ANSIBLE_MODULE_ARGS': module_args}))
+
+    stdout = io.StringIO()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    result: Optional[Dict[str, Any]] = None
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(stdout), \
+                AnsibleMatrixProfiler(profile_dir, name) if profile_dir else contextlib.ExitStack():
+            loop.run_until_complete(module.run_module())
+    except SystemExit:
+        pass
+    except Exception as e:
+        result = {'failed': True, 'msg': "{}: {}".format(type(e).__name__, e)}
+    finally:
+        seconds = time.perf_counter() - start
+        loop.close()
+
+    if result is None:
+        output = stdout.getvalue().strip()
+        result = json.loads(output[output.index("{"):]) if "{" in output else {'failed': True, 'msg': "no output"}
+
+    return ModuleRun(result, seconds)
+
+
+def matrix_args(synapse) -> Dict[str, Any]:
+    """Connection arguments shared by every module, pointing at a started MockSynapse."""
+    return {
+        'matrix_uri': synapse.uri,
+        'matrix_user': synapse.bot,
+        'matrix_domain': synapse.domain,
+        'matrix_token': synapse.token,
+    }
+
+
+def matrix_client(synapse, **kwargs):
+    """AnsibleMatrixClient authenticated as the bot of a started MockSynapse."""
+    ensure_collection_importable()
+    from ansible_collections.eraga.matrix.plugins.module_utils.client_model import AnsibleMatrixClient
+
+    return AnsibleMatrixClient(
+        domain=synapse.domain,
+        uri=synapse.uri,
+        token=synapse.token,
+        user=synapse.bot,
+        **kwargs
+    )
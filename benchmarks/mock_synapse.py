@@ -0,0 +1,1026 @@
+"""In-process stand-in for a Synapse homeserver.
+
+Implements the client, media, groups and admin endpoints the modules of this
+collection call, backed by plain dictionaries. Every request is counted per
+route, which is what the benchmarks compare between releases.
+
+The server runs in a thread of its own with a private event loop, so module
+code can run in the main thread exactly as Ansible runs it, ``sys.exit`` and all.
+
+    synapse = MockSynapse(domain="example.com")
+    synapse.seed(rooms=10, members=100)
+    with synapse:
+        ...  # point matrix_uri at synapse.uri
+    print(synapse.requests)
+
+Sync always returns the full state of every joined room, ``since`` is ignored.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+CLIENT = "/_matrix/client/{version}"
+MEDIA = "/_matrix/media/{version}"
+ADMIN_V1 = "/_synapse/admin/v1"
+ADMIN_V2 = "/_synapse/admin/v2"
+
+# Endpoints reachable without an access token
+PUBLIC_PREFIXES = ("directory/", "download/")
+
+
+def matrix_error(status: int, errcode: str, error: str) -> web.Response:
+    return web.json_response({"errcode": errcode, "error": error}, status=status)
+
+
+class MockRoom(object):
+    """Room state as a map of (event type, state key) to the latest state event."""
+
+    def __init__(self, room_id: str):
+        self.room_id = room_id
+        self.state: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.timeline: List[Dict[str, Any]] = []
+
+    def content(self, event_type: str, state_key: str = "") -> Dict[str, Any]:
+        event = self.state.get((event_type, state_key))
+        return event["content"] if event is not None else {}
+
+    def members(self, membership: str = "join") -> List[str]:
+        return [
+            key for (event_type, key), event in self.state.items()
+            if event_type == "m.room.member" and event["content"].get("membership") == membership
+        ]
+
+    def membership(self, mxid: str) -> Optional[str]:
+        return self.content("m.room.member", mxid).get("membership")
+
+    @property
+    def room_type(self) -> Optional[str]:
+        return self.content("m.room.create").get("type")
+
+
+class MockSynapse(object):
+    def __init__(self,
+                 domain: str = "example.com",
+                 bot: str = "ansiblebot",
+                 token: str = "mock-access-token",
+                 max_invites: Optional[int] = None,
+                 latency: float = 0.0,
+                 send_rate: Optional[float] = None,
+                 send_burst: int = 10):
+        """
+        Args:
+            domain: Server name, local users and aliases live under it.
+            bot: Localpart of the admin account the modules authenticate as.
+            token: Access token accepted for the bot.
+            max_invites: Refuse createRoom requests inviting more users, like Synapse does.
+            latency: Seconds every response is delayed by.
+            send_rate: Messages per second accepted before answering 429 M_LIMIT_EXCEEDED.
+            send_burst: Messages accepted at once before the send rate applies.
+        """
+        self.domain = domain
+        self.bot = "@{}:{}".format(bot, domain)
+        self.token = token
+        self.max_invites = max_invites
+        self.latency = latency
+        self.send_rate = send_rate
+        self.send_burst = send_burst
+        self._send_allowance = float(send_burst)
+        self._send_checked = time.monotonic()
+        self.rate_limited = 0
+
+        self.rooms: Dict[str, MockRoom] = {}
+        self.aliases: Dict[str, str] = {}
+        self.public_rooms = set()
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.groups: Dict[str, Dict[str, Any]] = {}
+        self.media: Dict[str, Tuple[bytes, str, str]] = {}
+        self.transactions: Dict[Tuple[str, str], str] = {}
+        self.one_time_keys = 0
+
+        self.requests: Counter = Counter()
+        self._ids = itertools.count(1)
+
+        self.uri: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.add_user(self.bot, admin=True)
+        self.app = self._build_app()
+
+    # Seeding
+
+    def _next_id(self) -> int:
+        return next(self._ids)
+
+    def user_id(self, localpart: str) -> str:
+        if localpart.startswith("@") and ":" in localpart:
+            return localpart
+        return "@{}:{}".format(localpart, self.domain)
+
+    def add_user(self, mxid: str, displayname: Optional[str] = None, admin: bool = False,
+                 deactivated: bool = False) -> str:
+        mxid = self.user_id(mxid)
+        self.users[mxid] = {
+            "name": mxid,
+            "displayname": displayname if displayname is not None else mxid[1:].split(":")[0],
+            "threepids": [],
+            "avatar_url": None,
+            "admin": admin,
+            "deactivated": deactivated,
+            "is_guest": False,
+            "shadow_banned": False,
+            "user_type": None,
+            "creation_ts": int(time.time()),
+            "appservice_id": None,
+            "consent_server_notice_sent": None,
+            "consent_version": None,
+        }
+        return mxid
+
+    def add_room(self,
+                 alias: Optional[str] = None,
+                 name: Optional[str] = None,
+                 topic: Optional[str] = None,
+                 members: Optional[Dict[str, int]] = None,
+                 encrypted: bool = False,
+                 room_type: Optional[str] = None,
+                 room_id: Optional[str] = None,
+                 bot_joined: bool = True) -> str:
+        """Create a room directly, without counting requests.
+
+        ``members`` maps Matrix IDs to power levels, every member is joined.
+        """
+        room_id = room_id or "!r{}:{}".format(self._next_id(), self.domain)
+        creator = self.bot if bot_joined else next(iter(members or {}), self.bot)
+
+        create = {"creator": creator, "room_version": "9"}
+        if room_type is not None:
+            create["type"] = room_type
+
+        room = MockRoom(room_id)
+        self.rooms[room_id] = room
+
+        levels = {creator: 100}
+        levels.update(members or {})
+        self._put_state(room, creator, "m.room.create", create)
+        self._put_state(room, creator, "m.room.member", {"membership": "join"}, creator)
+        self._put_state(room, creator, "m.room.power_levels", self._default_power_levels(levels))
+        self._put_state(room, creator, "m.room.join_rules", {"join_rule": "invite"})
+        self._put_state(room, creator, "m.room.history_visibility", {"history_visibility": "shared"})
+        if name is not None:
+            self._put_state(room, creator, "m.room.name", {"name": name})
+        if topic is not None:
+            self._put_state(room, creator, "m.room.topic", {"topic": topic})
+        if encrypted:
+            self._put_state(room, creator, "m.room.encryption", {"algorithm": "m.megolm.v1.aes-sha2"})
+        if alias is not None:
+            alias = self.room_alias(alias)
+            self.aliases[alias] = room_id
+            self._put_state(room, creator, "m.room.canonical_alias", {"alias": alias})
+
+        for mxid in members or {}:
+            if mxid not in self.users and mxid.endswith(":" + self.domain):
+                self.add_user(mxid)
+            self._put_state(room, mxid, "m.room.member", {"membership": "join"}, mxid)
+
+        return room_id
+
+    def add_space(self, localpart: str, children: int = 0, name: Optional[str] = None,
+                  members: Optional[Dict[str, int]] = None) -> str:
+        """Space with the ``!localpart:domain`` ID the space module expects and ``children`` child rooms."""
+        space_id = self.add_room(
+            name=name or localpart, room_type="m.space", members=members,
+            room_id="!{}:{}".format(localpart, self.domain)
+        )
+        for i in range(children):
+            self.add_child(space_id, self.add_room(name="{} child {}".format(localpart, i)))
+        return space_id
+
+    def add_child(self, space_id: str, child_id: str, suggested: bool = False):
+        self._put_state(self.rooms[space_id], self.bot, "m.space.child",
+                        {"via": [self.domain], "suggested": suggested}, child_id)
+
+    def add_group(self, localpart: str, name: Optional[str] = None, rooms: List[str] = (),
+                  users: List[str] = ()) -> str:
+        group_id = self.group_id(localpart)
+        self.groups[group_id] = {
+            "profile": {
+                "name": name or localpart,
+                "short_description": None,
+                "long_description": None,
+                "avatar_url": None,
+                "is_public": True,
+                "is_openly_joinable": False,
+            },
+            "rooms": list(rooms),
+            "users": [self.bot] + [self.user_id(user) for user in users],
+            "invited": [],
+        }
+        return group_id
+
+    def seed(self, rooms: int = 0, members: int = 0, users: int = 0, spaces: int = 0, children: int = 0):
+        """Bulk seed ``room{i}`` rooms with ``members`` members each, ``space{i}`` spaces with
+        ``children`` child rooms each and at least ``users`` accounts named ``user{i}``."""
+        for i in range(max(users, members)):
+            self.add_user("user{}".format(i))
+
+        member_levels = {self.user_id("user{}".format(i)): 0 for i in range(members)}
+        for i in range(rooms):
+            self.add_room(alias="room{}".format(i), name="Room {}".format(i), members=member_levels)
+
+        for i in range(spaces):
+            self.add_space("space{}".format(i), children=children)
+
+    def room_alias(self, alias: str) -> str:
+        if alias.startswith("#") and ":" in alias:
+            return alias
+        return "#{}:{}".format(alias, self.domain)
+
+    def group_id(self, localpart: str) -> str:
+        if localpart.startswith("+") and ":" in localpart:
+            return localpart
+        return "+{}:{}".format(localpart, self.domain)
+
+    @staticmethod
+    def _default_power_levels(users: Dict[str, int]) -> Dict[str, Any]:
+        return {
+            "users": dict(users),
+            "users_default": 0,
+            "events": {
+                "m.room.name": 50,
+                "m.room.power_levels": 100,
+                "m.room.history_visibility": 100,
+                "m.room.canonical_alias": 50,
+                "m.room.avatar": 50,
+                "m.room.tombstone": 100,
+                "m.room.server_acl": 100,
+                "m.room.encryption": 100,
+            },
+            "events_default": 0,
+            "state_default": 50,
+            "ban": 50,
+            "kick": 50,
+            "redact": 50,
+            "invite": 0,
+            "notifications": {"room": 50},
+        }
+
+    def _event(self, room: MockRoom, sender: str, event_type: str, content: Dict[str, Any],
+               state_key: Optional[str] = None) -> Dict[str, Any]:
+        event = {
+            "event_id": "$e{}".format(self._next_id()),
+            "room_id": room.room_id,
+            "sender": sender,
+            "type": event_type,
+            "content": content,
+            "origin_server_ts": int(time.time() * 1000),
+            "unsigned": {"age": 0},
+        }
+        if state_key is not None:
+            event["state_key"] = state_key
+        room.timeline.append(event)
+        return event
+
+    def _put_state(self, room: MockRoom, sender: str, event_type: str, content: Dict[str, Any],
+                   state_key: str = "") -> Dict[str, Any]:
+        event = self._event(room, sender, event_type, content, state_key)
+        room.state[(event_type, state_key)] = event
+        return event
+
+    def _resolve_room(self, room_id_or_alias: str) -> Optional[MockRoom]:
+        if room_id_or_alias.startswith("#"):
+            room_id_or_alias = self.aliases.get(room_id_or_alias, "")
+        return self.rooms.get(room_id_or_alias)
+
+    def joined_rooms(self, mxid: str) -> List[str]:
+        return [room_id for room_id, room in self.rooms.items() if room.membership(mxid) == "join"]
+
+    # Lifecycle
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve from a background thread, return the homeserver URI."""
+        ready = threading.Event()
+        failure: List[BaseException] = []
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            runner = web.AppRunner(self.app, access_log=None)
+            try:
+                self._loop.run_until_complete(runner.setup())
+                site = web.TCPSite(runner, host, port)
+                self._loop.run_until_complete(site.start())
+                bound_port = site._server.sockets[0].getsockname()[1]
+                self.uri = "http://{}:{}".format(host, bound_port)
+            except BaseException as e:
+                failure.append(e)
+                ready.set()
+                return
+
+            ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=serve, name="mock-synapse", daemon=True)
+        self._thread.start()
+        ready.wait()
+        if failure:
+            raise failure[0]
+        return self.uri
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def reset_requests(self):
+        self.requests.clear()
+        self.rate_limited = 0
+
+    @property
+    def request_count(self) -> int:
+        return sum(self.requests.values())
+
+    # Routing
+
+    def _build_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware], client_max_size=64 * 1024 ** 2)
+        add = app.router.add_route
+
+        add("GET", CLIENT + "/account/whoami", self.whoami)
+        add("GET", CLIENT + "/sync", self.sync)
+        add("GET", CLIENT + "/joined_rooms", self.get_joined_rooms)
+        add("POST", CLIENT + "/join/{room}", self.join)
+        add("POST", CLIENT + "/createRoom", self.create_room)
+        add("GET", CLIENT + "/directory/room/{alias}", self.resolve_alias)
+        add("GET", CLIENT + "/directory/list/room/{room_id}", self.get_visibility)
+        add("PUT", CLIENT + "/directory/list/room/{room_id}", self.put_visibility)
+        add("GET", CLIENT + "/rooms/{room_id}/state", self.get_state)
+        add("GET", CLIENT + "/rooms/{room_id}/state/{event_type}", self.get_state_event)
+        add("GET", CLIENT + "/rooms/{room_id}/state/{event_type}/{state_key}", self.get_state_event)
+        add("PUT", CLIENT + "/rooms/{room_id}/state/{event_type}", self.put_state)
+        add("PUT", CLIENT + "/rooms/{room_id}/state/{event_type}/{state_key}", self.put_state)
+        add("PUT", CLIENT + "/rooms/{room_id}/send/{event_type}/{txn_id}", self.send_event)
+        add("POST", CLIENT + "/rooms/{room_id}/invite", self.invite)
+        add("POST", CLIENT + "/rooms/{room_id}/kick", self.kick)
+        add("POST", CLIENT + "/rooms/{room_id}/leave", self.leave)
+        add("POST", CLIENT + "/rooms/{room_id}/read_markers", self.ok)
+        add("GET", CLIENT + "/rooms/{room_id}/joined_members", self.joined_members)
+        add("GET", CLIENT + "/rooms/{room_id}/hierarchy", self.hierarchy)
+        add("POST", CLIENT + "/keys/upload", self.keys_upload)
+        add("POST", CLIENT + "/keys/query", self.keys_query)
+        add("POST", CLIENT + "/keys/claim", self.keys_claim)
+        add("PUT", CLIENT + "/sendToDevice/{event_type}/{txn_id}", self.ok)
+
+        add("POST", CLIENT + "/create_group", self.create_group)
+        add("GET", CLIENT + "/groups/{group_id}/summary", self.group_summary)
+        add("GET", CLIENT + "/groups/{group_id}/rooms", self.group_rooms)
+        add("GET", CLIENT + "/groups/{group_id}/users", self.group_users)
+        add("GET", CLIENT + "/groups/{group_id}/invited_users", self.group_invited_users)
+        add("POST", CLIENT + "/groups/{group_id}/profile", self.group_profile)
+        add("PUT", CLIENT + "/groups/{group_id}/admin/rooms/{room_id}", self.group_add_room)
+        add("DELETE", CLIENT + "/groups/{group_id}/admin/rooms/{room_id}", self.group_remove_room)
+        add("PUT", CLIENT + "/groups/{group_id}/admin/users/invite/{user_id}", self.group_invite)
+        add("PUT", CLIENT + "/groups/{group_id}/admin/users/remove/{user_id}", self.group_remove)
+
+        for prefix in (MEDIA, CLIENT + "/media"):
+            add("POST", prefix + "/upload", self.upload)
+            add("GET", prefix + "/download/{server}/{media_id}", self.download)
+            add("GET", prefix + "/download/{server}/{media_id}/{filename}", self.download)
+
+        add("GET", ADMIN_V1 + "/rooms", self.admin_rooms)
+        add("GET", ADMIN_V1 + "/rooms/{room_id}", self.admin_room)
+        add("GET", ADMIN_V1 + "/rooms/{room_id}/state", self.admin_room_state)
+        add("POST", ADMIN_V1 + "/rooms/{room_id}/delete", self.admin_delete_room)
+        add("POST", ADMIN_V1 + "/rooms/{room_id}/make_room_admin", self.admin_make_room_admin)
+        add("POST", ADMIN_V1 + "/join/{room}", self.admin_join)
+        add("GET", ADMIN_V1 + "/whois/{user_id}", self.admin_whois)
+        add("GET", ADMIN_V1 + "/users/{user_id}/joined_rooms", self.admin_joined_rooms)
+        add("POST", ADMIN_V1 + "/delete_group/{group_id}", self.admin_delete_group)
+        add("GET", ADMIN_V2 + "/users", self.admin_users)
+        add("GET", ADMIN_V2 + "/users/{user_id}", self.admin_user)
+        add("PUT", ADMIN_V2 + "/users/{user_id}", self.admin_put_user)
+
+        return app
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource is not None else request.path
+        self.requests["{} {}".format(request.method, route)] += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if resource is None:
+            return matrix_error(404, "M_UNRECOGNIZED", "Unrecognized request")
+
+        if not self._authorized(request):
+            return matrix_error(401, "M_UNKNOWN_TOKEN", "Invalid access token")
+
+        return await handler(request)
+
+    def _authorized(self, request: web.Request) -> bool:
+        header = request.headers.get("Authorization", "")
+        token = header[len("Bearer "):] if header.startswith("Bearer ") else request.query.get("access_token")
+        if token is None:
+            return request.method == "GET" and any(prefix in request.path for prefix in PUBLIC_PREFIXES)
+        return token == self.token
+
+    @staticmethod
+    async def _body(request: web.Request) -> Dict[str, Any]:
+        if not request.can_read_body:
+            return {}
+        text = await request.text()
+        return json.loads(text) if text else {}
+
+    async def ok(self, request: web.Request) -> web.Response:
+        return web.json_response({})
+
+    # Client API
+
+    async def whoami(self, request: web.Request) -> web.Response:
+        return web.json_response({"user_id": self.bot})
+
+    async def sync(self, request: web.Request) -> web.Response:
+        join = {}
+        invite = {}
+        for room_id, room in self.rooms.items():
+            membership = room.membership(self.bot)
+            if membership == "join":
+                join[room_id] = {
+                    "state": {"events": list(room.state.values())},
+                    "timeline": {"events": room.timeline[-1:], "limited": True, "prev_batch": "p0"},
+                    "ephemeral": {"events": []},
+                    "account_data": {"events": []},
+                    "summary": {
+                        "m.joined_member_count": len(room.members("join")),
+                        "m.invited_member_count": len(room.members("invite")),
+                    },
+                    "unread_notifications": {"notification_count": 0, "highlight_count": 0},
+                }
+            elif membership == "invite":
+                invite[room_id] = {"invite_state": {"events": [
+                    {k: event[k] for k in ("type", "state_key", "content", "sender")}
+                    for event in room.state.values()
+                ]}}
+
+        return web.json_response({
+            "next_batch": "s{}".format(self._next_id()),
+            "rooms": {"join": join, "invite": invite, "leave": {}},
+            "presence": {"events": []},
+            "account_data": {"events": []},
+            "to_device": {"events": []},
+            "device_lists": {"changed": [], "left": []},
+            "device_one_time_keys_count": {"signed_curve25519": self.one_time_keys},
+        })
+
+    async def get_joined_rooms(self, request: web.Request) -> web.Response:
+        return web.json_response({"joined_rooms": self.joined_rooms(self.bot)})
+
+    async def join(self, request: web.Request) -> web.Response:
+        room = self._resolve_room(request.match_info["room"])
+        if room is None:
+            return matrix_error(404, "M_NOT_FOUND", "No known servers")
+        # The bot is a server admin in the stand-in and may join any room
+        if room.membership(self.bot) != "join":
+            self._put_state(room, self.bot, "m.room.member", {"membership": "join"}, self.bot)
+        return web.json_response({"room_id": room.room_id})
+
+    async def create_room(self, request: web.Request) -> web.Response:
+        body = await self._body(request)
+
+        alias = None
+        if body.get("room_alias_name"):
+            alias = self.room_alias(body["room_alias_name"])
+            if alias in self.aliases:
+                return matrix_error(400, "M_ROOM_IN_USE", "Room alias already taken")
+
+        invite = body.get("invite") or []
+        if self.max_invites is not None and len(invite) > self.max_invites:
+            return matrix_error(400, "M_INVALID_PARAM", "Cannot invite so many users at once")
+
+        preset = body.get("preset") or (
+            "public_chat" if body.get("visibility") == "public" else "private_chat"
+        )
+
+        room = MockRoom("!r{}:{}".format(self._next_id(), self.domain))
+        self.rooms[room.room_id] = room
+
+        create = {"creator": self.bot, "room_version": body.get("room_version", "9")}
+        create.update(body.get("creation_content") or {})
+        self._put_state(room, self.bot, "m.room.create", create)
+        self._put_state(room, self.bot, "m.room.member", {"membership": "join"}, self.bot)
+
+        levels = {self.bot: 100}
+        if preset == "trusted_private_chat":
+            levels.update({mxid: 100 for mxid in invite})
+        power_levels = self._default_power_levels(levels)
+        power_levels.update(body.get("power_level_content_override") or {})
+        self._put_state(room, self.bot, "m.room.power_levels", power_levels)
+
+        if alias is not None:
+            self.aliases[alias] = room.room_id
+            self._put_state(room, self.bot, "m.room.canonical_alias", {"alias": alias})
+
+        self._put_state(room, self.bot, "m.room.join_rules",
+                        {"join_rule": "public" if preset == "public_chat" else "invite"})
+        self._put_state(room, self.bot, "m.room.history_visibility", {"history_visibility": "shared"})
+
+        if body.get("name") is not None:
+            self._put_state(room, self.bot, "m.room.name", {"name": body["name"]})
+        if body.get("topic") is not None:
+            self._put_state(room, self.bot, "m.room.topic", {"topic": body["topic"]})
+
+        for event in body.get("initial_state") or []:
+            self._put_state(room, self.bot, event["type"], event["content"], event.get("state_key", ""))
+
+        for mxid in invite:
+            self._put_state(room, self.bot, "m.room.member", {"membership": "invite"}, mxid)
+
+        if body.get("visibility") == "public":
+            self.public_rooms.add(room.room_id)
+
+        return web.json_response({"room_id": room.room_id})
+
+    async def resolve_alias(self, request: web.Request) -> web.Response:
+        alias = request.match_info["alias"]
+        if alias not in self.aliases:
+            return matrix_error(404, "M_NOT_FOUND", "Room alias {} not found".format(alias))
+        return web.json_response({"room_id": self.aliases[alias], "servers": [self.domain]})
+
+    async def get_visibility(self, request: web.Request) -> web.Response:
+        room_id = request.match_info["room_id"]
+        if room_id not in self.rooms:
+            return matrix_error(404, "M_NOT_FOUND", "Unknown room")
+        return web.json_response({"visibility": "public" if room_id in self.public_rooms else "private"})
+
+    async def put_visibility(self, request: web.Request) -> web.Response:
+        room_id = request.match_info["room_id"]
+        if room_id not in self.rooms:
+            return matrix_error(404, "M_NOT_FOUND", "Unknown room")
+        if (await self._body(request)).get("visibility") == "public":
+            self.public_rooms.add(room_id)
+        else:
+            self.public_rooms.discard(room_id)
+        return web.json_response({})
+
+    def _joined_room(self, request: web.Request) -> Tuple[Optional[MockRoom], Optional[web.Response]]:
+        room = self.rooms.get(request.match_info["room_id"])
+        if room is None:
+            return None, matrix_error(404, "M_NOT_FOUND", "Unknown room")
+        if room.membership(self.bot) != "join":
+            return None, matrix_error(403, "M_FORBIDDEN", "You are not in room {}".format(room.room_id))
+        return room, None
+
+    async def get_state(self, request: web.Request) -> web.Response:
+        room, error = self._joined_room(request)
+        if error is not None:
+            return error
+        return web.json_response(list(room.state.values()))
+
+    async def get_state_event(self, request: web.Request) -> web.Response:
+        room, error = self._joined_room(request)
+        if error is not None:
+            return error
+        key = (request.match_info["event_type"], request.match_info.get("state_key", ""))
+        if key not in room.state:
+            return matrix_error(404, "M_NOT_FOUND", "Event not found.")
+        return web.json_response(room.state[key]["content"])
+
+    async def put_state(self, request: web.Request) -> web.Response:
+        room, error = self._joined_room(request)
+        if error is not None:
+            return error
+        event = self._put_state(
+            room, self.bot, request.match_info["event_type"], await self._body(request),
+            request.match_info.get("state_key", "")
+        )
+        return web.json_response({"event_id": event["event_id"]})
+
+    def _rate_limit(self) -> Optional[web.Response]:
+        """Token bucket of ``send_rate`` messages per second holding up to ``send_burst``."""
+        if self.send_rate is None:
+            return None
+
+        now = time.monotonic()
+        self._send_allowance = min(
+            float(self.send_burst), self._send_allowance + (now - self._send_checked) * self.send_rate
+        )
+        self._send_checked = now
+        if self._send_allowance >= 1:
+            self._send_allowance -= 1
+            return None
+
+        self.rate_limited += 1
+        return web.json_response({
+            "errcode": "M_LIMIT_EXCEEDED",
+            "error": "Too Many Requests",
+            "retry_after_ms": int((1 - self._send_allowance) / self.send_rate * 1000) + 1,
+        }, status=429)
+
+    async def send_event(self, request: web.Request) -> web.Response:
+        room, error = self._joined_room(request)
+        if error is not None:
+            return error
+
+        limited = self._rate_limit()
+        if limited is not None:
+            return limited
+
+        # Same access token and transaction ID return the original event
+        txn = (self.token, request.match_info["txn_id"])
+        if txn not in self.transactions:
+            event = self._event(room, self.bot, request.match_info["event_type"], await self._body(request))
+            self.transactions[txn] = event["event_id"]
+        return web.json_response({"event_id": self.transactions[txn]})
+
+    async def invite(self, request: web.Request) -> web.Response:
+        room, error = self._joined_room(request)
+        if error is not None:
+            return error
+        mxid = (await self._body(request))["user_id"]
+        if room.membership(mxid) == "join":
+            return matrix_error(403, "M_FORBIDDEN", "{} is already in the room.".format(mxid))
+        self._put_state(room, self.bot, "m.room.member", {"membership": "invite"}, mxid)
+        return web.json_response({})
+
+    async def kick(self, request: web.Request) -> web.Response:
+        room, error = self._joined_room(request)
+        if error is not None:
+            return error
+        body = await self._body(request)
+        if room.membership(body["user_id"]) not in ("join", "invite"):
+            return matrix_error(403, "M_FORBIDDEN", "The target user is not in the room")
+        self._put_state(room, self.bot, "m.room.member",
+                        {"membership": "leave", "reason": body.get("reason")}, body["user_id"])
+        return web.json_response({})
+
+    async def leave(self, request: web.Request) -> web.Response:
+        room = self.rooms.get(request.match_info["room_id"])
+        if room is not None and room.membership(self.bot) in ("join", "invite"):
+            self._put_state(room, self.bot, "m.room.member", {"membership": "leave"}, self.bot)
+        return web.json_response({})
+
+    async def joined_members(self, request: web.Request) -> web.Response:
+        room, error = self._joined_room(request)
+        if error is not None:
+            return error
+        return web.json_response({"joined": {
+            mxid: {
+                "display_name": room.content("m.room.member", mxid).get("displayname"),
+                "avatar_url": room.content("m.room.member", mxid).get("avatar_url"),
+            }
+            for mxid in room.members("join")
+        }})
+
+    def _hierarchy_room(self, room: MockRoom) -> Dict[str, Any]:
+        return {
+            "room_id": room.room_id,
+            "name": room.content("m.room.name").get("name"),
+            "topic": room.content("m.room.topic").get("topic"),
+            "canonical_alias": room.content("m.room.canonical_alias").get("alias"),
+            "avatar_url": room.content("m.room.avatar").get("url"),
+            "room_type": room.room_type,
+            "join_rule": room.content("m.room.join_rules").get("join_rule"),
+            "num_joined_members": len(room.members("join")),
+            "world_readable": False,
+            "guest_can_join": False,
+            "children_state": [
+                {
+                    "type": event["type"],
+                    "state_key": event["state_key"],
+                    "content": event["content"],
+                    "sender": event["sender"],
+                    "origin_server_ts": event["origin_server_ts"],
+                }
+                for (event_type, _), event in room.state.items()
+                if event_type == "m.space.child" and event["content"].get("via")
+            ],
+        }
+
+    async def hierarchy(self, request: web.Request) -> web.Response:
+        """Direct children only, deeper levels are walked by the caller with max_depth=1."""
+        space = self.rooms.get(request.match_info["room_id"])
+        if space is None:
+            return matrix_error(404, "M_NOT_FOUND", "Unknown room")
+
+        suggested_only = request.query.get("suggested_only") == "true"
+        limit = int(request.query.get("limit", 50))
+        offset = int(request.query.get("from", 0))
+
+        children = [
+            self.rooms[state_key]
+            for (event_type, state_key), event in space.state.items()
+            if event_type == "m.space.child" and event["content"].get("via")
+            and state_key in self.rooms
+            and (not suggested_only or event["content"].get("suggested"))
+        ]
+
+        page = [] if offset else [self._hierarchy_room(space)]
+        page.extend(self._hierarchy_room(child) for child in children[offset:offset + limit])
+
+        response = {"rooms": page}
+        if offset + limit < len(children):
+            response["next_batch"] = str(offset + limit)
+        return web.json_response(response)
+
+    async def keys_upload(self, request: web.Request) -> web.Response:
+        self.one_time_keys += len((await self._body(request)).get("one_time_keys") or {})
+        return web.json_response({"one_time_key_counts": {"signed_curve25519": self.one_time_keys}})
+
+    async def keys_query(self, request: web.Request) -> web.Response:
+        users = (await self._body(request)).get("device_keys") or {}
+        return web.json_response({"device_keys": {user: {} for user in users}, "failures": {}})
+
+    async def keys_claim(self, request: web.Request) -> web.Response:
+        return web.json_response({"one_time_keys": {}, "failures": {}})
+
+    # Groups (communities)
+
+    def _group(self, request: web.Request) -> Tuple[Optional[Dict[str, Any]], Optional[web.Response]]:
+        group = self.groups.get(request.match_info["group_id"])
+        if group is None:
+            return None, matrix_error(404, "M_UNKNOWN", "Group does not exist")
+        return group, None
+
+    async def create_group(self, request: web.Request) -> web.Response:
+        body = await self._body(request)
+        group_id = self.group_id(body["localpart"])
+        if group_id in self.groups:
+            return matrix_error(400, "M_UNKNOWN", "Group already exists")
+        self.add_group(body["localpart"], name=(body.get("profile") or {}).get("name"))
+        return web.json_response({"group_id": group_id})
+
+    async def group_summary(self, request: web.Request) -> web.Response:
+        group, error = self._group(request)
+        if error is not None:
+            return error
+        return web.json_response({
+            "profile": group["profile"],
+            "users_section": {"users": [], "roles": {}, "total_user_count_estimate": len(group["users"])},
+            "rooms_section": {"rooms": [], "categories": {}, "total_room_count_estimate": len(group["rooms"])},
+            "user": {"membership": "join", "is_publicised": False, "is_public": True, "is_privileged": True},
+        })
+
+    async def group_rooms(self, request: web.Request) -> web.Response:
+        group, error = self._group(request)
+        if error is not None:
+            return error
+        return web.json_response({
+            "chunk": [{"room_id": room_id, "is_public": True} for room_id in group["rooms"]],
+            "total_room_count_estimate": len(group["rooms"]),
+        })
+
+    async def group_users(self, request: web.Request) -> web.Response:
+        group, error = self._group(request)
+        if error is not None:
+            return error
+        return web.json_response({
+            "chunk": [{"user_id": mxid, "is_public": True, "is_privileged": mxid == self.bot}
+                      for mxid in group["users"]],
+            "total_user_count_estimate": len(group["users"]),
+        })
+
+    async def group_invited_users(self, request: web.Request) -> web.Response:
+        group, error = self._group(request)
+        if error is not None:
+            return error
+        return web.json_response({
+            "chunk": [{"user_id": mxid} for mxid in group["invited"]],
+            "total_user_count_estimate": len(group["invited"]),
+        })
+
+    async def group_profile(self, request: web.Request) -> web.Response:
+        group, error = self._group(request)
+        if error is not None:
+            return error
+        group["profile"].update(await self._body(request))
+        return web.json_response({})
+
+    async def group_add_room(self, request: web.Request) -> web.Response:
+        group, error = self._group(request)
+        if error is not None:
+            return error
+        room = self._resolve_room(request.match_info["room_id"])
+        if room is None:
+            return matrix_error(404, "M_NOT_FOUND", "Unknown room")
+        if room.room_id not in group["rooms"]:
+            group["rooms"].append(room.room_id)
+        return web.json_response({})
+
+    async def group_remove_room(self, request: web.Request) -> web.Response:
+        group, error = self._group(request)
+        if error is not None:
+            return error
+        room = self._resolve_room(request.match_info["room_id"])
+        if room is not None and room.room_id in group["rooms"]:
+            group["rooms"].remove(room.room_id)
+        return web.json_response({})
+
+    async def group_invite(self, request: web.Request) -> web.Response:
+        group, error = self._group(request)
+        if error is not None:
+            return error
+        mxid = request.match_info["user_id"]
+        if mxid not in group["users"] and mxid not in group["invited"]:
+            group["invited"].append(mxid)
+        return web.json_response({"state": "invite"})
+
+    async def group_remove(self, request: web.Request) -> web.Response:
+        group, error = self._group(request)
+        if error is not None:
+            return error
+        mxid = request.match_info["user_id"]
+        for key in ("users", "invited"):
+            if mxid in group[key]:
+                group[key].remove(mxid)
+        return web.json_response({})
+
+    # Media
+
+    async def upload(self, request: web.Request) -> web.Response:
+        media_id = "m{}".format(self._next_id())
+        self.media[media_id] = (
+            await request.read(),
+            request.headers.get("Content-Type", "application/octet-stream"),
+            request.query.get("filename", media_id),
+        )
+        return web.json_response({"content_uri": "mxc://{}/{}".format(self.domain, media_id)})
+
+    async def download(self, request: web.Request) -> web.Response:
+        media = self.media.get(request.match_info["media_id"])
+        if request.match_info["server"] != self.domain or media is None:
+            return matrix_error(404, "M_NOT_FOUND", "Not found")
+        body, content_type, filename = media
+        return web.Response(body=body, headers={
+            "Content-Type": content_type,
+            "Content-Disposition": 'inline; filename="{}"'.format(filename),
+        })
+
+    # Admin API
+
+    def _room_details(self, room: MockRoom) -> Dict[str, Any]:
+        create = room.content("m.room.create")
+        joined = room.members("join")
+        return {
+            "room_id": room.room_id,
+            "name": room.content("m.room.name").get("name"),
+            "topic": room.content("m.room.topic").get("topic"),
+            "avatar": room.content("m.room.avatar").get("url"),
+            "canonical_alias": room.content("m.room.canonical_alias").get("alias"),
+            "joined_members": len(joined),
+            "joined_local_members": len([mxid for mxid in joined if mxid.endswith(":" + self.domain)]),
+            "joined_local_devices": 0,
+            "version": create.get("room_version"),
+            "creator": create.get("creator"),
+            "encryption": room.content("m.room.encryption").get("algorithm"),
+            "federatable": create.get("m.federate", True),
+            "public": room.room_id in self.public_rooms,
+            "join_rules": room.content("m.room.join_rules").get("join_rule"),
+            "guest_access": room.content("m.room.guest_access").get("guest_access"),
+            "history_visibility": room.content("m.room.history_visibility").get("history_visibility"),
+            "state_events": len(room.state),
+            "room_type": room.room_type,
+        }
+
+    async def admin_rooms(self, request: web.Request) -> web.Response:
+        offset = int(request.query.get("from", 0))
+        limit = int(request.query.get("limit", 100))
+        search_term = request.query.get("search_term")
+
+        rooms = [self._room_details(room) for room in self.rooms.values()]
+        if search_term:
+            rooms = [
+                room for room in rooms
+                if search_term in (room["name"] or "") or search_term in (room["canonical_alias"] or "")
+                or search_term == room["room_id"]
+            ]
+
+        response = {"rooms": rooms[offset:offset + limit], "offset": offset, "total_rooms": len(rooms)}
+        if offset + limit < len(rooms):
+            response["next_batch"] = offset + limit
+        if offset:
+            response["prev_batch"] = max(0, offset - limit)
+        return web.json_response(response)
+
+    async def admin_room(self, request: web.Request) -> web.Response:
+        room = self.rooms.get(request.match_info["room_id"])
+        if room is None:
+            return matrix_error(404, "M_NOT_FOUND", "Room not found")
+        return web.json_response(self._room_details(room))
+
+    async def admin_room_state(self, request: web.Request) -> web.Response:
+        room = self.rooms.get(request.match_info["room_id"])
+        if room is None:
+            return matrix_error(404, "M_NOT_FOUND", "Room not found")
+        return web.json_response({"state": list(room.state.values())})
+
+    async def admin_delete_room(self, request: web.Request) -> web.Response:
+        room = self.rooms.pop(request.match_info["room_id"], None)
+        if room is None:
+            return matrix_error(404, "M_NOT_FOUND", "Room not found")
+        aliases = [alias for alias, room_id in self.aliases.items() if room_id == room.room_id]
+        for alias in aliases:
+            del self.aliases[alias]
+        self.public_rooms.discard(room.room_id)
+        return web.json_response({
+            "kicked_users": room.members("join"),
+            "failed_to_kick_users": [],
+            "local_aliases": aliases,
+            "new_room_id": None,
+        })
+
+    async def admin_make_room_admin(self, request: web.Request) -> web.Response:
+        room = self.rooms.get(request.match_info["room_id"])
+        if room is None:
+            return matrix_error(404, "M_NOT_FOUND", "Room not found")
+        mxid = (await self._body(request)).get("user_id", self.bot)
+        power_levels = dict(room.content("m.room.power_levels"))
+        power_levels["users"] = dict(power_levels.get("users", {}), **{mxid: 100})
+        self._put_state(room, mxid, "m.room.member", {"membership": "join"}, mxid)
+        self._put_state(room, mxid, "m.room.power_levels", power_levels)
+        return web.json_response({})
+
+    async def admin_join(self, request: web.Request) -> web.Response:
+        room = self._resolve_room(request.match_info["room"])
+        if room is None:
+            return matrix_error(404, "M_NOT_FOUND", "Room not found")
+        mxid = (await self._body(request))["user_id"]
+        if mxid not in self.users:
+            return matrix_error(404, "M_NOT_FOUND", "User not found")
+        if room.membership(mxid) != "join":
+            self._put_state(room, mxid, "m.room.member", {"membership": "join"}, mxid)
+        return web.json_response({"room_id": room.room_id})
+
+    async def admin_whois(self, request: web.Request) -> web.Response:
+        mxid = request.match_info["user_id"]
+        if mxid not in self.users:
+            return matrix_error(404, "M_NOT_FOUND", "User not found")
+        return web.json_response({"user_id": mxid, "devices": {"": {"sessions": [{"connections": [{
+            "ip": "127.0.0.1",
+            "last_seen": self.users[mxid]["creation_ts"] * 1000,
+            "user_agent": "mock-synapse",
+        }]}]}}})
+
+    async def admin_joined_rooms(self, request: web.Request) -> web.Response:
+        mxid = request.match_info["user_id"]
+        if mxid not in self.users:
+            return matrix_error(404, "M_NOT_FOUND", "User not found")
+        rooms = self.joined_rooms(mxid)
+        return web.json_response({"joined_rooms": rooms, "total": len(rooms)})
+
+    async def admin_delete_group(self, request: web.Request) -> web.Response:
+        if self.groups.pop(request.match_info["group_id"], None) is None:
+            return matrix_error(404, "M_UNKNOWN", "Group does not exist")
+        return web.json_response({})
+
+    async def admin_users(self, request: web.Request) -> web.Response:
+        offset = int(request.query.get("from", 0))
+        limit = int(request.query.get("limit", 100))
+        name = request.query.get("name")
+        deactivated = request.query.get("deactivated") == "true"
+        admins = request.query.get("admins")
+
+        users = [
+            user for user in self.users.values()
+            if (deactivated or not user["deactivated"])
+            and (name is None or name in user["name"] or name in (user["displayname"] or ""))
+            and (admins is None or user["admin"] == (admins == "true"))
+        ]
+
+        response = {"users": users[offset:offset + limit], "total": len(users)}
+        if offset + limit < len(users):
+            response["next_token"] = str(offset + limit)
+        return web.json_response(response)
+
+    async def admin_user(self, request: web.Request) -> web.Response:
+        mxid = request.match_info["user_id"]
+        if mxid not in self.users:
+            return matrix_error(404, "M_NOT_FOUND", "User not found")
+        return web.json_response(self.users[mxid])
+
+    async def admin_put_user(self, request: web.Request) -> web.Response:
+        mxid = request.match_info["user_id"]
+        body = await self._body(request)
+        created = mxid not in self.users
+        if created:
+            self.add_user(mxid)
+        self.users[mxid].update({k: v for k, v in body.items() if k in self.users[mxid]})
+        return web.json_response(self.users[mxid], status=201 if created else 200)
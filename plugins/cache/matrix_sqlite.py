@@ -0,0 +1,102 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+DOCUMENTATION = '''
+name: matrix_sqlite
+short_description: SQLite backed cache with Matrix room and user snapshots
+description:
+    - Stores cache entries in a local SQLite database
+    - Entries produced by the C(eraga.matrix.matrix) inventory plugin are additionally
+      normalized into room and account snapshots, indexed by room ID, alias and Matrix ID,
+      which C(eraga.matrix.room), C(eraga.matrix.user) and C(eraga.matrix.space) read
+      when pointed at the same database with C(snapshot_db)
+options:
+    _uri:
+        required: true
+        description: Path to the SQLite database file
+        env:
+            - name: ANSIBLE_CACHE_PLUGIN_CONNECTION
+        ini:
+            - key: fact_caching_connection
+              section: defaults
+        type: path
+    _prefix:
+        description: Prefix to use for cache keys
+        env:
+            - name: ANSIBLE_CACHE_PLUGIN_PREFIX
+        ini:
+            - key: fact_caching_prefix
+              section: defaults
+    _timeout:
+        default: 86400
+        description: Expiration timeout in seconds for the cache entries, 0 never expires
+        env:
+            - name: ANSIBLE_CACHE_PLUGIN_TIMEOUT
+        ini:
+            - key: fact_caching_timeout
+              section: defaults
+        type: integer
+'''
+
+from ansible.plugins.cache import BaseCacheModule
+
+from ansible_collections.eraga.matrix.plugins.module_utils.snapshot import AnsibleMatrixSnapshots, \
+    room_record_to_snapshot
+
+
+class CacheModule(BaseCacheModule):
+
+    def __init__(self, *args, **kwargs):
+        super(CacheModule, self).__init__(*args, **kwargs)
+        timeout = float(self.get_option('_timeout'))
+        self._ttl = timeout if timeout > 0 else None
+        self._prefix = self.get_option('_prefix') or ''
+        self._store = AnsibleMatrixSnapshots(self.get_option('_uri'))
+
+    def _key(self, key):
+        return self._prefix + key
+
+    def _index(self, value):
+        # Inventory results of eraga.matrix.matrix
+        if not isinstance(value, dict):
+            return
+
+        for room in value.get('rooms') or []:
+            if isinstance(room, dict) and 'room_id' in room:
+                self._store.put_room(room['room_id'], room.get('canonical_alias'), room_record_to_snapshot(room))
+
+        for user in value.get('users') or []:
+            if isinstance(user, dict) and 'mxid' in user:
+                self._store.put_user(user['mxid'], user)
+
+    def get(self, key):
+        value = self._store.get(self._key(key), self._ttl)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def set(self, key, value):
+        self._store.put(self._key(key), value)
+        self._index(value)
+
+    def keys(self):
+        return [key[len(self._prefix):] for key in self._store.keys(self._ttl) if key.startswith(self._prefix)]
+
+    def contains(self, key):
+        return self._store.get(self._key(key), self._ttl) is not None
+
+    def delete(self, key):
+        self._store.delete(self._key(key))
+
+    def flush(self):
+        self._store.flush()
+
+    def copy(self):
+        return dict((key, self.get(key)) for key in self.keys())
+
+    def __getstate__(self):
+        return dict()
+
+    def __setstate__(self, data):
+        self.__init__()
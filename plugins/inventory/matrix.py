@@ -0,0 +1,186 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+DOCUMENTATION = '''
+name: matrix
+short_description: Matrix homeserver rooms, spaces and users as inventory
+description:
+    - Builds an inventory from the rooms and accounts of a Synapse homeserver
+    - Rooms are grouped by the spaces referencing them, users by admin and deactivated flags
+    - Room and user listings are fetched concurrently through the Synapse admin API
+    - Uses a YAML configuration file that ends with C(matrix.yml) or C(matrix.yaml)
+extends_documentation_fragment:
+    - constructed
+    - inventory_cache
+options:
+    plugin:
+        description: Token that ensures this is a source file for the plugin
+        required: true
+        choices: [ eraga.matrix.matrix ]
+    matrix_uri:
+        description: Matrix homeserver URI
+        required: true
+        type: str
+    matrix_user:
+        description: Matrix user to authenticate as
+        required: false
+        type: str
+    matrix_token:
+        description: Access token of a homeserver admin
+        required: true
+        type: str
+        env:
+            - name: MATRIX_TOKEN
+    matrix_domain:
+        description: Matrix server domain
+        required: true
+        type: str
+    rooms:
+        description: Add rooms and spaces as hosts
+        default: true
+        type: bool
+    users:
+        description: Add accounts as hosts
+        default: true
+        type: bool
+    deactivated:
+        description: Include deactivated accounts
+        default: false
+        type: bool
+    page_size:
+        description: Number of records requested per admin API page
+        default: 500
+        type: int
+    concurrency:
+        description: Space state reads and account enrichment requests sent to the homeserver at once
+        default: 10
+        type: int
+'''
+
+EXAMPLES = '''
+# matrix.yml
+plugin: eraga.matrix.matrix
+matrix_uri: "https://matrix.example.com"
+matrix_domain: example.com
+cache: yes
+cache_plugin: ansible.builtin.jsonfile
+cache_connection: ~/.cache/ansible-matrix
+cache_timeout: 3600
+keyed_groups:
+  - key: matrix_room.join_rules
+    prefix: join_rule
+'''
+
+import asyncio
+import re
+
+from ansible.errors import AnsibleParserError
+from ansible.plugins.inventory import BaseInventoryPlugin, Cacheable, Constructable
+
+from ansible_collections.eraga.matrix.plugins.module_utils.admin import AnsibleMatrixAdmin
+from ansible_collections.eraga.matrix.plugins.module_utils.client_model import AnsibleMatrixClient
+from ansible_collections.eraga.matrix.plugins.module_utils.errors import AnsibleMatrixError
+
+
+class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
+    NAME = 'eraga.matrix.matrix'
+
+    def verify_file(self, path):
+        return super(InventoryModule, self).verify_file(path) and \
+            re.search(r"matrix\.ya?ml$", path) is not None
+
+    async def _fetch_rooms(self, admin: AnsibleMatrixAdmin):
+        rooms = [room async for room in admin.iter_rooms()]
+        spaces = [room['room_id'] for room in rooms if room.get('room_type') == "m.space"]
+        return rooms, await admin.spaces_children(spaces)
+
+    async def _fetch_users(self, admin: AnsibleMatrixAdmin):
+        return [user.dict() async for user in admin.iter_users(deactivated=self.get_option('deactivated'))]
+
+    async def _fetch(self):
+        matrix_client = AnsibleMatrixClient(
+            domain=self.get_option('matrix_domain'),
+            uri=self.get_option('matrix_uri'),
+            token=self.get_option('matrix_token'),
+            user=self.get_option('matrix_user')
+        )
+
+        async with AnsibleMatrixAdmin(matrix_client, page_size=self.get_option('page_size'),
+                                      concurrency=self.get_option('concurrency')) as admin:
+            fetch_rooms = self._fetch_rooms(admin) if self.get_option('rooms') else asyncio.sleep(0, ([], {}))
+            fetch_users = self._fetch_users(admin) if self.get_option('users') else asyncio.sleep(0, [])
+            (rooms, spaces), users = await asyncio.gather(fetch_rooms, fetch_users)
+
+        return {
+            'rooms': rooms,
+            'spaces': spaces,
+            'users': users
+        }
+
+    def _add_host(self, name, group, hostvars):
+        self.inventory.add_host(name, group=group)
+        self.inventory.set_variable(name, 'ansible_connection', 'local')
+        for k, v in hostvars.items():
+            self.inventory.set_variable(name, k, v)
+
+        strict = self.get_option('strict')
+        self._set_composite_vars(self.get_option('compose'), hostvars, name, strict=strict)
+        self._add_host_to_composed_groups(self.get_option('groups'), hostvars, name, strict=strict)
+        self._add_host_to_keyed_groups(self.get_option('keyed_groups'), hostvars, name, strict=strict)
+
+    def _populate(self, results):
+        rooms_group = self.inventory.add_group('matrix_rooms')
+        spaces_group = self.inventory.add_group('matrix_spaces')
+        users_group = self.inventory.add_group('matrix_users')
+        admins_group = self.inventory.add_group('matrix_admins')
+        deactivated_group = self.inventory.add_group('matrix_deactivated')
+
+        for room in results['rooms']:
+            group = spaces_group if room['room_id'] in results['spaces'] else rooms_group
+            self._add_host(room['room_id'], group, {'matrix_room': room})
+
+        for space_id, children in results['spaces'].items():
+            space_group = self.inventory.add_group(self._sanitize_group_name("space_{}".format(space_id)))
+            self.inventory.add_child(spaces_group, space_group)
+            for room_id in children:
+                # Rooms of other servers referenced by local spaces are not listed by the admin API
+                if room_id in self.inventory.hosts:
+                    self.inventory.add_host(room_id, group=space_group)
+
+        for user in results['users']:
+            self._add_host(user['mxid'], users_group, {'matrix_user': user})
+            if user.get('admin'):
+                self.inventory.add_host(user['mxid'], group=admins_group)
+            if user.get('deactivated'):
+                self.inventory.add_host(user['mxid'], group=deactivated_group)
+
+    def parse(self, inventory, loader, path, cache=True):
+        super(InventoryModule, self).parse(inventory, loader, path, cache)
+        self._read_config_data(path)
+
+        cache_key = self.get_cache_key(path)
+        user_cache_setting = self.get_option('cache')
+        attempt_to_read_cache = user_cache_setting and cache
+        cache_needs_update = user_cache_setting and not cache
+
+        results = None
+        if attempt_to_read_cache:
+            try:
+                results = self._cache[cache_key]
+            except KeyError:
+                cache_needs_update = True
+
+        if results is None:
+            loop = asyncio.new_event_loop()
+            try:
+                results = loop.run_until_complete(self._fetch())
+            except AnsibleMatrixError as e:
+                raise AnsibleParserError("Failed to read Matrix homeserver: {}".format(e))
+            finally:
+                loop.close()
+
+        if cache_needs_update:
+            self._cache[cache_key] = results
+
+        self._populate(results)
@@ -0,0 +1,90 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+DOCUMENTATION = '''
+name: matrix_room
+short_description: Look up Matrix rooms by alias
+description:
+    - Returns the same room dictionary the C(eraga.matrix.room) module registers
+    - Rooms are read through the Synapse admin API, the bot never joins them
+    - All terms are looked up concurrently and every result is memoized in C(snapshot_db)
+      for the rest of the playbook run, across tasks and worker processes
+options:
+    _terms:
+        description: Room alias localparts
+        required: true
+    matrix_uri:
+        description: Matrix homeserver URI
+        required: true
+        type: str
+        vars:
+            - name: matrix_uri
+    matrix_user:
+        description: Matrix user to authenticate as
+        required: false
+        type: str
+        vars:
+            - name: matrix_user
+    matrix_token:
+        description: Access token of a homeserver admin
+        required: true
+        type: str
+        vars:
+            - name: matrix_token
+    matrix_domain:
+        description: Matrix server domain
+        required: true
+        type: str
+        vars:
+            - name: matrix_domain
+    snapshot_db:
+        description:
+            - SQLite database memoizing results, shared by the worker processes of a playbook run
+            - Results are scoped to the playbook run, identified by the controller PID and start time,
+              a new playbook run looks terms up again
+            - Results older than C(memo_ttl) are deleted, secrets such as password hashes are never stored
+        default: ~/.cache/ansible-matrix/lookups.db
+        type: path
+    memo_ttl:
+        description: Seconds a memoized result is used for
+        default: 3600
+        type: float
+'''
+
+EXAMPLES = '''
+- name: Room ID of the general room
+  debug:
+    msg: "{{ lookup('eraga.matrix.matrix_room', 'general').id }}"
+
+- name: Members of several rooms at once
+  debug:
+    msg: "{{ item.users }}"
+  loop: "{{ query('eraga.matrix.matrix_room', 'general', 'random', 'ops') }}"
+'''
+
+RETURN = '''
+_list:
+    description: Room dictionaries, empty for unknown aliases
+    type: list
+    elements: dict
+'''
+
+from ansible.plugins.lookup import LookupBase
+
+from ansible_collections.eraga.matrix.plugins.module_utils.client_model import AnsibleMatrixClient
+from ansible_collections.eraga.matrix.plugins.module_utils.lookup import run_memoized_lookup
+from ansible_collections.eraga.matrix.plugins.module_utils.room import AnsibleMatrixRoom
+
+
+class LookupModule(LookupBase):
+
+    @staticmethod
+    async def _lookup_room(matrix_client: AnsibleMatrixClient, alias: str) -> dict:
+        room = AnsibleMatrixRoom(matrix_client=matrix_client, matrix_room_alias=alias, changes={}, join=False)
+        await room.__aenter__()
+        return room.matrix_room_to_dict()
+
+    def run(self, terms, variables=None, **kwargs):
+        self.set_options(var_options=variables, direct=kwargs)
+        return run_memoized_lookup(self, "room", terms, self._lookup_room)
@@ -0,0 +1,96 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+DOCUMENTATION = '''
+name: matrix_user
+short_description: Look up Matrix accounts by login
+description:
+    - Returns the same account dictionary the C(eraga.matrix.user) module registers
+    - Accounts are read through the Synapse admin API without a sync
+    - All terms are looked up concurrently and every result is memoized in C(snapshot_db)
+      for the rest of the playbook run, across tasks and worker processes
+    - Unknown accounts are returned as empty dictionaries and looked up again by later tasks
+options:
+    _terms:
+        description: User logins or full Matrix IDs
+        required: true
+    matrix_uri:
+        description: Matrix homeserver URI
+        required: true
+        type: str
+        vars:
+            - name: matrix_uri
+    matrix_user:
+        description: Matrix user to authenticate as
+        required: false
+        type: str
+        vars:
+            - name: matrix_user
+    matrix_token:
+        description: Access token of a homeserver admin
+        required: true
+        type: str
+        vars:
+            - name: matrix_token
+    matrix_domain:
+        description: Matrix server domain
+        required: true
+        type: str
+        vars:
+            - name: matrix_domain
+    snapshot_db:
+        description:
+            - SQLite database memoizing results, shared by the worker processes of a playbook run
+            - Results are scoped to the playbook run, identified by the controller PID and start time,
+              a new playbook run looks terms up again
+            - Results older than C(memo_ttl) are deleted, secrets such as password hashes are never stored
+        default: ~/.cache/ansible-matrix/lookups.db
+        type: path
+    memo_ttl:
+        description: Seconds a memoized result is used for
+        default: 3600
+        type: float
+'''
+
+EXAMPLES = '''
+- name: Only admins may own the room
+  assert:
+    that: lookup('eraga.matrix.matrix_user', room_owner).admin
+
+- name: Display names of several accounts at once
+  debug:
+    msg: "{{ query('eraga.matrix.matrix_user', 'maria', 'helga', '@m0rty:example.com') | map(attribute='displayname') }}"
+'''
+
+RETURN = '''
+_list:
+    description: Account dictionaries, empty for unknown accounts
+    type: list
+    elements: dict
+'''
+
+from ansible.plugins.lookup import LookupBase
+
+from ansible_collections.eraga.matrix.plugins.module_utils.client_model import AnsibleMatrixClient
+from ansible_collections.eraga.matrix.plugins.module_utils.lookup import run_memoized_lookup
+from ansible_collections.eraga.matrix.plugins.module_utils.user import AnsibleMatrixAccount, AnsibleMatrixUser
+
+
+class LookupModule(LookupBase):
+
+    @staticmethod
+    async def _lookup_user(matrix_client: AnsibleMatrixClient, login: str) -> dict:
+        user = AnsibleMatrixUser(matrix_client=matrix_client, login=login, changes={})
+        response = await matrix_client.send_json("GET", user._api_user_path)
+        if response.status == 404:
+            return {}
+        response.raise_for_status()
+
+        account = AnsibleMatrixAccount.from_dict(await response.json())
+        account.mxid = user.mxid
+        return account.dict()
+
+    def run(self, terms, variables=None, **kwargs):
+        self.set_options(var_options=variables, direct=kwargs)
+        return run_memoized_lookup(self, "user", terms, self._lookup_user)
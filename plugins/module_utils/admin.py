@@ -0,0 +1,280 @@
+import asyncio
+import hashlib
+import json
+import os
+import stat
+import tempfile
+from typing import AsyncIterator, Callable, Iterable
+from urllib.parse import urlencode
+
+from ansible_collections.eraga.matrix.plugins.module_utils.client_model import _AnsibleMatrixObject
+from ansible_collections.eraga.matrix.plugins.module_utils.client_model import *
+from ansible_collections.eraga.matrix.plugins.module_utils.utils import file_sha256
+
+# Per-user enrichment requests in flight at once
+DEFAULT_ENRICH_CONCURRENCY = 10
+
+# Fields of the admin room list kept in compact room records
+ROOM_RECORD_FIELDS = (
+    'room_id', 'name', 'canonical_alias', 'joined_members', 'joined_local_members',
+    'version', 'creator', 'encryption', 'federatable', 'public', 'join_rules',
+    'guest_access', 'history_visibility', 'state_events', 'room_type'
+)
+
+
+class AnsibleMatrixUserRecord(object):
+    """Compact user record of the admin user list.
+
+    Slotted on purpose: audits hold tens of thousands of these at once.
+    """
+    __slots__ = (
+        'mxid', 'displayname', 'avatar_url', 'admin', 'deactivated', 'is_guest',
+        'shadow_banned', 'user_type', 'creation_ts', 'last_seen', 'joined_rooms'
+    )
+
+    def __init__(self, entry: Dict[str, Any]):
+        self.mxid: str = entry['name']
+        self.displayname: Optional[str] = entry.get('displayname')
+        self.avatar_url: Optional[str] = entry.get('avatar_url')
+        self.admin: bool = bool(entry.get('admin'))
+        self.deactivated: bool = bool(entry.get('deactivated'))
+        self.is_guest: bool = bool(entry.get('is_guest'))
+        self.shadow_banned: bool = bool(entry.get('shadow_banned'))
+        self.user_type: Optional[str] = entry.get('user_type')
+        self.creation_ts: int = entry.get('creation_ts') or 0
+        self.last_seen: Optional[int] = None
+        self.joined_rooms: Optional[List[str]] = None
+
+    def dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__ if getattr(self, k) is not None}
+
+
+class AnsibleMatrixJsonLines(object):
+    """JSON lines file of listing records, replaced only when its content changes.
+
+    Records go to a temporary file next to ``path``, which replaces it on
+    ``commit`` when the content differs. In check mode nothing is written,
+    the records are only hashed to tell whether the file would change.
+    """
+
+    def __init__(self, path: str, check_mode: bool = False):
+        self.path = os.path.expanduser(path)
+        self.digest = hashlib.sha256()
+        self._tmp = None
+        if not check_mode:
+            directory, name = os.path.split(self.path)
+            self._tmp = tempfile.NamedTemporaryFile(
+                "w", dir=directory or ".", prefix=".{}.".format(name), delete=False
+            )
+
+    def write(self, record: Dict[str, Any]):
+        line = json.dumps(record, separators=(',', ':')) + "\n"
+        self.digest.update(line.encode())
+        if self._tmp is not None:
+            self._tmp.write(line)
+
+    def commit(self) -> bool:
+        """Replace the file if its content changed, return whether it did."""
+        changed = not os.path.exists(self.path) or file_sha256(self.path) != self.digest.hexdigest()
+        if self._tmp is not None:
+            self._tmp.close()
+            if changed:
+                # Temporary files are private, the file keeps its mode or gets the umask default
+                if os.path.exists(self.path):
+                    mode = stat.S_IMODE(os.stat(self.path).st_mode)
+                else:
+                    umask = os.umask(0)
+                    os.umask(umask)
+                    mode = 0o666 & ~umask
+                os.chmod(self._tmp.name, mode)
+                os.replace(self._tmp.name, self.path)
+            else:
+                os.unlink(self._tmp.name)
+            self._tmp = None
+        return changed
+
+    def discard(self):
+        if self._tmp is not None:
+            self._tmp.close()
+            os.unlink(self._tmp.name)
+            self._tmp = None
+
+
+def room_filter(
+        empty: Optional[bool] = None,
+        encrypted: Optional[bool] = None,
+        public: Optional[bool] = None,
+        federatable: Optional[bool] = None,
+        min_members: Optional[int] = None,
+        max_members: Optional[int] = None) -> Callable[[Dict[str, Any]], bool]:
+    """Build a client side predicate for entries of the admin room list.
+
+    Every criterion left as None is not checked.
+    """
+
+    def accept(room: Dict[str, Any]) -> bool:
+        members = room.get('joined_members') or 0
+        if empty is not None and (members == 0) != empty:
+            return False
+        if encrypted is not None and (room.get('encryption') is not None) != encrypted:
+            return False
+        if public is not None and bool(room.get('public')) != public:
+            return False
+        if federatable is not None and bool(room.get('federatable')) != federatable:
+            return False
+        if min_members is not None and members < min_members:
+            return False
+        if max_members is not None and members > max_members:
+            return False
+        return True
+
+    return accept
+
+
+class AnsibleMatrixAdmin(_AnsibleMatrixObject):
+    """Read-only access to the paginated list endpoints of the Synapse admin API.
+
+    Lists are exposed as async iterators fetching one page at a time, so that
+    only a single page is held in memory however large the homeserver is.
+    """
+
+    def __init__(self, matrix_client: AnsibleMatrixClient, page_size: int = 500,
+                 concurrency: int = DEFAULT_ENRICH_CONCURRENCY):
+        super().__init__(domain=matrix_client.domain)
+        self.matrix_client = matrix_client
+        self.page_size = page_size
+        self.concurrency = max(1, concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.matrix_client.close()
+
+    async def _get_page(self, path: str, query: Dict[str, Any]) -> Dict[str, Any]:
+        if query:
+            path = "{}?{}".format(path, urlencode(query))
+
+        response = await self.matrix_client.send_json("GET", path)
+        if response.status >= 400:
+            raise AnsibleMatrixError(f"GET {path} failed with {response.status}: {await response.text()}")
+
+        return await response.json()
+
+    async def _iter_pages(self, path: str, key: str, query: Dict[str, Any],
+                          next_key: str = 'next_batch') -> AsyncIterator[List[Dict[str, Any]]]:
+        query = {k: v for k, v in query.items() if v is not None}
+        query['limit'] = self.page_size
+
+        while True:
+            page = await self._get_page(path, query)
+            yield page.get(key, [])
+
+            next_batch = page.get(next_key)
+            if next_batch is None:
+                return
+            query['from'] = next_batch
+
+    async def iter_rooms(
+            self,
+            search_term: Optional[str] = None,
+            order_by: Optional[str] = None,
+            direction: Optional[str] = None,
+            accept: Optional[Callable[[Dict[str, Any]], bool]] = None) -> AsyncIterator[Dict[str, Any]]:
+        # GET /_synapse/admin/v1/rooms
+        query = {
+            "search_term": search_term,
+            "order_by": order_by,
+            "dir": direction,
+        }
+        async for rooms in self._iter_pages("/_synapse/admin/v1/rooms", 'rooms', query):
+            for room in rooms:
+                if accept is None or accept(room):
+                    yield {k: room.get(k) for k in ROOM_RECORD_FIELDS}
+
+    async def room_state(self, room_id: str) -> List[Dict[str, Any]]:
+        # GET /_synapse/admin/v1/rooms/<room_id>/state
+        page = await self._get_page("/_synapse/admin/v1/rooms/{}/state".format(room_id), {})
+        return page.get('state', [])
+
+    async def space_children(self, space_id: str) -> List[str]:
+        """Room IDs of the m.space.child events of a space, read without joining it."""
+        return [
+            event['state_key'] for event in await self.room_state(space_id)
+            if event.get('type') == "m.space.child" and event.get('content', {}).get('via')
+        ]
+
+    async def spaces_children(self, space_ids: List[str]) -> Dict[str, List[str]]:
+        """``space_children`` of many spaces, at most ``concurrency`` state reads at once."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(space_id: str) -> List[str]:
+            async with semaphore:
+                return await self.space_children(space_id)
+
+        children = await asyncio.gather(*[bounded(space_id) for space_id in space_ids])
+        return dict(zip(space_ids, children))
+
+    async def _whois(self, user: AnsibleMatrixUserRecord):
+        # GET /_synapse/admin/v1/whois/<user_id>
+        page = await self._get_page("/_synapse/admin/v1/whois/{}".format(user.mxid), {})
+        last_seen = [
+            connection.get('last_seen') or 0
+            for device in page.get('devices', {}).values()
+            for session in device.get('sessions', [])
+            for connection in session.get('connections', [])
+        ]
+        user.last_seen = max(last_seen) if last_seen else None
+
+    async def _joined_rooms(self, user: AnsibleMatrixUserRecord):
+        # GET /_synapse/admin/v1/users/<user_id>/joined_rooms
+        page = await self._get_page("/_synapse/admin/v1/users/{}/joined_rooms".format(user.mxid), {})
+        user.joined_rooms = page.get('joined_rooms', [])
+
+    async def iter_users(
+            self,
+            name: Optional[str] = None,
+            guests: Optional[bool] = None,
+            deactivated: Optional[bool] = None,
+            admins: Optional[bool] = None,
+            order_by: Optional[str] = None,
+            direction: Optional[str] = None,
+            accept: Optional[Callable[[AnsibleMatrixUserRecord], bool]] = None,
+            enrich: Iterable[str] = ()) -> AsyncIterator[AnsibleMatrixUserRecord]:
+        """Iterate over all accounts of the homeserver.
+
+        Deactivated accounts are only listed with ``deactivated=True``. ``enrich``
+        may contain ``whois`` and ``joined_rooms``, the matching per-user requests
+        are made for the accepted users of a page, at most ``concurrency`` at once.
+        """
+        # GET /_synapse/admin/v2/users
+        query = {
+            "name": name,
+            "guests": None if guests is None else str(guests).lower(),
+            "deactivated": None if deactivated is None else str(deactivated).lower(),
+            "admins": None if admins is None else str(admins).lower(),
+            "order_by": order_by,
+            "dir": direction,
+        }
+        enrichers = []
+        if 'whois' in enrich:
+            enrichers.append(self._whois)
+        if 'joined_rooms' in enrich:
+            enrichers.append(self._joined_rooms)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(enricher, user: AnsibleMatrixUserRecord):
+            async with semaphore:
+                await enricher(user)
+
+        async for entries in self._iter_pages("/_synapse/admin/v2/users", 'users', query, next_key='next_token'):
+            users = [AnsibleMatrixUserRecord(entry) for entry in entries]
+            if accept is not None:
+                users = [user for user in users if accept(user)]
+
+            if enrichers:
+                await asyncio.gather(*[bounded(enricher, user) for user in users for enricher in enrichers])
+
+            for user in users:
+                yield user
@@ -0,0 +1,228 @@
+import asyncio
+import base64
+import gzip
+import json
+import os
+import re
+from collections import defaultdict, deque
+from types import SimpleNamespace
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from aiohttp import ClientResponseError, RequestInfo
+from aiohttp.multipart import content_disposition_filename, parse_content_disposition
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from ansible_collections.eraga.matrix.plugins.module_utils.errors import AnsibleMatrixError
+
+# Cassette file, record or replay mode and latency factor of AnsibleMatrixClient
+ANSIBLE_MATRIX_CASSETTE_ENV = "ANSIBLE_MATRIX_CASSETTE"
+ANSIBLE_MATRIX_CASSETTE_MODE_ENV = "ANSIBLE_MATRIX_CASSETTE_MODE"
+ANSIBLE_MATRIX_CASSETTE_LATENCY_ENV = "ANSIBLE_MATRIX_CASSETTE_LATENCY"
+
+CASSETTE_VERSION = 1
+
+# Replaced in request and response bodies and query strings before anything is written
+CASSETTE_SECRET_FIELDS = ('access_token', 'refresh_token', 'password', 'password_hash', 'new_password')
+CASSETTE_SCRUBBED = "<scrubbed>"
+
+# Response headers kept, the rest is of no use to the client
+CASSETTE_HEADERS = ('Content-Type', 'Content-Disposition', 'Retry-After')
+
+# Transaction IDs are random per run and are not part of the request identity
+_TXN_PATH = re.compile(r"/(send|sendToDevice)/([^/]+)/[^/]+$")
+
+
+def _scrub(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            k: CASSETTE_SCRUBBED if k in CASSETTE_SECRET_FIELDS else _scrub(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [_scrub(v) for v in value]
+    return value
+
+
+def cassette_path_key(path: str) -> str:
+    """Request path as recorded: secrets scrubbed, transaction IDs dropped, query sorted."""
+    parts = urlsplit(path)
+    query = sorted(
+        (k, CASSETTE_SCRUBBED if k in CASSETTE_SECRET_FIELDS else v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+    )
+    key = _TXN_PATH.sub(r"/\1/\2/{txn}", parts.path)
+    return "{}?{}".format(key, urlencode(query)) if query else key
+
+
+class AnsibleMatrixReplayedResponse(object):
+    """Recorded response standing in for ``aiohttp.ClientResponse``.
+
+    Provides the parts of the aiohttp response nio and the module utils read.
+    """
+
+    def __init__(self, method: str, path: str, interaction: Dict[str, Any]):
+        self.method = method
+        self.url = URL(path)
+        self.status: int = interaction['status']
+        self.reason = interaction.get('reason') or ""
+        self.headers = CIMultiDictProxy(CIMultiDict(interaction.get('headers') or {}))
+
+        encoding = interaction.get('encoding')
+        if encoding == 'json':
+            self._body = json.dumps(interaction['body']).encode()
+        elif encoding == 'base64':
+            self._body = base64.b64decode(interaction['body'])
+        else:
+            self._body = (interaction.get('body') or "").encode()
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+    @property
+    def content_type(self) -> str:
+        return self.headers.get('Content-Type', 'application/octet-stream').split(';')[0].strip()
+
+    @property
+    def content_disposition(self) -> Optional[SimpleNamespace]:
+        raw = self.headers.get('Content-Disposition')
+        if raw is None:
+            return None
+        disposition_type, params = parse_content_disposition(raw)
+        return SimpleNamespace(
+            type=disposition_type,
+            parameters=params,
+            filename=content_disposition_filename(params)
+        )
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self, encoding: str = "utf-8") -> str:
+        return self._body.decode(encoding)
+
+    async def json(self, *args, **kwargs) -> Any:
+        return json.loads(self._body.decode()) if self._body else None
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise ClientResponseError(
+                RequestInfo(self.url, self.method, self.headers, self.url),
+                (),
+                status=self.status,
+                message=self.reason,
+                headers=self.headers,
+            )
+
+    def release(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class AnsibleMatrixCassette(object):
+    """Record every homeserver exchange of a client, or replay a recording.
+
+    A cassette is a compact JSON file, gzipped when its name ends with ``.gz``.
+    Interactions are replayed by method and path in recorded order, so the
+    same module run gets the same answers without a homeserver. The recorded
+    time of every request is waited for again, multiplied by ``latency``.
+    """
+
+    def __init__(self, path: str, mode: str = "replay", latency: float = 1.0):
+        if mode not in ("record", "replay"):
+            raise AnsibleMatrixError(f"Unknown cassette mode '{mode}', use record or replay")
+
+        self.path = os.path.expanduser(path)
+        self.mode = mode
+        self.latency = latency
+        self.interactions: List[Dict[str, Any]] = []
+        self._queues: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = defaultdict(deque)
+
+        if self.replaying:
+            self.load()
+
+    @classmethod
+    def from_env(cls) -> Optional['AnsibleMatrixCassette']:
+        path = os.environ.get(ANSIBLE_MATRIX_CASSETTE_ENV)
+        if not path:
+            return None
+
+        return cls(
+            path,
+            mode=os.environ.get(ANSIBLE_MATRIX_CASSETTE_MODE_ENV, "replay"),
+            latency=float(os.environ.get(ANSIBLE_MATRIX_CASSETTE_LATENCY_ENV, 1.0))
+        )
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _open(self, mode: str):
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, mode + "t", encoding="utf-8")
+        return open(self.path, mode, encoding="utf-8")
+
+    def load(self):
+        with self._open("r") as f:
+            cassette = json.load(f)
+
+        self.interactions = cassette['interactions']
+        for interaction in self.interactions:
+            self._queues[(interaction['method'], interaction['path'])].append(interaction)
+
+    def save(self):
+        if self.replaying:
+            return
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._open("w") as f:
+            json.dump({'version': CASSETTE_VERSION, 'interactions': self.interactions}, f, separators=(",", ":"))
+
+    async def record(self, method: str, path: str, data: Any, response, elapsed: float):
+        # Reading here keeps the body cached on the response for the actual caller
+        body = await response.read()
+
+        request = None
+        if isinstance(data, (str, bytes)) and data:
+            try:
+                request = _scrub(json.loads(data))
+            except ValueError:
+                request = None
+
+        interaction: Dict[str, Any] = {
+            'method': method,
+            'path': cassette_path_key(path),
+            'request': request,
+            'status': response.status,
+            'reason': response.reason,
+            'headers': {k: response.headers[k] for k in CASSETTE_HEADERS if k in response.headers},
+            'elapsed': round(elapsed, 4),
+        }
+
+        try:
+            interaction['body'] = _scrub(json.loads(body.decode()))
+            interaction['encoding'] = 'json'
+        except ValueError:
+            interaction['body'] = base64.b64encode(body).decode()
+            interaction['encoding'] = 'base64'
+
+        self.interactions.append(interaction)
+
+    async def replay(self, method: str, path: str) -> AnsibleMatrixReplayedResponse:
+        key = cassette_path_key(path)
+        queue = self._queues.get((method, key))
+        if not queue:
+            raise AnsibleMatrixError(f"Cassette {self.path} has no recorded response left for {method} {key}")
+
+        interaction = queue.popleft()
+        if self.latency:
+            await asyncio.sleep(interaction.get('elapsed', 0) * self.latency)
+
+        return AnsibleMatrixReplayedResponse(method, path, interaction)
@@ -1,20 +1,112 @@
 # noinspection PyPackageRequirements
+import asyncio
+import fcntl
+import functools
+import hashlib
 import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import *
+from datetime import timedelta
 from tempfile import TemporaryDirectory
+from typing import Any, Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+from uuid import uuid4
 
 import aiofiles
 import aiofiles.os
+from aiohttp import ClientConnectionError, ClientError, ClientSession
 from nio import *
 from nio.responses import WhoamiResponse
 from nio.api import _FilterT
 
+from ansible_collections.eraga.matrix.plugins.module_utils.cassette import AnsibleMatrixCassette
 from ansible_collections.eraga.matrix.plugins.module_utils.errors import AnsibleMatrixError, AnsibleMatrixWarning
-from ansible_collections.eraga.matrix.plugins.module_utils.utils import url2file, detect_mime_type, \
-    if_svg_convert_to_png
+from ansible_collections.eraga.matrix.plugins.module_utils.megolm import AnsibleMatrixMegolmStore
+from ansible_collections.eraga.matrix.plugins.module_utils.sent import AnsibleMatrixSentEvents, content_hash
+from ansible_collections.eraga.matrix.plugins.module_utils.utils import detect_mime_type, if_svg_convert_to_png, \
+    file_sha256, url_file_name, normalize_image, ImageError
 
 ANSIBLE_MATRIX_DEVICE_ID = "ansible-eraga-matrix-module"
 
+# How long to wait for another task holding the same crypto store
+ANSIBLE_MATRIX_STORE_LOCK_TIMEOUT = 300
+
+# Retries of a send failing with a 5xx response or a dropped connection,
+# waiting backoff, twice that, and so on up to the maximum in between
+ANSIBLE_MATRIX_SEND_RETRIES = 3
+ANSIBLE_MATRIX_SEND_BACKOFF = 1.0
+ANSIBLE_MATRIX_SEND_BACKOFF_MAX = 30.0
+
+# Chunks streamed from a URL into a media upload
+ANSIBLE_MATRIX_MEDIA_CHUNK_SIZE = 64 * 1024
+
+# Files up to this size are hashed on the event loop, larger ones in a thread
+ANSIBLE_MATRIX_INLINE_HASH_SIZE = 4 * 1024 * 1024
+
+# Suboptions of the avatar_normalize option of the modules managing avatars
+AVATAR_NORMALIZE_OPTIONS = dict(
+    max_width=dict(type='int', default=512),
+    max_height=dict(type='int', default=512),
+    format=dict(type='str', default='webp', choices=['webp', 'jpeg', 'png']),
+    quality=dict(type='int', default=80),
+    strip_metadata=dict(type='bool', default=True),
+    cache_dir=dict(type='path', default='~/.cache/ansible-matrix/images'),
+)
+
+IMAGE_FORMAT_MIME_TYPES = {
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+}
+
+_cpu_executor: Optional[Executor] = None
+
+
+def cpu_executor() -> Executor:
+    """Process pool sized to the cores, shared by everything running in this process.
+
+    Falls back to a thread pool where process pools are not available.
+    """
+    global _cpu_executor
+    if _cpu_executor is None:
+        workers = os.cpu_count() or 1
+        try:
+            _cpu_executor = ProcessPoolExecutor(max_workers=workers)
+        except (OSError, NotImplementedError):
+            _cpu_executor = ThreadPoolExecutor(max_workers=workers)
+
+    return _cpu_executor
+
+
+async def run_cpu_bound(func, *args, **kwargs):
+    """Run CPU heavy work (svg rendering, image re-encoding) in a worker process.
+
+    Worth it for work taking far longer than handing it to a process, cheap
+    work runs inline. ``func`` and its arguments must be picklable, i.e.
+    module level functions and plain values.
+    """
+    return await asyncio.get_event_loop().run_in_executor(
+        cpu_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+async def svg_to_png(image: str, mimetype: Optional[str], tmp: str) -> Tuple[str, str]:
+    """``if_svg_convert_to_png``, rasterizing in a worker process only when the image is an SVG."""
+    if mimetype is None or "image/svg" not in mimetype:
+        return image, mimetype
+    return await run_cpu_bound(if_svg_convert_to_png, image, mimetype, tmp)
+
+
+async def hash_file(path: str) -> str:
+    """``file_sha256`` of a file, large files are hashed in a thread.
+
+    hashlib releases the GIL on large buffers, a thread is enough.
+    """
+    if os.path.getsize(path) <= ANSIBLE_MATRIX_INLINE_HASH_SIZE:
+        return file_sha256(path)
+    return await asyncio.get_event_loop().run_in_executor(None, file_sha256, path)
+
 
 @dataclass
 class Convertable(object):
@@ -70,6 +162,29 @@ class _AnsibleMatrixObject(object):
         return "+{}:{}".format(localpart, self.domain)
 
 
+@dataclass
+class AnsibleMatrixUpload(Convertable):
+    content_uri: str
+    mimetype: str
+    size: int
+    filename: str
+    sha256: Optional[str] = None
+    # Key, IV and hashes of an encrypted upload, as the "file" of an event
+    file: Optional[Dict[str, Any]] = None
+    # False when an earlier upload of the same content was reused
+    uploaded: bool = True
+
+
+@dataclass
+class AnsibleMatrixImageNormalization(Convertable):
+    max_width: int = 512
+    max_height: int = 512
+    format: str = 'webp'
+    quality: int = 80
+    strip_metadata: bool = True
+    cache_dir: str = '~/.cache/ansible-matrix/images'
+
+
 class AnsibleMatrixClient(_AnsibleMatrixObject, AsyncClient):
     """A Matrix client implementation for Ansible modules.
 
@@ -85,22 +200,219 @@ class AnsibleMatrixClient(_AnsibleMatrixObject, AsyncClient):
         uri (str): The Matrix homeserver URI.
         token (str): The access token for authentication.
         user (Optional[str]): The Matrix user ID (optional).
+        store_path (Optional[str]): Directory of the persistent E2E crypto store (optional).
+            Without it olm state lives only as long as the client.
+        megolm_rotation_messages (Optional[int]): Rotate a persisted outbound megolm session
+            after this many messages (optional).
+        megolm_rotation_period (Optional[int]): Rotate a persisted outbound megolm session
+            after this many seconds (optional).
+        cassette (Optional[AnsibleMatrixCassette]): Record all HTTP exchanges to, or replay
+            them from a cassette (optional). Taken from ``ANSIBLE_MATRIX_CASSETTE`` when not given.
+        image_normalization (Optional[Dict[str, Any]]): Resize and re-encode images before
+            ``upload_image_if_new`` uploads them, see ``AnsibleMatrixImageNormalization`` (optional).
 
     Inherits:
         _AnsibleMatrixObject: Provides Matrix ID formatting utilities
         AsyncClient: Provides core Matrix client functionality
     """
 
-    def __init__(self, domain: str, uri: str, token: str, user: Optional[str] = None):
+    def __init__(self, domain: str, uri: str, token: str, user: Optional[str] = None,
+                 store_path: Optional[str] = None,
+                 megolm_rotation_messages: Optional[int] = None,
+                 megolm_rotation_period: Optional[int] = None,
+                 cassette: Optional[AnsibleMatrixCassette] = None,
+                 image_normalization: Optional[Dict[str, Any]] = None):
         _AnsibleMatrixObject.__init__(self, domain=domain)
+
+        if store_path is not None:
+            store_path = os.path.expanduser(store_path)
+            os.makedirs(store_path, mode=0o700, exist_ok=True)
+
         AsyncClient.__init__(
             self,
             homeserver=uri,
             user=self.login_to_id(user),
-            device_id=ANSIBLE_MATRIX_DEVICE_ID
+            device_id=ANSIBLE_MATRIX_DEVICE_ID,
+            store_path=store_path or ""
         )
 
         self.access_token = token
+        self._store_lock = None
+        self._megolm_store: Optional[AnsibleMatrixMegolmStore] = None
+        self.megolm_rotation_messages = megolm_rotation_messages
+        self.megolm_rotation_period = megolm_rotation_period
+        self.cassette = cassette if cassette is not None else AnsibleMatrixCassette.from_env()
+        self.image_normalization = AnsibleMatrixImageNormalization(**image_normalization) \
+            if image_normalization else None
+
+    async def load_crypto_store(self):
+        """Open the persistent olm store of this user and device.
+
+        The store is an sqlite file per user and device under ``store_path``.
+        It is locked for the lifetime of the client, so that concurrent tasks
+        of the same bot never hand out the same one-time keys twice. Device keys
+        are then uploaded only once per store instead of on every run.
+        """
+        if not self.store_path or self.olm is not None:
+            return
+
+        if self.user is None:
+            whoami: WhoamiResponse = await self.whoami()
+            self.user = whoami.user_id
+
+        lock_path = os.path.join(self.store_path, "{}_{}.lock".format(self.user, self.device_id))
+        self._store_lock = open(lock_path, "w")
+        for _ in range(ANSIBLE_MATRIX_STORE_LOCK_TIMEOUT * 10):
+            try:
+                fcntl.flock(self._store_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(0.1)
+        else:
+            self._store_lock.close()
+            self._store_lock = None
+            raise AnsibleMatrixError(f"Crypto store {lock_path} is locked by another task")
+
+        self.restore_login(self.user, self.device_id, self.access_token)
+        self._megolm_store = AnsibleMatrixMegolmStore(self.store_path, self.user, self.device_id)
+
+    def _restore_outbound_group_session(self, room_id: str):
+        if room_id in self.olm.outbound_group_sessions:
+            return
+
+        session = self._megolm_store.load(room_id, self.store.pickle_key)
+        if session is None:
+            return
+
+        if self.megolm_rotation_messages is not None:
+            session.max_messages = min(session.max_messages, self.megolm_rotation_messages)
+        if self.megolm_rotation_period is not None:
+            session.max_age = min(session.max_age, timedelta(seconds=self.megolm_rotation_period))
+
+        if session.expired:
+            self._megolm_store.delete(room_id)
+            return
+
+        current_devices = {
+            (user_id, device.id)
+            for user_id in self.rooms[room_id].users
+            for device in self.device_store.active_user_devices(user_id)
+        }
+
+        # Members that left, or devices that were removed, must not read later
+        # messages, nio creates and shares a new session instead
+        if session.users_shared_with - current_devices:
+            self._megolm_store.delete(room_id)
+            return
+
+        # Devices that appeared since the last run still need the session key,
+        # nio then shares it with exactly those devices
+        if current_devices - session.users_shared_with - session.users_ignored:
+            session.shared = False
+
+        self.olm.outbound_group_sessions[room_id] = session
+
+    async def room_send(
+            self,
+            room_id: str,
+            message_type: str,
+            content: Dict[Any, Any],
+            tx_id: Optional[str] = None,
+            ignore_unverified_devices: bool = False,
+    ) -> Union[RoomSendResponse, RoomSendError]:
+        """Send a message, reusing the persisted outbound megolm session of encrypted rooms."""
+        persist_session = self._megolm_store is not None \
+            and room_id in self.rooms and self.rooms[room_id].encrypted
+
+        if persist_session:
+            self._restore_outbound_group_session(room_id)
+
+        response = await super(AnsibleMatrixClient, self).room_send(
+            room_id,
+            message_type,
+            content,
+            tx_id,
+            ignore_unverified_devices
+        )
+
+        if persist_session and room_id in self.olm.outbound_group_sessions:
+            self._megolm_store.save(room_id, self.olm.outbound_group_sessions[room_id], self.store.pickle_key)
+
+        return response
+
+    async def room_send_retrying(
+            self,
+            room_id: str,
+            message_type: str,
+            content: Dict[Any, Any],
+            tx_id: Optional[str] = None,
+            retries: int = ANSIBLE_MATRIX_SEND_RETRIES,
+            backoff: float = ANSIBLE_MATRIX_SEND_BACKOFF,
+            ignore_unverified_devices: bool = False,
+    ) -> Union[RoomSendResponse, RoomSendError]:
+        """``room_send`` retried with exponential backoff on transient failures.
+
+        nio already waits out 429 responses, this covers 5xx responses of the
+        homeserver or a proxy in front of it and dropped connections. Retries
+        reuse the transaction ID, a send that reached the homeserver before
+        failing is answered with the original event instead of a duplicate.
+        """
+        if tx_id is None:
+            tx_id = str(uuid4())
+
+        attempt = 0
+        while True:
+            try:
+                response = await self.room_send(room_id, message_type, content, tx_id, ignore_unverified_devices)
+                transient = isinstance(response, RoomSendError) and (
+                    response.transport_response is None or response.transport_response.status >= 500
+                )
+            except (ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= retries:
+                    raise AnsibleMatrixError(f"Failed to send to {room_id} after {attempt + 1} attempts: {e}")
+                transient = True
+                response = None
+
+            if not transient or attempt >= retries:
+                return response
+
+            await asyncio.sleep(min(backoff * 2 ** attempt, ANSIBLE_MATRIX_SEND_BACKOFF_MAX))
+            attempt += 1
+
+    async def send(
+            self,
+            method: str,
+            path: str,
+            data: Any = None,
+            headers: Optional[Dict[str, str]] = None,
+            trace_context: Any = None,
+            timeout: Optional[float] = None,
+    ):
+        """Every request of nio and of the module utils passes here, record or replay it."""
+        if self.cassette is not None and self.cassette.replaying:
+            return await self.cassette.replay(method, path)
+
+        started = time.monotonic()
+        response = await super(AnsibleMatrixClient, self).send(method, path, data, headers, trace_context, timeout)
+
+        if self.cassette is not None:
+            await self.cassette.record(method, path, data, response, time.monotonic() - started)
+
+        return response
+
+    async def close(self):
+        try:
+            await super(AnsibleMatrixClient, self).close()
+        finally:
+            if self.cassette is not None:
+                self.cassette.save()
+            if self._megolm_store is not None:
+                self._megolm_store.close()
+                self._megolm_store = None
+            if self._store_lock is not None:
+                fcntl.flock(self._store_lock, fcntl.LOCK_UN)
+                self._store_lock.close()
+                self._store_lock = None
 
     async def sync(
             self,
@@ -115,6 +427,8 @@ class AnsibleMatrixClient(_AnsibleMatrixObject, AsyncClient):
             self.user_id = whoami.user_id
             self.user = whoami.user_id
 
+        await self.load_crypto_store()
+
         return await super(AnsibleMatrixClient, self).sync(
             timeout,
             sync_filter,
@@ -123,8 +437,24 @@ class AnsibleMatrixClient(_AnsibleMatrixObject, AsyncClient):
             set_presence,
         )
 
+    async def send_json(self, method: str, path: str, data: Optional[Dict] = None):
+        """Send an authorized JSON request to an arbitrary homeserver path.
+
+        Used for the client and admin endpoints nio has no wrapper for. The raw
+        aiohttp response is returned, status checks are left to the caller.
+        """
+        return await self.send(
+            method, path, Api.to_json(data) if data is not None else None, headers={
+                "Content-Type": "application/json",
+                "Authorization": "Bearer {}".format(self.access_token)
+            }
+        )
+
     async def is_same_image(self, image, image_mime_type, mxc_url) -> bool:
         file_stat = await aiofiles.os.stat(image)
+        return await self.is_same_media(os.path.basename(image), file_stat.st_size, image_mime_type, mxc_url)
+
+    async def is_same_media(self, filename: str, size: int, mimetype: str, mxc_url: str) -> bool:
         # server, media = mxc_url.replace("mxc://", "").split("/")
         try:
             resp = await self.download(mxc=mxc_url)  # , server, media)
@@ -140,9 +470,9 @@ class AnsibleMatrixClient(_AnsibleMatrixObject, AsyncClient):
                 orig_exc=e
             )
 
-        if file_stat.st_size == len(resp.body) \
-                and image_mime_type == resp.content_type \
-                and os.path.basename(image) in resp.filename:
+        if size == len(resp.body) \
+                and mimetype == resp.content_type \
+                and filename in resp.filename:
             return True
         return False
 
@@ -150,15 +480,104 @@ class AnsibleMatrixClient(_AnsibleMatrixObject, AsyncClient):
             self,
             in_image: Optional[str],
             old_mxc_url: Optional[str]) -> Optional[UploadResponse]:
+        """Upload an image unless it is the one behind ``old_mxc_url`` already.
+
+        Images from http(s) URLs are streamed from the download into the upload,
+        only SVGs are written to a temporary directory to be rasterized.
+        """
         if in_image is None:
             return None
 
-        url_mime = None
-        tmp = TemporaryDirectory()
+        if self.image_normalization is not None:
+            with TemporaryDirectory() as tmp:
+                image, mimetype = await self._normalized_image(in_image, tmp)
+                return await self._upload_image_file(image, mimetype, old_mxc_url, tmp)
+
         if in_image.startswith("http"):
-            in_image, url_mime = url2file(in_image, tmp)
+            try:
+                async with ClientSession() as session:
+                    async with session.get(in_image) as response:
+                        response.raise_for_status()
+                        return await self._upload_image_response(in_image, response, old_mxc_url)
+            except ClientError as e:
+                raise AnsibleMatrixError(f"Failed to download image {in_image}: {e}")
+
+        with TemporaryDirectory() as tmp:
+            return await self._upload_image_file(in_image, detect_mime_type(in_image), old_mxc_url, tmp)
+
+    async def _normalized_image(self, in_image: str, tmp: str) -> Tuple[str, str]:
+        """Path and mime type of the normalized ``in_image``.
+
+        Normalized images are cached under a hash of the source content and
+        the settings, every image is re-encoded only once. The name stays the
+        same across runs, so ``is_same_image`` recognizes it as uploaded.
+        """
+        normalization = self.image_normalization
 
-        image, image_mime_type = if_svg_convert_to_png(in_image, detect_mime_type(in_image, url_mime), tmp)
+        if in_image.startswith("http"):
+            try:
+                async with ClientSession() as session:
+                    async with session.get(in_image) as response:
+                        response.raise_for_status()
+                        mimetype = response.content_type
+                        source = await response.read()
+            except ClientError as e:
+                raise AnsibleMatrixError(f"Failed to download image {in_image}: {e}")
+            sha256 = hashlib.sha256(source).hexdigest()
+
+            if "image/svg" in mimetype:
+                path = os.path.join(tmp, url_file_name(in_image, mimetype))
+                async with aiofiles.open(path, "wb") as f:
+                    await f.write(source)
+                source = path
+        else:
+            source = os.path.expanduser(in_image)
+            mimetype = detect_mime_type(source)
+            sha256 = await hash_file(source)
+
+        settings = normalization.dict()
+        del settings['cache_dir']
+        key = content_hash(dict(settings, source=sha256))
+
+        cache_dir = os.path.expanduser(normalization.cache_dir)
+        os.makedirs(cache_dir, exist_ok=True)
+        target = os.path.join(cache_dir, "{}.{}".format(key[:32], normalization.format))
+
+        if not os.path.exists(target):
+            source, _ = await svg_to_png(source, mimetype, tmp)
+            try:
+                await run_cpu_bound(
+                    normalize_image, source, target,
+                    normalization.max_width, normalization.max_height,
+                    normalization.format, normalization.quality, normalization.strip_metadata
+                )
+            except (ImageError, OSError) as e:
+                raise AnsibleMatrixError(f"Failed to normalize image {in_image}: {e}")
+
+        return target, IMAGE_FORMAT_MIME_TYPES[normalization.format]
+
+    async def _upload_image_response(self, url: str, response, old_mxc_url: Optional[str]) -> Optional[UploadResponse]:
+        mimetype = response.content_type
+        filename = url_file_name(url, mimetype)
+
+        if "image/svg" in mimetype:
+            with TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, filename)
+                async with aiofiles.open(path, "wb") as f:
+                    async for chunk in response.content.iter_chunked(ANSIBLE_MATRIX_MEDIA_CHUNK_SIZE):
+                        await f.write(chunk)
+                return await self._upload_image_file(path, mimetype, old_mxc_url, tmp)
+
+        data, size = await self._body(response)
+        if old_mxc_url is not None and await self.is_same_media(filename, size, mimetype, old_mxc_url):
+            return None
+
+        content_uri, _ = await self._upload_stream(data, mimetype, filename, size, False)
+        return UploadResponse(content_uri)
+
+    async def _upload_image_file(self, image: str, mimetype: str, old_mxc_url: Optional[str],
+                                 tmp: str) -> Optional[UploadResponse]:
+        image, image_mime_type = await svg_to_png(image, mimetype, tmp)
 
         if old_mxc_url is not None and \
                 await self.is_same_image(image, image_mime_type, old_mxc_url):
@@ -166,18 +585,138 @@ class AnsibleMatrixClient(_AnsibleMatrixObject, AsyncClient):
 
         file_stat = await aiofiles.os.stat(image)
 
-        async with aiofiles.open(image, "r+b") as f:
-            resp, maybe_keys = await self.upload(
-                f,
-                content_type=image_mime_type,  # image/jpeg
-                filename=os.path.basename(image),
-                filesize=file_stat.st_size)
+        async with aiofiles.open(image, "rb") as f:
+            content_uri, _ = await self._upload_stream(f, image_mime_type, os.path.basename(image),
+                                                       file_stat.st_size, False)
+        return UploadResponse(content_uri)
 
-        if isinstance(resp, UploadResponse):
-            return resp
-        else:
+    @staticmethod
+    async def _body(response, digest=None) -> Tuple[Any, int]:
+        """Body of a download as upload data and its size.
+
+        The media repository needs the size up front, bodies without a
+        Content-Length are read first. With a ``digest`` the body is hashed
+        into it as it passes through.
+        """
+        if response.content_length is None:
+            data = await response.read()
+            if digest is not None:
+                digest.update(data)
+            return data, len(data)
+
+        async def chunks():
+            async for chunk in response.content.iter_chunked(ANSIBLE_MATRIX_MEDIA_CHUNK_SIZE):
+                if digest is not None:
+                    digest.update(chunk)
+                yield chunk
+
+        return chunks(), response.content_length
+
+    async def upload_media(
+            self,
+            source: str,
+            media: Optional[AnsibleMatrixSentEvents] = None,
+            encrypt: bool = False,
+            filename: Optional[str] = None) -> AnsibleMatrixUpload:
+        """Upload a local file or the body of an http(s) URL without a temporary copy.
+
+        Files are streamed from disk, URLs straight from the response into the
+        upload. With ``media`` unencrypted uploads are deduplicated by content
+        hash: a file is hashed first and not uploaded again, a URL is fetched
+        conditionally and not uploaded again while it is not modified.
+        Encrypted uploads have keys of their own and are never reused.
+        """
+        if source.startswith("http://") or source.startswith("https://"):
+            return await self._upload_url(source, media if not encrypt else None, encrypt, filename)
+        return await self._upload_file(source, media if not encrypt else None, encrypt, filename)
+
+    async def _upload_stream(self, data: Any, mimetype: str, filename: str, size: int,
+                             encrypt: bool) -> Tuple[str, Optional[Dict[str, Any]]]:
+        resp, keys = await self.upload(
+            data,
+            content_type=mimetype,
+            filename=filename,
+            encrypt=encrypt,
+            filesize=size)
+
+        if not isinstance(resp, UploadResponse):
             raise AnsibleMatrixError(
-                f"Failed to upload image. Failure status {resp.status_code} and reason: {resp.message}")
+                f"Failed to upload {filename}. Failure status {resp.status_code} and reason: {resp.message}")
+
+        file = None
+        if encrypt:
+            file = dict(keys, url=resp.content_uri, v="v2")
+        return resp.content_uri, file
+
+    async def _upload_file(self, path: str, media: Optional[AnsibleMatrixSentEvents], encrypt: bool,
+                           filename: Optional[str]) -> AnsibleMatrixUpload:
+        path = os.path.expanduser(path)
+        filename = filename or os.path.basename(path)
+        mimetype = detect_mime_type(path, "application/octet-stream")
+        size = (await aiofiles.os.stat(path)).st_size
+        sha256 = await hash_file(path)
+
+        known = media.get_media(sha256) if media is not None else None
+        if known is not None:
+            return AnsibleMatrixUpload(content_uri=known[0], mimetype=known[1], size=known[2],
+                                       filename=filename, sha256=sha256, uploaded=False)
+
+        async with aiofiles.open(path, "rb") as f:
+            content_uri, file = await self._upload_stream(f, mimetype, filename, size, encrypt)
+
+        if media is not None:
+            media.put_media(sha256, content_uri, mimetype, size)
+        return AnsibleMatrixUpload(content_uri=content_uri, mimetype=mimetype, size=size,
+                                   filename=filename, sha256=sha256, file=file)
+
+    async def _upload_url(self, url: str, media: Optional[AnsibleMatrixSentEvents], encrypt: bool,
+                          filename: Optional[str]) -> AnsibleMatrixUpload:
+        filename = filename or os.path.basename(urlsplit(url).path) or "attachment"
+
+        headers = {}
+        known_url = media.get_media_url(url) if media is not None else None
+        known = media.get_media(known_url[2]) if known_url is not None else None
+        if known is not None:
+            etag, last_modified, _ = known_url
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        try:
+            async with ClientSession() as session:
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 304 and known is not None:
+                        return AnsibleMatrixUpload(content_uri=known[0], mimetype=known[1], size=known[2],
+                                                   filename=filename, sha256=known_url[2], uploaded=False)
+                    response.raise_for_status()
+
+                    mimetype = response.content_type or detect_mime_type(filename, "application/octet-stream")
+                    digest = hashlib.sha256()
+                    data, size = await self._body(response, digest)
+
+                    # A body read up front is hashed already and may have been uploaded from elsewhere
+                    known = None
+                    if media is not None and isinstance(data, bytes):
+                        known = media.get_media(digest.hexdigest())
+                    if known is not None:
+                        media.put_media_url(url, response.headers.get('ETag'),
+                                            response.headers.get('Last-Modified'), digest.hexdigest())
+                        return AnsibleMatrixUpload(content_uri=known[0], mimetype=known[1], size=known[2],
+                                                   filename=filename, sha256=digest.hexdigest(), uploaded=False)
+
+                    content_uri, file = await self._upload_stream(data, mimetype, filename, size, encrypt)
+                    etag = response.headers.get('ETag')
+                    last_modified = response.headers.get('Last-Modified')
+        except ClientError as e:
+            raise AnsibleMatrixError(f"Failed to download {url}: {e}")
+
+        sha256 = digest.hexdigest()
+        if media is not None:
+            media.put_media(sha256, content_uri, mimetype, size)
+            media.put_media_url(url, etag, last_modified, sha256)
+        return AnsibleMatrixUpload(content_uri=content_uri, mimetype=mimetype, size=size,
+                                   filename=filename, sha256=sha256, file=file)
 
     # async def download_mxc(
     #         self,
@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import subprocess
+from typing import Any, Awaitable, Callable, Dict, List
+
+from aiohttp import ClientResponseError
+from ansible.errors import AnsibleError
+
+from ansible_collections.eraga.matrix.plugins.module_utils.client_model import AnsibleMatrixClient
+from ansible_collections.eraga.matrix.plugins.module_utils.errors import AnsibleMatrixError
+from ansible_collections.eraga.matrix.plugins.module_utils.snapshot import AnsibleMatrixSnapshots
+
+# Options shared by the lookup plugins, documented in each of them
+DEFAULT_LOOKUP_SNAPSHOT_DB = "~/.cache/ansible-matrix/lookups.db"
+DEFAULT_LOOKUP_MEMO_TTL = 3600
+
+LOOKUP_MEMO_PREFIX = "lookup:"
+
+
+def controller_pid() -> int:
+    """PID of the ansible-playbook run evaluating the lookup.
+
+    Lookups are evaluated in per-task worker processes forked from the
+    controller, their parent is the controller itself.
+    """
+    parent = multiprocessing.parent_process()
+    return parent.pid if parent is not None else os.getpid()
+
+
+def controller_run_id() -> str:
+    """Identifier of the ansible-playbook run evaluating the lookup.
+
+    PIDs repeat across runs, in containers the controller has the same PID
+    every time, so the PID is combined with the start time of the process.
+    """
+    pid = controller_pid()
+    try:
+        with open("/proc/{}/stat".format(pid)) as f:
+            # the command name may contain spaces, fields are counted after it
+            started = f.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        try:
+            started = subprocess.run(["ps", "-o", "lstart=", "-p", str(pid)], capture_output=True,
+                                     text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            started = ""
+
+    return "{}-{}".format(pid, hashlib.sha256(started.encode()).hexdigest()[:16])
+
+
+class AnsibleMatrixLookupMemo(object):
+    """Lookup results shared by every worker process of a controller run.
+
+    Results live in the generic cache table of the snapshot database, keyed by
+    the controller run, the homeserver, a hash of the token and the term, so a
+    term is looked up once per playbook run rather than once per task. Rows
+    older than the TTL are deleted on every write, secrets are never stored.
+    """
+
+    def __init__(self, path: str, kind: str, uri: str, domain: str, token: str, ttl: float):
+        self.store = AnsibleMatrixSnapshots(path)
+        self.ttl = ttl
+        self.prefix = LOOKUP_MEMO_PREFIX + "{}:{}:{}:{}:{}:".format(
+            kind, controller_run_id(), uri, domain, hashlib.sha256(token.encode()).hexdigest()
+        )
+
+    def close(self):
+        self.store.close()
+
+    def get(self, term: str) -> Any:
+        return self.store.get(self.prefix + term, ttl=self.ttl)
+
+    def put(self, term: str, value: Any) -> Any:
+        """Store ``value`` and return it the way ``get`` will, sets become lists."""
+        if isinstance(value, dict):
+            value = AnsibleMatrixSnapshots._scrub(value)
+        value = json.loads(json.dumps(value, default=list))
+        self.store.prune(LOOKUP_MEMO_PREFIX, self.ttl)
+        self.store.put(self.prefix + term, value)
+        return value
+
+
+def run_memoized_lookup(lookup, kind: str, terms: List[str],
+                        fetch: Callable[[AnsibleMatrixClient, str], Awaitable[Dict[str, Any]]]) -> List[Any]:
+    """Body of ``LookupModule.run`` of the memoized lookups.
+
+    Terms missing from the memo are fetched concurrently with a single client.
+    Empty results, unknown rooms or accounts, are not memoized.
+    """
+    memo = AnsibleMatrixLookupMemo(
+        lookup.get_option('snapshot_db'),
+        kind,
+        lookup.get_option('matrix_uri'),
+        lookup.get_option('matrix_domain'),
+        lookup.get_option('matrix_token'),
+        lookup.get_option('memo_ttl')
+    )
+
+    try:
+        results = {term: memo.get(term) for term in dict.fromkeys(terms)}
+        missing = [term for term, result in results.items() if result is None]
+
+        if missing:
+            async def fetch_all():
+                matrix_client = AnsibleMatrixClient(
+                    domain=lookup.get_option('matrix_domain'),
+                    uri=lookup.get_option('matrix_uri'),
+                    token=lookup.get_option('matrix_token'),
+                    user=lookup.get_option('matrix_user')
+                )
+                try:
+                    return await asyncio.gather(*[fetch(matrix_client, term) for term in missing])
+                finally:
+                    await matrix_client.close()
+
+            loop = asyncio.new_event_loop()
+            try:
+                fetched = loop.run_until_complete(fetch_all())
+            except (AnsibleMatrixError, ClientResponseError) as e:
+                raise AnsibleError("Failed to look up Matrix {}s: {}".format(kind, e))
+            finally:
+                loop.close()
+
+            for term, result in zip(missing, fetched):
+                results[term] = memo.put(term, result) if result else result
+    finally:
+        memo.close()
+
+    return [results[term] for term in terms]
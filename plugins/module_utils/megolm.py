@@ -0,0 +1,79 @@
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Optional
+
+from nio.crypto import OutboundGroupSession
+
+MEGOLM_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbound_group_sessions (
+    room_id TEXT PRIMARY KEY,
+    pickle TEXT NOT NULL,
+    creation_time REAL NOT NULL,
+    message_count INTEGER NOT NULL,
+    max_age REAL NOT NULL,
+    max_messages INTEGER NOT NULL,
+    users_shared_with TEXT NOT NULL,
+    users_ignored TEXT NOT NULL
+);
+"""
+
+
+class AnsibleMatrixMegolmStore(object):
+    """Outbound megolm sessions persisted next to the nio crypto store.
+
+    nio keeps outbound group sessions in memory only, so every module run
+    would create a new session and share it with every device of the room.
+    Sessions are stored per room together with the devices they were shared
+    with, which is what lets the next run share keys with new devices only.
+    """
+
+    def __init__(self, store_path: str, user_id: str, device_id: str):
+        path = os.path.join(store_path, "{}_{}_outbound.db".format(user_id, device_id))
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.executescript(MEGOLM_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def load(self, room_id: str, pickle_key: str) -> Optional[OutboundGroupSession]:
+        row = self.db.execute(
+            "SELECT pickle, creation_time, message_count, max_age, max_messages, users_shared_with, users_ignored "
+            "FROM outbound_group_sessions WHERE room_id = ?", (room_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        pickle, creation_time, message_count, max_age, max_messages, users_shared_with, users_ignored = row
+
+        # from_pickle bypasses __init__, the nio bookkeeping is restored by hand
+        session = OutboundGroupSession.from_pickle(pickle.encode(), pickle_key)
+        session.creation_time = datetime.fromtimestamp(creation_time)
+        session.message_count = message_count
+        session.max_age = timedelta(seconds=max_age)
+        session.max_messages = max_messages
+        session.users_shared_with = set(map(tuple, json.loads(users_shared_with)))
+        session.users_ignored = set(map(tuple, json.loads(users_ignored)))
+        session.shared = True
+        return session
+
+    def save(self, room_id: str, session: OutboundGroupSession, pickle_key: str):
+        self.db.execute(
+            "INSERT OR REPLACE INTO outbound_group_sessions "
+            "(room_id, pickle, creation_time, message_count, max_age, max_messages, users_shared_with, users_ignored) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                room_id,
+                session.pickle(pickle_key).decode(),
+                session.creation_time.timestamp(),
+                session.message_count,
+                session.max_age.total_seconds(),
+                session.max_messages,
+                json.dumps(sorted(session.users_shared_with)),
+                json.dumps(sorted(session.users_ignored)),
+            )
+        )
+
+    def delete(self, room_id: str):
+        self.db.execute("DELETE FROM outbound_group_sessions WHERE room_id = ?", (room_id,))
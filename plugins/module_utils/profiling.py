@@ -0,0 +1,80 @@
+import asyncio
+import cProfile
+import os
+import time
+import tracemalloc
+from typing import Awaitable, Callable
+
+# Directory to write profiles of module runs to, profiling is off while unset
+ANSIBLE_MATRIX_PROFILE_DIR_ENV = "ANSIBLE_MATRIX_PROFILE_DIR"
+# Number of allocation sites listed in the tracemalloc report
+ANSIBLE_MATRIX_PROFILE_TOP_ENV = "ANSIBLE_MATRIX_PROFILE_TOP"
+
+
+class AnsibleMatrixProfiler(object):
+    """cProfile and tracemalloc around a single module run.
+
+    Writes ``<module>_<time>_<pid>.pstats``, readable with ``python -m pstats``
+    or snakeviz, and a ``.malloc.txt`` report of the top allocation sites next
+    to it. Work offloaded to the process pool is not part of the profile.
+    """
+
+    def __init__(self, directory: str, name: str, top: int = 25):
+        self.directory = os.path.expanduser(directory)
+        self.name = name
+        self.top = top
+        self.profile = cProfile.Profile()
+        self.started = 0.0
+
+    @property
+    def base_path(self) -> str:
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        return os.path.join(self.directory, "{}_{}_{}".format(self.name, stamp, os.getpid()))
+
+    def __enter__(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.started = time.time()
+        tracemalloc.start()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *args):
+        self.profile.disable()
+        seconds = time.time() - self.started
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        base_path = self.base_path
+        self.profile.dump_stats(base_path + ".pstats")
+
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        with open(base_path + ".malloc.txt", "w") as report:
+            report.write("module: {}\n".format(self.name))
+            report.write("wall time: {:.3f} s\n".format(seconds))
+            report.write("traced memory: {:.1f} KiB current, {:.1f} KiB peak\n\n".format(current / 1024, peak / 1024))
+            report.write("top {} allocation sites:\n".format(self.top))
+            for stat in snapshot.statistics("lineno")[:self.top]:
+                report.write("{}\n".format(stat))
+
+
+def run_async_module(run_module: Callable[[], Awaitable], name: str):
+    """Entry point of the asynchronous modules.
+
+    Set ``ANSIBLE_MATRIX_PROFILE_DIR``, e.g. through the ``environment`` keyword
+    of a single task, to profile that run.
+    """
+    loop = asyncio.get_event_loop()
+
+    directory = os.environ.get(ANSIBLE_MATRIX_PROFILE_DIR_ENV)
+    if not directory:
+        loop.run_until_complete(run_module())
+        return
+
+    top = int(os.environ.get(ANSIBLE_MATRIX_PROFILE_TOP_ENV, 25))
+    # Modules leave through sys.exit, the profile is written on the way out
+    with AnsibleMatrixProfiler(directory, name, top):
+        loop.run_until_complete(run_module())
@@ -1,6 +1,7 @@
 import asyncio
 from typing import Set
 
+from aiohttp import ClientResponseError
 from markdown import markdown
 from nio.responses import WhoamiResponse
 
@@ -8,16 +9,36 @@ from ansible_collections.eraga.matrix.plugins.module_utils.client_model import _
 from ansible_collections.eraga.matrix.plugins.module_utils.client_model import *
 from ansible_collections.eraga.matrix.plugins.module_utils.community import AnsibleMatrixCommunity
 from ansible_collections.eraga.matrix.plugins.module_utils.errors import AnsibleMatrixError
+from ansible_collections.eraga.matrix.plugins.module_utils.sent import AnsibleMatrixSentEvents, content_hash, \
+    transaction_id
+
+# Keys matrix_room_snapshot adds to matrix_room_to_dict
+ROOM_SNAPSHOT_ONLY_KEYS = ('avatar', 'encrypted', 'join_rule', 'power_levels')
+
+# Synapse refuses createRoom requests inviting too many users at once,
+# the rest is invited in batches of this size after the room is created
+DEFAULT_INVITE_BATCH_SIZE = 50
+
+# Invites and admin joins in flight at once within a batch
+DEFAULT_INVITE_CONCURRENCY = 10
 
 
 class AnsibleMatrixRoom(_AnsibleMatrixObject):
     def __init__(self,
                  matrix_client: AnsibleMatrixClient,
                  matrix_room_alias: str,
-                 changes: Dict[str, Any] = ()):
+                 changes: Dict[str, Any] = (),
+                 invite_batch_size: int = DEFAULT_INVITE_BATCH_SIZE,
+                 invite_concurrency: int = DEFAULT_INVITE_CONCURRENCY,
+                 force_join: bool = False,
+                 join: bool = True):
         super().__init__(domain=matrix_client.domain)
         self.changes = changes
         self.matrix_client = matrix_client
+        self.invite_batch_size = max(1, invite_batch_size)
+        self.invite_concurrency = max(1, invite_concurrency)
+        self.force_join = force_join
+        self.join = join
 
         self.matrix_room_alias = matrix_room_alias
 
@@ -30,12 +51,21 @@ class AnsibleMatrixRoom(_AnsibleMatrixObject):
         self.communities: Set[str] = set()
 
     async def __aenter__(self):
-        self.matrix_client.sync()
         room_alias_response = await self.matrix_client.room_resolve_alias(self.matrix_room_fq_alias)
 
+        if not self.join:
+            # Read-only: inspect via the admin API, no membership and no sync
+            if isinstance(room_alias_response, RoomResolveAliasResponse):
+                self.matrix_room_id = room_alias_response.room_id
+                await self.room_admin_inspect()
+            return self
+
+        self.matrix_client.sync()
+
         # raise AnsibleMatrixError((await self.matrix_client.whoami()).user_id)
         # Sync encryption keys with the server
         # Required for participating in encrypted rooms
+        await self.matrix_client.load_crypto_store()
         if self.matrix_client.should_upload_keys:
             await self.matrix_client.keys_upload()
 
@@ -129,6 +159,50 @@ class AnsibleMatrixRoom(_AnsibleMatrixObject):
             'new': name
         }
 
+    async def set_history_visibility(self, history_visibility: Optional[str]):
+        if history_visibility is None:
+            return
+
+        if history_visibility == self.matrix_room.history_visibility:
+            return
+
+        event_dict = ChangeHistoryVisibilityBuilder(history_visibility).as_dict()
+        pl_result = await self.matrix_client.room_put_state(
+            room_id=self.matrix_room_id,
+            event_type=event_dict["type"],
+            content=event_dict["content"]
+        )
+
+        if isinstance(pl_result, RoomPutStateError):
+            raise AnsibleMatrixError(pl_result.__dict__)
+
+        self.changes['history_visibility'] = {
+            'old': self.matrix_room.history_visibility,
+            'new': history_visibility
+        }
+
+    async def set_join_rule(self, join_rule: Optional[str]):
+        if join_rule is None:
+            return
+
+        if join_rule == self.matrix_room.join_rule:
+            return
+
+        event_dict = ChangeJoinRulesBuilder(join_rule).as_dict()
+        pl_result = await self.matrix_client.room_put_state(
+            room_id=self.matrix_room_id,
+            event_type=event_dict["type"],
+            content=event_dict["content"]
+        )
+
+        if isinstance(pl_result, RoomPutStateError):
+            raise AnsibleMatrixError(pl_result.__dict__)
+
+        self.changes['join_rule'] = {
+            'old': self.matrix_room.join_rule,
+            'new': join_rule
+        }
+
     # async def set_federate(self, federate):
     #     pass
 
@@ -247,9 +321,16 @@ class AnsibleMatrixRoom(_AnsibleMatrixObject):
 
         return result
 
-    async def set_power_level_overrides(self, content: Optional[Dict]):
+    def _power_levels_content(self) -> Dict[str, Any]:
+        levels = self.matrix_room.power_levels
+        content = deepcopy(levels.defaults.__dict__)
+        content['events'] = deepcopy(levels.events)
+        content['users'] = deepcopy(levels.users)
+        return content
+
+    def _power_level_overrides_diff(self, content: Optional[Dict]) -> Dict[str, Any]:
         if content is None:
-            return
+            return {}
 
         current_levels = self.matrix_room.power_levels.defaults.__dict__
         content_to_apply = {}
@@ -258,16 +339,11 @@ class AnsibleMatrixRoom(_AnsibleMatrixObject):
                 if current_levels[key] != content[key]:
                     content_to_apply[key] = content[key]
 
-        if not bool(content_to_apply):
-            return
+        return content_to_apply
 
-        content_to_apply['users'] = self.matrix_room.power_levels.users
-        await self.set_power_levels(content_to_apply)
-        self.changes['power_level_overrides'] = content_to_apply
-
-    async def set_power_members(self, room_members: Optional[Dict[str, int]]):
+    def _desired_power_members(self, room_members: Optional[Dict[str, int]]) -> Optional[Dict[str, int]]:
         if room_members is None:
-            return
+            return None
 
         power_members = {self.login_to_id(k): v for k, v in room_members.items()}
         power_members[self.matrix_client.user] = 100
@@ -283,8 +359,11 @@ class AnsibleMatrixRoom(_AnsibleMatrixObject):
         )
 
         if len(not_changed.keys()) == len(power_members.keys()):
-            return
+            return None
 
+        return power_members
+
+    async def _sync_membership(self, power_members: Dict[str, int]):
         old_users_set = set(self.matrix_room.users.keys())
         new_users_set = set(map(lambda it: self.login_to_id(it), power_members.keys()))
         new_users_set.add(self.matrix_room.own_user_id)
@@ -294,18 +373,7 @@ class AnsibleMatrixRoom(_AnsibleMatrixObject):
         invited_users = list_subtract(new_users_set, not_changed_users)
 
         existing_members = self.matrix_room.power_levels.users
-
-        # self.changes['users'] = {}
-        # self.changes['users']['old_users_set'] = old_users_set
-        # self.changes['users']['new_users_set'] = new_users_set
-        # self.changes['users']['old_power_levels'] = deepcopy(self.matrix_room.power_levels.users)
-        # self.changes['users']['changed_power_levels'] = dict_subtract(existing_members, not_changed)
-        # self.changes['users']['invited_power_levels'] = dict_subtract(power_members, not_changed)
-        # self.changes['users']['new_power_levels'] = power_members
-        # self.changes['users']['kicked'] = kicked_users
-        # self.changes['users']['invited'] = invited_users
-        #
-        # raise AnsibleMatrixError("Shit!!")
+        not_changed = dicts_intersection(existing_members, power_members)
 
         if self.matrix_client.user in kicked_users:
             raise AnsibleMatrixError("Can't kick self: {}".format(self.matrix_client.user))
@@ -314,28 +382,127 @@ class AnsibleMatrixRoom(_AnsibleMatrixObject):
         #     raise AnsibleMatrixError("Can't kick creator {}".format(self.matrix_room.creator))
 
         # do invites
-        for mxid in invited_users:
-            if mxid not in self.matrix_room.users.keys():
-                await self.matrix_client.room_invite(self.matrix_room_id, mxid)
+        await self._add_members([
+            mxid for mxid in new_users_set
+            if mxid in invited_users and mxid not in self.matrix_room.users.keys()
+        ])
 
         # do kicks
         for mxid in kicked_users:
             await self.matrix_client.room_kick(self.matrix_room_id, mxid)
 
-        # change power levels
-        await self.set_power_levels(
-            {
-                "users": power_members
-            }
-        )
-
         self.changes['users'] = {}
-        self.changes['users']['old_power_levels'] = deepcopy(self.matrix_room.power_levels.users)
+        self.changes['users']['old_power_levels'] = deepcopy(existing_members)
         self.changes['users']['changed_power_levels'] = dict_subtract(existing_members, not_changed)
         self.changes['users']['invited_power_levels'] = dict_subtract(power_members, not_changed)
         self.changes['users']['new_power_levels'] = power_members
         self.changes['users']['kicked'] = kicked_users
-        self.changes['users']['invited'] = invited_users
+        self.changes['users']['invited'] = [mxid for mxid in invited_users if not self._is_force_joined(mxid)]
+        if self.force_join:
+            self.changes['users']['joined'] = [mxid for mxid in invited_users if self._is_force_joined(mxid)]
+
+    async def _join_pending_invites(self, room_members: Optional[Dict[str, int]]):
+        """Turn pending invites of local members into joins in ``force_join`` mode.
+
+        Runs whether or not power levels change, invites left over from
+        earlier runs are converted in rooms that are otherwise converged.
+        """
+        if room_members is None or not self.force_join:
+            return
+
+        pending = [
+            mxid for mxid in map(self.login_to_id, room_members.keys())
+            if mxid in self.matrix_room.invited_users.keys() and self._is_force_joined(mxid)
+        ]
+        if not pending:
+            return
+
+        await self._add_members(pending)
+        joined = self.changes.setdefault('users', {}).setdefault('joined', [])
+        joined.extend(mxid for mxid in pending if mxid not in joined)
+
+    def _is_force_joined(self, mxid: str) -> bool:
+        return self.force_join and mxid.endswith(":{}".format(self.domain))
+
+    async def _force_join(self, mxid: str) -> Optional[str]:
+        # POST /_synapse/admin/v1/join/<room_id_or_alias>
+        path = "/_synapse/admin/v1/join/{}".format(self.matrix_room_id)
+        response = await self.matrix_client.send_json("POST", path, {"user_id": mxid})
+        if response.status >= 400:
+            return f"{response.status}: {await response.text()}"
+
+        return None
+
+    async def _add_member(self, mxid: str) -> Optional[str]:
+        if self._is_force_joined(mxid):
+            return await self._force_join(mxid)
+
+        response = await self.matrix_client.room_invite(self.matrix_room_id, mxid)
+        if isinstance(response, RoomInviteError):
+            return f"{response.status_code}: {response.message}"
+
+        return None
+
+    async def _add_members(self, mxids: List[str]):
+        """Invite or join users batch by batch, each batch concurrently.
+
+        Local users are joined directly through the Synapse admin API when
+        ``force_join`` is set. Batches are bounded by ``invite_batch_size``,
+        requests in flight by ``invite_concurrency``, and rate limit responses
+        are retried by the nio client itself. Failures are collected and
+        reported once every batch had its go.
+        """
+        semaphore = asyncio.Semaphore(self.invite_concurrency)
+
+        async def bounded(mxid: str) -> Optional[str]:
+            async with semaphore:
+                return await self._add_member(mxid)
+
+        failed: Dict[str, str] = {}
+        for i in range(0, len(mxids), self.invite_batch_size):
+            batch = mxids[i:i + self.invite_batch_size]
+            errors = await asyncio.gather(*[bounded(mxid) for mxid in batch])
+            for mxid, error in zip(batch, errors):
+                if error is not None:
+                    failed[mxid] = error
+
+        if failed:
+            raise AnsibleMatrixError(f"Failed to add {len(failed)} user(s) to {self.matrix_room_alias}: {failed}")
+
+    async def set_power(self,
+                        room_members: Optional[Dict[str, int]] = None,
+                        power_level_override: Optional[Dict[str, Any]] = None):
+        """Reconcile members and m.room.power_levels with a single state write.
+
+        The complete desired power_levels content (users plus overrides) is built
+        from the current room state and written at most once, only if it differs.
+        """
+        current_content = self._power_levels_content()
+        content = deepcopy(current_content)
+
+        power_members = self._desired_power_members(room_members)
+        if power_members is not None:
+            await self._sync_membership(power_members)
+            content['users'] = power_members
+
+        await self._join_pending_invites(room_members)
+
+        overrides = self._power_level_overrides_diff(power_level_override)
+        content.update(overrides)
+
+        if content == current_content:
+            return
+
+        await self.set_power_levels(content)
+
+        if overrides:
+            self.changes['power_level_overrides'] = overrides
+
+    async def set_power_level_overrides(self, content: Optional[Dict]):
+        await self.set_power(power_level_override=content)
+
+    async def set_power_members(self, room_members: Optional[Dict[str, int]]):
+        await self.set_power(room_members=room_members)
 
     async def set_avatar(self, in_image: Optional[str]):
         resp = await self.matrix_client.upload_image_if_new(in_image, self.matrix_room.room_avatar_url)
@@ -367,22 +534,23 @@ class AnsibleMatrixRoom(_AnsibleMatrixObject):
             room_members: Optional[Dict[str, int]] = None,
             encrypt: bool = False,
             power_level_override: Optional[Dict[str, Any]] = None,
+            history_visibility: Optional[str] = None,
+            join_rule: Optional[str] = None,
             communities: Optional[List[str]] = None
     ):
         # self.matrix_client.login()
         await self.sync_details()
 
         # await self._become_room_admin(self.matrix_client.user)
-        await self.set_power_members(room_members)
-        await self.sync_details()
-
         await asyncio.gather(
             self.set_encryption(encrypt),
             self.set_avatar(avatar),
             self.set_topic(topic),
             self.set_name(name),
             self.set_visibility(visibility),
-            self.set_power_level_overrides(power_level_override),
+            self.set_history_visibility(history_visibility),
+            self.set_join_rule(join_rule),
+            self.set_power(room_members, power_level_override),
             # self.set_communities(communities),
         )
 
@@ -402,64 +570,160 @@ class AnsibleMatrixRoom(_AnsibleMatrixObject):
             room_members: Optional[Dict[str, int]] = None,
             encrypt: bool = False,
             power_level_override: Optional[Dict[str, Any]] = None,
+            history_visibility: Optional[str] = None,
+            join_rule: Optional[str] = None,
             communities: Optional[List[str]] = None
     ):
         invitees: List[str] = []
+        joiners: List[str] = []
         if room_members is not None:
             invitees = list(map(lambda it: self.login_to_id(it), room_members.keys()))
 
             if self.matrix_client.user_id in invitees:
                 invitees.remove(self.matrix_client.user_id)
 
+            # Force joined users can't be joined before the room exists
+            joiners = [mxid for mxid in invitees if self._is_force_joined(mxid)]
+            invitees = [mxid for mxid in invitees if not self._is_force_joined(mxid)]
+
         room_preset = None
         if preset is not None:
             room_preset = RoomPreset(preset)
 
-        result = await self.matrix_client.room_create(
+        # Everything known upfront goes into the createRoom request itself,
+        # so that the room is born fully configured
+        initial_state: List[Dict[str, Any]] = []
+        if encrypt:
+            initial_state.append(EnableEncryptionBuilder().as_dict())
+
+        if history_visibility is not None:
+            initial_state.append(ChangeHistoryVisibilityBuilder(history_visibility).as_dict())
+
+        if join_rule is not None:
+            initial_state.append(ChangeJoinRulesBuilder(join_rule).as_dict())
+
+        avatar_resp = await self.matrix_client.upload_image_if_new(avatar, None)
+        if avatar_resp is not None:
+            initial_state.append({
+                "type": "m.room.avatar",
+                "state_key": "",
+                "content": {"url": avatar_resp.content_uri}
+            })
+
+        power_level_content = None
+        if power_level_override is not None or room_members is not None:
+            power_level_content = deepcopy(power_level_override) if power_level_override is not None else {}
+            if room_members is not None:
+                power_members = {self.login_to_id(k): v for k, v in room_members.items()}
+                power_members[self.matrix_client.user] = 100
+                power_level_content['users'] = power_members
+
+        create_invitees = invitees[:self.invite_batch_size]
+        room_create_kwargs = dict(
             name=name,
             alias=self.matrix_room_alias,
             visibility=RoomVisibility(visibility),
             topic=topic,
             preset=room_preset,
             federate=federate,
-            invite=invitees,
-            power_level_override=power_level_override
+            initial_state=initial_state,
+            power_level_override=power_level_content
         )
+
+        result = await self.matrix_client.room_create(invite=create_invitees, **room_create_kwargs)
+        if isinstance(result, RoomCreateError) and result.message == "Cannot invite so many users at once":
+            # Server limit is lower than the batch size, create the room alone and invite everybody afterwards
+            create_invitees = []
+            result = await self.matrix_client.room_create(invite=create_invitees, **room_create_kwargs)
+
         if isinstance(result, RoomCreateError):
             if isinstance(result.status_code, str) and result.status_code == "M_ROOM_IN_USE":
                 raise AnsibleMatrixError("can't create room '{}': already exists".format(self.matrix_room_alias))
-            elif result.message == "Cannot invite so many users at once":
-                raise AnsibleMatrixWarning(result.__str__())
             else:
                 raise AnsibleMatrixError("can't create room '{}': {}".format(self.matrix_room_alias, result))
 
         self.matrix_room_id = result.room_id
-
-        await self.sync_details()
-
-        await self.set_encryption(encrypt)
-        await self.set_avatar(avatar)
-        await self.set_power_members(room_members)
-        # await self.set_communities(communities)
-
-        await self.sync_details()
-
         self.changes['created'] = True
+        # await self.set_communities(communities)
 
-    async def send_text(self, message: str, notice: bool = False):
-        message_type = "m.notice" if notice else "m.text"
+        await self._add_members(invitees[len(create_invitees):] + joiners)
 
-        content = {
-            "msgtype": message_type,
+    @staticmethod
+    async def _text_content(message: str, notice: bool = False) -> Dict[str, Any]:
+        return {
+            "msgtype": "m.notice" if notice else "m.text",
             "format": "org.matrix.custom.html",
             "body": message,
             "formatted_body": markdown(message)
         }
 
-        response = await self.matrix_client.room_send(
+    async def send_text(self, message: str, notice: bool = False, idempotency_key: Optional[str] = None,
+                        sent_events: Optional[AnsibleMatrixSentEvents] = None,
+                        retries: int = ANSIBLE_MATRIX_SEND_RETRIES,
+                        ignore_unverified_devices: bool = False) -> Optional[str]:
+        """Send a message and return its event ID.
+
+        With an ``idempotency_key`` the transaction ID is derived from the room,
+        the content and the key. A message already recorded in ``sent_events``
+        is not sent again, otherwise a repeated send is deduplicated by the
+        homeserver for as long as it remembers the transaction.
+        """
+        content = await self._text_content(message, notice)
+        return await self._send_content(content, content, idempotency_key, sent_events, retries,
+                                        ignore_unverified_devices)
+
+    async def send_attachment(self, source: str, name: Optional[str] = None,
+                              idempotency_key: Optional[str] = None,
+                              sent_events: Optional[AnsibleMatrixSentEvents] = None,
+                              retries: int = ANSIBLE_MATRIX_SEND_RETRIES,
+                              ignore_unverified_devices: bool = False) -> Optional[str]:
+        """Send a local file or the body of an http(s) URL as an image, video, audio or file message.
+
+        The upload is streamed and, unless the room is encrypted, reused from
+        ``sent_events`` when the same content was uploaded before.
+        """
+        encrypted = self.matrix_room is not None and self.matrix_room.encrypted
+        upload = await self.matrix_client.upload_media(source, media=sent_events, encrypt=encrypted, filename=name)
+        if upload.uploaded:
+            self.changes['uploaded'] = upload.content_uri
+
+        major_type = upload.mimetype.split("/")[0]
+        content = {
+            "msgtype": "m." + major_type if major_type in ("image", "video", "audio") else "m.file",
+            "body": upload.filename,
+            "info": {
+                "mimetype": upload.mimetype,
+                "size": upload.size
+            }
+        }
+        if upload.file is not None:
+            content["file"] = upload.file
+        else:
+            content["url"] = upload.content_uri
+
+        # Encrypted uploads differ on every run, the same content is the same message
+        identity = {"msgtype": content["msgtype"], "body": upload.filename, "sha256": upload.sha256}
+        return await self._send_content(content, identity, idempotency_key, sent_events, retries,
+                                        ignore_unverified_devices)
+
+    async def _send_content(self, content: Dict[str, Any], identity: Dict[str, Any],
+                            idempotency_key: Optional[str], sent_events: Optional[AnsibleMatrixSentEvents],
+                            retries: int, ignore_unverified_devices: bool = False) -> Optional[str]:
+        tx_id = None
+        if idempotency_key is not None:
+            tx_id = transaction_id(self.matrix_room_id, identity, idempotency_key)
+            if sent_events is not None:
+                event_id = sent_events.get(tx_id)
+                if event_id is not None:
+                    return event_id
+
+        response = await self.matrix_client.room_send_retrying(
             self.matrix_room_id,
             message_type="m.room.message",
-            content=content
+            content=content,
+            tx_id=tx_id,
+            retries=retries,
+            ignore_unverified_devices=ignore_unverified_devices
         )
 
         if isinstance(response, ErrorResponse):
@@ -468,6 +732,68 @@ class AnsibleMatrixRoom(_AnsibleMatrixObject):
             )
         elif isinstance(response, RoomSendResponse):
             self.changes['event_id'] = response.event_id
+            if tx_id is not None and sent_events is not None:
+                sent_events.put(tx_id, self.matrix_room_id, response.event_id)
+            return response.event_id
+
+        return None
+
+    async def upsert_text(self, message: str, key: str, sent_events: AnsibleMatrixSentEvents,
+                          notice: bool = False, retries: int = ANSIBLE_MATRIX_SEND_RETRIES,
+                          ignore_unverified_devices: bool = False) -> str:
+        """Keep a single message per ``key`` up to date and return its original event ID.
+
+        The first run sends the message, later runs send an ``m.replace`` edit
+        of it, or nothing at all while the content is unchanged.
+        """
+        content = await self._text_content(message, notice)
+        new_hash = content_hash(content)
+
+        upsert = sent_events.get_upsert(self.matrix_room_id, key)
+        if upsert is None:
+            event_id = await self.send_text(message, notice, idempotency_key=key, sent_events=sent_events,
+                                            retries=retries, ignore_unverified_devices=ignore_unverified_devices)
+            sent_events.put_upsert(self.matrix_room_id, key, event_id, new_hash)
+            return event_id
+
+        event_id, old_hash, latest_event_id = upsert
+        if old_hash == new_hash:
+            return event_id
+
+        # Clients without edit support show the fallback body
+        edit = {
+            "msgtype": content["msgtype"],
+            "format": content["format"],
+            "body": "* " + content["body"],
+            "formatted_body": "* " + content["formatted_body"],
+            "m.new_content": content,
+            "m.relates_to": {
+                "rel_type": "m.replace",
+                "event_id": event_id
+            }
+        }
+
+        response = await self.matrix_client.room_send_retrying(
+            self.matrix_room_id,
+            message_type="m.room.message",
+            content=edit,
+            # Every edit replaces the previous one, so A -> B -> A -> B sends a new edit each time
+            # while a retried or re-run edit of the same message state keeps its transaction
+            tx_id=transaction_id(self.matrix_room_id, {"replaces": latest_event_id, "content": edit}, key),
+            retries=retries,
+            ignore_unverified_devices=ignore_unverified_devices
+        )
+
+        if isinstance(response, ErrorResponse):
+            raise AnsibleMatrixError(
+                f"Failed to edit message {event_id} in {self.matrix_room_alias} "
+                f"due to {response.status_code}: {response.message}"
+            )
+
+        self.changes['edited'] = event_id
+        self.changes['event_id'] = response.event_id
+        sent_events.put_upsert(self.matrix_room_id, key, event_id, new_hash, response.event_id)
+        return event_id
 
     async def delete(self, block: bool = False, purge: bool = False):
         path = "/_synapse/admin/v1/rooms/{}/delete".format(self.matrix_room_id)
@@ -487,13 +813,16 @@ class AnsibleMatrixRoom(_AnsibleMatrixObject):
         self.changes['delete'] = await response.json()
 
     def matrix_room_to_dict(self) -> dict:
+        if self.matrix_room is None and self.matrix_room_id in self.matrix_client.rooms:
+            self.matrix_room = self.matrix_client.rooms[self.matrix_room_id]
+
         if self.matrix_room is None:
             return {}
         room = self.matrix_room
         room_dict = dict()
         room_dict['id'] = self.matrix_room_id
         room_dict['canonical_alias'] = room.canonical_alias
-        room_dict['users'] = room.users.keys()
+        room_dict['users'] = list(room.users.keys())
         room_dict['user_levels'] = list(
             map(lambda it: "{}: {}".format(it.user_id, it.power_level), room.users.values())
         )
@@ -518,6 +847,23 @@ class AnsibleMatrixRoom(_AnsibleMatrixObject):
         room_dict['history_visibility'] = room.history_visibility
         return room_dict
 
+    def matrix_room_snapshot(self) -> dict:
+        """Room dictionary extended with the state needed to answer reads offline."""
+        room_dict = self.matrix_room_to_dict()
+        if not room_dict:
+            return room_dict
+
+        room_dict['avatar'] = self.matrix_room.room_avatar_url
+        room_dict['encrypted'] = self.matrix_room.encrypted
+        room_dict['join_rule'] = self.matrix_room.join_rule
+        room_dict['power_levels'] = self._power_levels_content()
+        return room_dict
+
+    @staticmethod
+    def snapshot_to_room_dict(snapshot: dict) -> dict:
+        """The ``matrix_room_to_dict`` part of a snapshot, what a live read registers."""
+        return {k: v for k, v in snapshot.items() if k not in ROOM_SNAPSHOT_ONLY_KEYS}
+
     async def sync_details(self):
         if self.matrix_room_id not in self.matrix_client.rooms:
             await self.room_admin_get_details()
@@ -526,6 +872,33 @@ class AnsibleMatrixRoom(_AnsibleMatrixObject):
         else:
             self.matrix_room = self.matrix_client.rooms[self.matrix_room_id]
 
+    async def room_admin_inspect(self):
+        """Load the complete room state through the Synapse admin API without joining.
+
+        Room details and the full state are requested concurrently. Member and
+        power level state events are fed into the MatrixRoom the same way a sync
+        would, so the result is interchangeable with a joined room.
+        """
+        # GET /_synapse/admin/v1/rooms/<room_id>/state
+        path = "/_synapse/admin/v1/rooms/{}/state".format(self.matrix_room_id)
+
+        try:
+            _, response = await asyncio.gather(
+                self.room_admin_get_details(),
+                self.matrix_client.send_json("GET", path)
+            )
+            response.raise_for_status()
+        except ClientResponseError as e:
+            raise AnsibleMatrixError(f"Failed to inspect {self.matrix_room_fq_alias}: {e.status} {e.message}")
+        state = await response.json()
+
+        for event_dict in state['state']:
+            event = Event.parse_event(event_dict)
+            if isinstance(event, RoomMemberEvent):
+                self.matrix_room.handle_membership(event)
+            elif isinstance(event, Event):
+                self.matrix_room.handle_event(event)
+
     async def room_admin_get_details(self):
         # GET /_synapse/admin/v1/rooms/<room_id>
         path = "/_synapse/admin/v1/rooms/{}".format(self.matrix_room_id)
@@ -0,0 +1,113 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from nio import JoinResponse, RoomGetStateError, RoomPutStateError, RoomResolveAliasResponse
+
+from ansible_collections.eraga.matrix.plugins.module_utils.client_model import _AnsibleMatrixObject
+from ansible_collections.eraga.matrix.plugins.module_utils.errors import AnsibleMatrixError
+
+# State writes in flight at once
+DEFAULT_STATE_CONCURRENCY = 10
+
+# Written after everything else, lowering the bot's own power would fail the rest
+STATE_WRITTEN_LAST = ('m.room.power_levels',)
+
+
+def _state_key(event: Dict[str, Any]) -> Tuple[str, str]:
+    return event['type'], event.get('state_key') or ""
+
+
+class AnsibleMatrixRoomState(_AnsibleMatrixObject):
+    """Arbitrary state events of a room, written only where they differ.
+
+    The current state is read with a single request, desired events are
+    compared with it as a whole and only the differing ones are PUT,
+    concurrently. A desired empty content matches a missing event.
+    """
+
+    def __init__(self, matrix_client, room: str, changes: Dict[str, Any],
+                 join: bool = True, concurrency: int = DEFAULT_STATE_CONCURRENCY):
+        super().__init__(domain=matrix_client.domain)
+        self.matrix_client = matrix_client
+        self.room = self.room_alias_to_mx_alias(room)
+        self.changes = changes
+        self.join = join
+        self.concurrency = max(1, concurrency)
+
+        self.room_id: Optional[str] = None
+        self.state: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    async def __aenter__(self):
+        if self.room.startswith("!"):
+            self.room_id = self.room
+        else:
+            response = await self.matrix_client.room_resolve_alias(self.room)
+            if not isinstance(response, RoomResolveAliasResponse):
+                raise AnsibleMatrixError(f"No room with alias {self.room}: {response.message}")
+            self.room_id = response.room_id
+
+        await self.load()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.matrix_client.close()
+
+    async def load(self):
+        response = await self.matrix_client.room_get_state(self.room_id)
+
+        if isinstance(response, RoomGetStateError) and self.join:
+            join_response = await self.matrix_client.join(self.room_id)
+            if isinstance(join_response, JoinResponse):
+                self.changes['joined'] = self.room_id
+                response = await self.matrix_client.room_get_state(self.room_id)
+
+        if isinstance(response, RoomGetStateError):
+            raise AnsibleMatrixError(
+                f"Couldn't read state of {self.room}: {response.status_code} {response.message}"
+            )
+
+        self.state = {_state_key(event): event.get('content') or {} for event in response.events}
+
+    def diff(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Desired events differing from the current state, power levels last."""
+        desired = {_state_key(event): event.get('content') or {} for event in events}
+
+        differing = [
+            {'type': event_type, 'state_key': state_key, 'old': self.state.get((event_type, state_key)),
+             'new': content}
+            for (event_type, state_key), content in desired.items()
+            if self.state.get((event_type, state_key), {}) != content
+        ]
+        differing.sort(key=lambda change: change['type'] in STATE_WRITTEN_LAST)
+        return differing
+
+    async def apply(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        differing = self.diff(events)
+        first = [change for change in differing if change['type'] not in STATE_WRITTEN_LAST]
+        last = [change for change in differing if change['type'] in STATE_WRITTEN_LAST]
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def put(change: Dict[str, Any]) -> Optional[str]:
+            async with semaphore:
+                response = await self.matrix_client.room_put_state(
+                    self.room_id, change['type'], change['new'], state_key=change['state_key']
+                )
+            if isinstance(response, RoomPutStateError):
+                return f"{response.status_code} {response.message}"
+
+            self.state[(change['type'], change['state_key'])] = change['new']
+            self.changes.setdefault('state', []).append(change)
+            return None
+
+        failed: Dict[str, str] = {}
+        for changes in (first, last):
+            errors = await asyncio.gather(*[put(change) for change in changes])
+            for change, error in zip(changes, errors):
+                if error is not None:
+                    failed["{}/{}".format(change['type'], change['state_key'])] = error
+
+            if failed:
+                raise AnsibleMatrixError(f"Failed to write {len(failed)} state event(s) of {self.room}: {failed}")
+
+        return differing
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Optional, Tuple
+
+SENT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sent_events (
+    txn_id TEXT PRIMARY KEY,
+    room_id TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    sent_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS upserts (
+    room_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    latest_event_id TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (room_id, key)
+);
+
+CREATE TABLE IF NOT EXISTS media (
+    sha256 TEXT PRIMARY KEY,
+    content_uri TEXT NOT NULL,
+    mimetype TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS media_urls (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    sha256 TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def transaction_id(room_id: str, content: Dict[str, Any], key: str) -> str:
+    """Transaction ID derived from the room, the event content and a caller chosen key.
+
+    The same message sent again with the same key gets the same ID, which the
+    homeserver answers with the original event instead of posting it twice,
+    as long as it still remembers the transaction: for a limited time and
+    only for the same access token or device.
+    """
+    digest = hashlib.sha256(
+        json.dumps([room_id, content, key], sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+    return "ansible-{}".format(digest[:40])
+
+
+def content_hash(content: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(content, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+class AnsibleMatrixSentEvents(object):
+    """Local SQLite record of the event IDs returned for deterministic transaction IDs.
+
+    A send whose transaction is already recorded is not sent again at all.
+    Keyed messages additionally remember their original event and the hash
+    of their current content, so that they can be edited in place. Uploaded
+    media is remembered by content hash, and URLs by their cache validators,
+    so the same file is uploaded once however many rooms it is sent to.
+    Shared between concurrent Ansible forks like the snapshot store.
+    """
+
+    def __init__(self, path: str):
+        path = os.path.expanduser(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SENT_SCHEMA)
+
+        upsert_columns = [row[1] for row in self.db.execute("PRAGMA table_info(upserts)")]
+        if 'latest_event_id' not in upsert_columns:
+            self.db.execute("ALTER TABLE upserts ADD COLUMN latest_event_id TEXT")
+
+    def close(self):
+        self.db.close()
+
+    def get(self, txn_id: str) -> Optional[str]:
+        row = self.db.execute("SELECT event_id FROM sent_events WHERE txn_id = ?", (txn_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def put(self, txn_id: str, room_id: str, event_id: str):
+        self.db.execute(
+            "INSERT OR REPLACE INTO sent_events (txn_id, room_id, event_id, sent_at) VALUES (?, ?, ?, ?)",
+            (txn_id, room_id, event_id, time.time())
+        )
+
+    def get_upsert(self, room_id: str, key: str) -> Optional[Tuple[str, str, str]]:
+        """Original event ID, current content hash and latest edit event ID of a keyed message.
+
+        The latest edit is the original event itself until the message is edited.
+        """
+        row = self.db.execute(
+            "SELECT event_id, content_hash, latest_event_id FROM upserts WHERE room_id = ? AND key = ?",
+            (room_id, key)
+        ).fetchone()
+        return (row[0], row[1], row[2] or row[0]) if row is not None else None
+
+    def put_upsert(self, room_id: str, key: str, event_id: str, content_hash: str,
+                   latest_event_id: Optional[str] = None):
+        self.db.execute(
+            "INSERT OR REPLACE INTO upserts (room_id, key, event_id, content_hash, latest_event_id, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (room_id, key, event_id, content_hash, latest_event_id or event_id, time.time())
+        )
+
+    def get_media(self, sha256: str) -> Optional[Tuple[str, str, int]]:
+        """Content URI, mime type and size of unencrypted media uploaded before."""
+        row = self.db.execute(
+            "SELECT content_uri, mimetype, size FROM media WHERE sha256 = ?", (sha256,)
+        ).fetchone()
+        return (row[0], row[1], row[2]) if row is not None else None
+
+    def put_media(self, sha256: str, content_uri: str, mimetype: str, size: int):
+        self.db.execute(
+            "INSERT OR REPLACE INTO media (sha256, content_uri, mimetype, size, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (sha256, content_uri, mimetype, size, time.time())
+        )
+
+    def get_media_url(self, url: str) -> Optional[Tuple[Optional[str], Optional[str], str]]:
+        """ETag, Last-Modified and content hash of the last download of ``url``."""
+        row = self.db.execute(
+            "SELECT etag, last_modified, sha256 FROM media_urls WHERE url = ?", (url,)
+        ).fetchone()
+        return (row[0], row[1], row[2]) if row is not None else None
+
+    def put_media_url(self, url: str, etag: Optional[str], last_modified: Optional[str], sha256: str):
+        self.db.execute(
+            "INSERT OR REPLACE INTO media_urls (url, etag, last_modified, sha256, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (url, etag, last_modified, sha256, time.time())
+        )
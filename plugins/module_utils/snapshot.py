@@ -0,0 +1,160 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+SNAPSHOT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rooms (
+    room_id TEXT PRIMARY KEY,
+    alias TEXT,
+    snapshot TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rooms_alias ON rooms (alias);
+
+CREATE TABLE IF NOT EXISTS users (
+    mxid TEXT PRIMARY KEY,
+    snapshot TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+# Never persisted to the local snapshot database
+SNAPSHOT_SECRET_FIELDS = ('password_hash',)
+
+
+def room_record_to_snapshot(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize an admin room list record to the keys of ``matrix_room_to_dict``.
+
+    Admin list records carry neither members nor power levels, such snapshots
+    are partial and have no ``power_levels`` key.
+    """
+    return {
+        'id': record['room_id'],
+        'canonical_alias': record.get('canonical_alias'),
+        'name': record.get('name'),
+        'federate': record.get('federatable'),
+        'room_version': record.get('version'),
+        'history_visibility': record.get('history_visibility'),
+        'encrypted': record.get('encryption') is not None,
+    }
+
+
+class AnsibleMatrixSnapshots(object):
+    """Local SQLite store of normalized room and account snapshots.
+
+    Rooms are indexed by room ID and alias, accounts by Matrix ID. A snapshot
+    is only returned while it is younger than the requested TTL, so callers
+    can skip reading from the homeserver when a fresh one is available.
+    The database is shared between concurrent Ansible forks, writes are short
+    transactions and readers never block writers thanks to WAL journaling.
+    """
+
+    def __init__(self, path: str):
+        path = os.path.expanduser(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SNAPSHOT_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    @staticmethod
+    def _scrub(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in snapshot.items() if k not in SNAPSHOT_SECRET_FIELDS}
+
+    @staticmethod
+    def _fresh(row: Optional[Tuple[str, float]], ttl: Optional[float]) -> Optional[Any]:
+        if row is None:
+            return None
+
+        value, updated_at = row
+        if ttl is not None and time.time() - updated_at > ttl:
+            return None
+
+        return json.loads(value)
+
+    def get_room(self, room_id: Optional[str] = None, alias: Optional[str] = None,
+                 ttl: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        if room_id is not None:
+            row = self.db.execute(
+                "SELECT snapshot, updated_at FROM rooms WHERE room_id = ?", (room_id,)
+            ).fetchone()
+        else:
+            row = self.db.execute(
+                "SELECT snapshot, updated_at FROM rooms WHERE alias = ? ORDER BY updated_at DESC LIMIT 1", (alias,)
+            ).fetchone()
+
+        return self._fresh(row, ttl)
+
+    def put_room(self, room_id: str, alias: Optional[str], snapshot: Dict[str, Any]):
+        self.db.execute(
+            "INSERT OR REPLACE INTO rooms (room_id, alias, snapshot, updated_at) VALUES (?, ?, ?, ?)",
+            (room_id, alias, json.dumps(self._scrub(snapshot), default=list), time.time())
+        )
+
+    def delete_room(self, room_id: Optional[str] = None, alias: Optional[str] = None):
+        if room_id is not None:
+            self.db.execute("DELETE FROM rooms WHERE room_id = ?", (room_id,))
+        if alias is not None:
+            self.db.execute("DELETE FROM rooms WHERE alias = ?", (alias,))
+
+    def get_user(self, mxid: str, ttl: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        row = self.db.execute(
+            "SELECT snapshot, updated_at FROM users WHERE mxid = ?", (mxid,)
+        ).fetchone()
+
+        return self._fresh(row, ttl)
+
+    def put_user(self, mxid: str, snapshot: Dict[str, Any]):
+        self.db.execute(
+            "INSERT OR REPLACE INTO users (mxid, snapshot, updated_at) VALUES (?, ?, ?)",
+            (mxid, json.dumps(self._scrub(snapshot)), time.time())
+        )
+
+    def delete_user(self, mxid: str):
+        self.db.execute("DELETE FROM users WHERE mxid = ?", (mxid,))
+
+    # Plain key-value storage backing the Ansible cache plugin
+
+    def get(self, key: str, ttl: Optional[float] = None) -> Optional[Any]:
+        row = self.db.execute(
+            "SELECT value, updated_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+
+        return self._fresh(row, ttl)
+
+    def put(self, key: str, value: Any):
+        self.db.execute(
+            "INSERT OR REPLACE INTO cache (key, value, updated_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time())
+        )
+
+    def delete(self, key: str):
+        self.db.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def prune(self, prefix: str, ttl: float):
+        """Delete the entries under ``prefix`` older than ``ttl``."""
+        self.db.execute(
+            "DELETE FROM cache WHERE substr(key, 1, ?) = ? AND updated_at < ?",
+            (len(prefix), prefix, time.time() - ttl)
+        )
+
+    def keys(self, ttl: Optional[float] = None) -> List[str]:
+        since = 0 if ttl is None else time.time() - ttl
+        return [key for (key,) in self.db.execute("SELECT key FROM cache WHERE updated_at >= ?", (since,))]
+
+    def flush(self):
+        self.db.execute("DELETE FROM cache")
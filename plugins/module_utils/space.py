@@ -1,6 +1,8 @@
-from typing import Dict, List, Optional
+import asyncio
+from typing import Any, Dict, List, Optional, Set
 
 from aiohttp import ClientResponseError
+from nio import Api, RoomPutStateError, RoomResolveAliasResponse
 
 from ansible_collections.eraga.matrix.plugins.module_utils.errors import AnsibleMatrixError
 
@@ -11,9 +13,18 @@ class AnsibleMatrixSpace:
     def __init__(self, matrix_client, localpart: str, changes: Dict):
         self.matrix = matrix_client
         self.localpart = localpart
-        self.space_id = f"!{localpart}:{matrix_client.domain}"
+        if localpart.startswith("!") and ":" in localpart:
+            self.space_id = localpart
+        else:
+            self.space_id = f"!{localpart}:{matrix_client.domain}"
         self.changes = changes
 
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.matrix.close()
+
     async def exists(self) -> bool:
         try:
             await self.matrix.room_get_state(self.space_id)
@@ -64,13 +75,12 @@ class AnsibleMatrixSpace:
         for room_id in rooms:
             # Convert alias to room_id if needed
             if room_id.startswith('#'):
-                try:
-                    room_info = await self.matrix.room_resolve_alias(room_id)
-                    room_id = room_info['room_id']
-                except:
+                room_info = await self.matrix.room_resolve_alias(room_id)
+                if not isinstance(room_info, RoomResolveAliasResponse):
                     raise AnsibleMatrixError(f"Could not resolve room alias: {room_id}")
+                room_id = room_info.room_id
 
-            await self.matrix.send_state_event(
+            response = await self.matrix.room_put_state(
                 self.space_id,
                 "m.space.child",
                 {
@@ -79,6 +89,8 @@ class AnsibleMatrixSpace:
                 },
                 state_key=room_id
             )
+            if isinstance(response, RoomPutStateError):
+                raise AnsibleMatrixError(f"Could not add {room_id} to {self.space_id}: {response.message}")
 
     async def _update_members(self, members: List[str]):
         # Invite members to the space
@@ -114,3 +126,105 @@ class AnsibleMatrixSpace:
             },
             state_key=parent_id
         )
+
+    async def _get_hierarchy_level(self, space_id: str, suggested_only: bool = False,
+                                   limit: int = 50, root: bool = False) -> List[Dict[str, Any]]:
+        """Fetch the direct children of a space following ``next_batch`` pagination.
+
+        The first returned entry is the space itself. Sub-spaces the bot can't
+        see are skipped, an inaccessible ``root`` space fails.
+        """
+        rooms: List[Dict[str, Any]] = []
+        next_batch: Optional[str] = None
+
+        while True:
+            query = {
+                "max_depth": 1,
+                "limit": limit,
+                "suggested_only": "true" if suggested_only else "false"
+            }
+            if next_batch is not None:
+                query["from"] = next_batch
+
+            path = Api._build_path(["rooms", space_id, "hierarchy"], query, "/_matrix/client/v1")
+            response = await self.matrix.send_json("GET", path)
+            if response.status in (403, 404) and not root:
+                return rooms
+
+            try:
+                response.raise_for_status()
+            except ClientResponseError as e:
+                raise AnsibleMatrixError(f"Failed to read hierarchy of {space_id}: {e.status} {e.message}")
+            page = await response.json()
+            rooms.extend(page.get('rooms', []))
+
+            next_batch = page.get('next_batch')
+            if not next_batch:
+                return rooms
+
+    async def get_hierarchy(self, max_depth: Optional[int] = None, suggested_only: bool = False,
+                            limit: int = 50) -> List[Dict[str, Any]]:
+        """Walk the space tree breadth-first and return it as a flat list.
+
+        Every level is requested concurrently, one ``/hierarchy`` call chain per
+        space of that level. Each entry carries the depth it was first seen at
+        and the ids of all parent spaces referencing it.
+        """
+        root_id = self.space_id
+
+        tree: Dict[str, Dict[str, Any]] = {}
+        visited: Set[str] = set()
+        frontier = [root_id]
+        depth = 0
+
+        while frontier:
+            visited.update(frontier)
+            levels = await asyncio.gather(*[
+                self._get_hierarchy_level(space_id, suggested_only, limit, root=space_id == root_id)
+                for space_id in frontier
+            ])
+
+            next_frontier: List[str] = []
+            for space_id, rooms in zip(frontier, levels):
+                if not rooms:
+                    continue
+
+                space, children = rooms[0], rooms[1:]
+                if space_id == root_id:
+                    tree[root_id] = self._hierarchy_entry(space, depth=0, parent_id=None)
+
+                if max_depth is not None and depth >= max_depth:
+                    continue
+
+                for child in children:
+                    child_id = child['room_id']
+                    if child_id in tree:
+                        if space_id not in tree[child_id]['parents']:
+                            tree[child_id]['parents'].append(space_id)
+                        continue
+
+                    tree[child_id] = self._hierarchy_entry(child, depth=depth + 1, parent_id=space_id)
+                    if child.get('room_type') == "m.space" and child_id not in visited:
+                        next_frontier.append(child_id)
+
+            frontier = next_frontier
+            depth += 1
+
+        return list(tree.values())
+
+    @staticmethod
+    def _hierarchy_entry(room: Dict[str, Any], depth: int, parent_id: Optional[str]) -> Dict[str, Any]:
+        return {
+            'id': room['room_id'],
+            'name': room.get('name'),
+            'topic': room.get('topic'),
+            'canonical_alias': room.get('canonical_alias'),
+            'avatar': room.get('avatar_url'),
+            'room_type': room.get('room_type'),
+            'is_space': room.get('room_type') == "m.space",
+            'join_rule': room.get('join_rule'),
+            'num_joined_members': room.get('num_joined_members', 0),
+            'depth': depth,
+            'parents': [parent_id] if parent_id is not None else [],
+            'children': [evt['state_key'] for evt in room.get('children_state', [])]
+        }
@@ -26,7 +26,8 @@ class AnsibleMatrixUser(_AnsibleMatrixObject):
     def __init__(self,
                  matrix_client: AnsibleMatrixClient,
                  login: str,
-                 changes: Dict[str, Any] = ()
+                 changes: Dict[str, Any] = (),
+                 snapshot: Optional[Dict[str, Any]] = None
                  ):
         super().__init__(domain=matrix_client.domain)
         self.mxid = self.login_to_id(login)
@@ -34,8 +35,15 @@ class AnsibleMatrixUser(_AnsibleMatrixObject):
         self.changes = changes
         self._api_user_path = "/_synapse/admin/v2/users/{}".format(self.mxid)
         self.account: Optional[AnsibleMatrixAccount] = None
+        self.snapshot = snapshot
 
     async def __aenter__(self):
+        if self.snapshot is not None:
+            # Fresh local snapshot, no need to read the account from the server
+            self.account = AnsibleMatrixAccount.from_dict(self.snapshot)
+            self.account.mxid = self.mxid
+            return self
+
         await self.matrix_client.sync()
         await self._load_account()
 
@@ -138,4 +146,5 @@ class AnsibleMatrixUser(_AnsibleMatrixObject):
         await self.set_avatar(avatar)
         await self.set_displayname(displayname)
         await self.set_admin(admin)
-        await self._load_account()
+        if self.changes:
+            await self._load_account()
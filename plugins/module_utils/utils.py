@@ -1,5 +1,7 @@
 import os.path
 import base64
+import hashlib
+import io
 import mimetypes
 import tempfile
 from typing import *
@@ -21,6 +23,14 @@ def detect_mime_type(file: str, default: Optional[str] = None) -> str:
     return mime
 
 
+def file_sha256(file: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 def file2data(file: str, mime: Optional[str] = None) -> str:
     mime_type = detect_mime_type(file, mime)
 
@@ -37,9 +47,7 @@ def file2data(file: str, mime: Optional[str] = None) -> str:
     return base64image
 
 
-def url2file(url: str, tmp: tempfile.TemporaryDirectory) -> (str, str):
-    r = requests.get(url)
-    mime = r.headers['content-type']
+def url_file_name(url: str, mime: str) -> str:
     file_suffix = ""
     if "jpeg" in mime:
         file_suffix = ".jpeg"
@@ -48,7 +56,12 @@ def url2file(url: str, tmp: tempfile.TemporaryDirectory) -> (str, str):
     elif "svg" in mime:
         file_suffix = ".svg"
 
-    file_name = url.split("/").pop() + file_suffix
+    return url.split("/").pop() + file_suffix
+
+
+def url2file(url: str, tmp: tempfile.TemporaryDirectory) -> (str, str):
+    r = requests.get(url)
+    file_name = url_file_name(url, r.headers['content-type'])
     path = os.path.join(tmp.name,  file_name)
     with open(path, 'wb') as f:
         f.write(r.content)
@@ -59,12 +72,13 @@ def url2file(url: str, tmp: tempfile.TemporaryDirectory) -> (str, str):
 def if_svg_convert_to_png(
         image: str,
         mime: str,
-        tmp: tempfile.TemporaryDirectory,
+        tmp: Union[tempfile.TemporaryDirectory, str],
         output_height=600) -> (str, str):
     mime_type = mime
     if "image/svg" in mime_type:
         base_name = os.path.basename(image) + '.png'
-        file_name = os.path.join(tmp.name,  base_name)
+        tmp_dir = tmp if isinstance(tmp, str) else tmp.name
+        file_name = os.path.join(tmp_dir,  base_name)
         with open(image, "rb") as image_file:
             svg2png(file_obj=image_file, write_to=file_name, output_height=output_height)
         image = file_name
@@ -72,6 +86,50 @@ def if_svg_convert_to_png(
 
     return image, mime_type
 
+
+def normalize_image(
+        source: Union[str, bytes],
+        target: str,
+        max_width: int,
+        max_height: int,
+        image_format: str,
+        quality: int,
+        strip_metadata: bool = True) -> str:
+    """Shrink an image to fit ``max_width`` x ``max_height`` and re-encode it to ``target``.
+
+    Images are never enlarged. Metadata (EXIF, ICC profile, text chunks) is
+    dropped unless ``strip_metadata`` is false, the EXIF orientation is applied
+    to the pixels first so that stripping does not turn photos sideways.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        raise ImageError("Image normalization requires Pillow, install it with pip install Pillow")
+
+    with Image.open(source if isinstance(source, str) else io.BytesIO(source)) as original:
+        image = ImageOps.exif_transpose(original)
+        image.thumbnail((max_width, max_height))
+
+        if image_format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA")
+
+        options = dict(quality=quality, optimize=True)
+        if not strip_metadata:
+            # exif_transpose left the EXIF of the result without the orientation
+            for key in ("exif", "icc_profile"):
+                if image.info.get(key):
+                    options[key] = image.info[key]
+
+        # Written next to the target and moved, concurrent forks never see half an image
+        partial = "{}.{}.part".format(target, os.getpid())
+        image.save(partial, format=image_format.upper(), **options)
+        os.replace(partial, target)
+
+    return target
+
+
 def url2data(url: str) -> str:
     (file, mime) = url2file(url)
     return file2data(file, mime)
@@ -4,6 +4,7 @@ from ansible.module_utils.basic import AnsibleModule
 
 from ansible_collections.eraga.matrix.plugins.module_utils.community import AnsibleMatrixCommunity
 from ansible_collections.eraga.matrix.plugins.module_utils.room import *
+from ansible_collections.eraga.matrix.plugins.module_utils.profiling import run_async_module
 import warnings
 
 warnings.warn(
@@ -60,6 +61,7 @@ async def run_module():
         localpart=dict(type='str', required=True),
         name=dict(type='str', default=None),
         avatar=dict(type='str', default=None),
+        avatar_normalize=dict(type='dict', default=None, options=AVATAR_NORMALIZE_OPTIONS),
         description=dict(type='str', default=None),
         long_description=dict(type='str', default=None),
         visibility=dict(type='str', default=None),
@@ -87,7 +89,8 @@ async def run_module():
         domain=module.params["matrix_domain"],
         uri=module.params['matrix_uri'],
         token=module.params['matrix_token'],
-        user=module.params['matrix_user']
+        user=module.params['matrix_user'],
+        image_normalization=module.params['avatar_normalize']
     )
 
     community = AnsibleMatrixCommunity(
@@ -113,6 +116,7 @@ async def run_module():
             del params['matrix_token']
             del params['localpart']
             del params['state']
+            del params['avatar_normalize']
 
             if state == 'present':
                 await community.update(**params)
@@ -139,7 +143,7 @@ async def run_module():
 
 
 def main():
-    asyncio.get_event_loop().run_until_complete(run_module())
+    run_async_module(run_module, "community")
 
 
 if __name__ == '__main__':
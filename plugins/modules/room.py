@@ -3,6 +3,8 @@ import copy
 from ansible.module_utils.basic import AnsibleModule
 
 from ansible_collections.eraga.matrix.plugins.module_utils.room import *
+from ansible_collections.eraga.matrix.plugins.module_utils.snapshot import AnsibleMatrixSnapshots
+from ansible_collections.eraga.matrix.plugins.module_utils.profiling import run_async_module
 
 ANSIBLE_METADATA = {
     'metadata_version': '1.0',
@@ -22,6 +24,21 @@ ANSIBLE_METADATA = {
     topic: This is room managed by ansible 
     preset: trusted_private_chat
     avatar: "https://example.com/path/to/avatar.png"
+
+- name: Room avatar from a large logo, shrunk and re-encoded once before it is uploaded
+  eraga.matrix.room:
+    matrix_uri: "https://matrix.example.com"
+    matrix_user:  ansiblebot
+    matrix_token: "{{token}}"
+    matrix_domain: example.com
+    alias: example_room
+    avatar: "https://example.com/path/to/logo.png"
+    # requires Pillow, results are cached by source hash in cache_dir
+    avatar_normalize:
+      max_width: 256
+      max_height: 256
+      format: webp
+      quality: 80
     
 - name: Room exists and is part of 'test' and 'prod' community
   eraga.matrix.room:
@@ -36,6 +53,8 @@ ANSIBLE_METADATA = {
     visibility: private
     preset: trusted_private_chat
     avatar: "/path/to/avatar.png"
+    history_visibility: joined
+    join_rule: invite
     communities:
       - test
       - prod
@@ -52,6 +71,42 @@ ANSIBLE_METADATA = {
       redact: 50
       invite: 50
     community: Example    
+
+- name: Local members are joined right away instead of being invited
+  eraga.matrix.room:
+    matrix_uri: "https://matrix.example.com"
+    matrix_user:  ansiblebot
+    matrix_token: "{{token}}"
+    matrix_domain: example.com
+    alias: example_room
+    force_join: yes
+    # at most 5 invites or joins in flight, rate limited ones are retried by nio
+    invite_concurrency: 5
+    room_members:
+      owner_login: 100
+      user_login: 0
+
+- name: Read room state without joining it
+  eraga.matrix.room:
+    matrix_uri: "https://matrix.example.com"
+    matrix_user:  ansiblebot
+    matrix_token: "{{token}}"
+    matrix_domain: example.com
+    alias: example_room
+    admin_inspect: yes
+  check_mode: yes
+  register: example_room
+
+- name: Read room state from a local snapshot younger than 10 minutes
+  eraga.matrix.room:
+    matrix_uri: "https://matrix.example.com"
+    matrix_user:  ansiblebot
+    matrix_token: "{{token}}"
+    matrix_domain: example.com
+    alias: example_room
+    snapshot_db: ~/.cache/ansible-matrix/snapshots.db
+    snapshot_ttl: 600
+  check_mode: yes
 """
 
 
@@ -63,12 +118,14 @@ async def run_module():
         matrix_user=dict(type="str", default=None),
         matrix_domain=dict(type="str", required=True),
         matrix_token=dict(type="str", required=True, no_log=True),
+        matrix_store_path=dict(type="path", default=None),
 
         alias=dict(type='str', required=True),
 
         name=dict(type='str', default=None),
         topic=dict(type='str', default=None),
         avatar=dict(type='str', default=None),
+        avatar_normalize=dict(type='dict', default=None, options=AVATAR_NORMALIZE_OPTIONS),
         federate=dict(type='bool', default=False),
         visibility=dict(type='str', default="private",
                         choices=["private", "public"]),
@@ -77,8 +134,18 @@ async def run_module():
         room_members=dict(type='dict', default=None),
         power_level_override=dict(type='dict', default=None),
         encrypt=dict(type='bool', default=False),
+        history_visibility=dict(type='str', default=None,
+                                choices=["invited", "joined", "shared", "world_readable"]),
+        join_rule=dict(type='str', default=None,
+                       choices=["public", "knock", "invite", "private"]),
 
         communities=dict(type='list', default=None),
+        invite_batch_size=dict(type='int', default=DEFAULT_INVITE_BATCH_SIZE),
+        invite_concurrency=dict(type='int', default=DEFAULT_INVITE_CONCURRENCY),
+        force_join=dict(type='bool', default=False),
+        admin_inspect=dict(type='bool', default=False),
+        snapshot_db=dict(type='path', default=None),
+        snapshot_ttl=dict(type='int', default=300),
 
         state=dict(type="str", default="present",
                    choices=["present", "absent", "archived"])
@@ -110,15 +177,44 @@ async def run_module():
         domain=module.params["matrix_domain"],
         uri=module.params['matrix_uri'],
         token=module.params['matrix_token'],
-        user=module.params['matrix_user']
+        user=module.params['matrix_user'],
+        store_path=module.params['matrix_store_path'],
+        image_normalization=module.params['avatar_normalize']
     )
 
     room = AnsibleMatrixRoom(
         matrix_client=matrix_client,
         matrix_room_alias=module.params['alias'],
-        changes=result['changed_fields']
+        changes=result['changed_fields'],
+        invite_batch_size=module.params['invite_batch_size'],
+        invite_concurrency=module.params['invite_concurrency'],
+        force_join=module.params['force_join'],
+        # check mode only reads, there is no need to become a room member for that
+        join=not (module.check_mode and module.params['admin_inspect'])
     )
 
+    snapshots = None
+    if module.params['snapshot_db'] is not None:
+        snapshots = AnsibleMatrixSnapshots(module.params['snapshot_db'])
+
+        if module.check_mode:
+            # A fresh complete snapshot answers a read-only run without touching the server
+            snapshot = snapshots.get_room(alias=room.matrix_room_fq_alias, ttl=module.params['snapshot_ttl'])
+            if snapshot is not None and 'power_levels' in snapshot:
+                result['room'] = room.snapshot_to_room_dict(snapshot)
+                snapshots.close()
+                module.exit_json(**result)
+                return result
+
+    def store_snapshot():
+        if snapshots is None:
+            return
+
+        if room.matrix_room_exists() and room.matrix_room is not None:
+            snapshots.put_room(room.matrix_room_id, room.matrix_room_fq_alias, room.matrix_room_snapshot())
+        else:
+            snapshots.delete_room(room_id=room.matrix_room_id, alias=room.matrix_room_fq_alias)
+
     async with room:
         try:
             room_exists = room.matrix_room_exists()
@@ -127,6 +223,7 @@ async def run_module():
                 # del result['room']['power_levels']
 
             if module.check_mode:
+                store_snapshot()
                 module.exit_json(**result)
                 return result
 
@@ -135,13 +232,22 @@ async def run_module():
             del room_params['matrix_user']
             del room_params['matrix_domain']
             del room_params['matrix_token']
+            del room_params['matrix_store_path']
             del room_params['alias']
+            del room_params['invite_batch_size']
+            del room_params['invite_concurrency']
+            del room_params['force_join']
+            del room_params['admin_inspect']
+            del room_params['snapshot_db']
+            del room_params['snapshot_ttl']
             del room_params['state']
+            del room_params['avatar_normalize']
 
             if state == 'absent':
                 if room_exists:
                     await room.delete()
                     result['changed'] = bool(result['changed_fields'])
+                    room.matrix_room_id = None
                     # result['changed'] = api.delete(result['project']['id'])
 
             elif state == 'present':
@@ -165,10 +271,14 @@ async def run_module():
                 await matrix_client.sync()
                 result['room'] = room.matrix_room_to_dict()
 
+            store_snapshot()
+
         except AnsibleMatrixError as e:
             result['changed'] = bool(result['changed_fields'])
             module.fail_json(msg='MatrixError={}'.format(e), **result)
         finally:
+            if snapshots is not None:
+                snapshots.close()
             await room.__aexit__()
 
     # print(result)
@@ -176,7 +286,7 @@ async def run_module():
 
 
 def main():
-    asyncio.get_event_loop().run_until_complete(run_module())
+    run_async_module(run_module, "room")
 
 
 if __name__ == '__main__':
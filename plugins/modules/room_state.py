@@ -0,0 +1,182 @@
+from ansible.module_utils.basic import AnsibleModule
+
+from ansible_collections.eraga.matrix.plugins.module_utils.room_state import AnsibleMatrixRoomState, \
+    DEFAULT_STATE_CONCURRENCY
+from ansible_collections.eraga.matrix.plugins.module_utils.room import *
+from ansible_collections.eraga.matrix.plugins.module_utils.profiling import run_async_module
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.0',
+    'status': ['preview'],
+    'supported_by': 'curated'
+}
+
+DOCUMENTATION = '''
+module: room_state
+short_description: Manage arbitrary state events of a Matrix room
+description:
+    - Set any state event of a room, such as server ACLs, join rules, history visibility,
+      guest access or custom state, without raw C(uri) tasks
+notes:
+    - The room state is read once, every desired event is compared with it as a whole
+      and only the differing events are written, concurrently
+    - An empty C(content) matches a missing event, events are never deleted
+    - C(m.room.power_levels) is written after all other events
+    - In check mode the events that would be written are reported as changed
+options:
+    matrix_uri:
+        description: Matrix homeserver URI
+        required: true
+        type: str
+    matrix_user:
+        description: Matrix user to authenticate as
+        required: false
+        type: str
+    matrix_token:
+        description: Matrix access token
+        required: true
+        type: str
+    matrix_domain:
+        description: Matrix server domain
+        required: true
+        type: str
+    room:
+        description: Room ID (!id:domain), alias (#alias:domain) or alias localpart
+        required: true
+        type: str
+    events:
+        description: Desired state events
+        required: true
+        type: list
+        elements: dict
+        suboptions:
+            type:
+                description: Event type, e.g. m.room.server_acl
+                required: true
+                type: str
+            state_key:
+                description: State key of the event
+                default: ""
+                type: str
+            content:
+                description: Complete content of the event
+                required: true
+                type: dict
+    join:
+        description: Join the room when its state can't be read otherwise
+        default: true
+        type: bool
+    concurrency:
+        description: State events written at once
+        default: 10
+        type: int
+'''
+
+EXAMPLES = '''
+- name: Room only federates with trusted servers and has no guests
+  eraga.matrix.room_state:
+    matrix_uri: "https://matrix.example.com"
+    matrix_user: ansiblebot
+    matrix_token: "{{token}}"
+    matrix_domain: example.com
+    room: example_room
+    events:
+      - type: m.room.server_acl
+        content:
+          allow: ["example.com", "*.example.com"]
+          deny: []
+          allow_ip_literals: false
+      - type: m.room.guest_access
+        content:
+          guest_access: forbidden
+      - type: com.example.deployment
+        state_key: production
+        content:
+          release: "{{ release }}"
+'''
+
+RETURN = '''
+room_id:
+    description: ID of the room
+    returned: always
+    type: str
+changed_fields:
+    description: Written events with their old and new content under C(state)
+    returned: always
+    type: dict
+'''
+
+
+async def run_module():
+    module_args = dict(
+        matrix_uri=dict(type="str", required=True),
+        matrix_user=dict(type="str", default=None),
+        matrix_domain=dict(type="str", required=True),
+        matrix_token=dict(type="str", required=True, no_log=True),
+
+        room=dict(type='str', required=True),
+        events=dict(type='list', elements='dict', required=True, options=dict(
+            type=dict(type='str', required=True),
+            state_key=dict(type='str', default=""),
+            content=dict(type='dict', required=True),
+        )),
+        join=dict(type='bool', default=True),
+        concurrency=dict(type='int', default=DEFAULT_STATE_CONCURRENCY),
+    )
+
+    result = dict(
+        room_id=None,
+        changed=False,
+        changed_fields={}
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    matrix_client = AnsibleMatrixClient(
+        domain=module.params["matrix_domain"],
+        uri=module.params['matrix_uri'],
+        token=module.params['matrix_token'],
+        user=module.params['matrix_user']
+    )
+
+    room_state = AnsibleMatrixRoomState(
+        matrix_client=matrix_client,
+        room=module.params['room'],
+        changes=result['changed_fields'],
+        join=not module.check_mode and module.params['join'],
+        concurrency=module.params['concurrency']
+    )
+
+    try:
+        await room_state.__aenter__()
+        result['room_id'] = room_state.room_id
+
+        if module.check_mode:
+            differing = room_state.diff(module.params['events'])
+            if differing:
+                result['changed_fields']['state'] = differing
+            result['changed'] = bool(differing)
+            module.exit_json(**result)
+            return result
+
+        await room_state.apply(module.params['events'])
+        result['changed'] = bool(result['changed_fields'])
+
+    except AnsibleMatrixError as e:
+        result['changed'] = bool(result['changed_fields'])
+        module.fail_json(msg='MatrixError={}'.format(e), **result)
+    finally:
+        await room_state.__aexit__()
+
+    module.exit_json(**result)
+
+
+def main():
+    run_async_module(run_module, "room_state")
+
+
+if __name__ == '__main__':
+    main()
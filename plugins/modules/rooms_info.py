@@ -0,0 +1,215 @@
+from ansible.module_utils.basic import AnsibleModule
+
+from ansible_collections.eraga.matrix.plugins.module_utils.admin import AnsibleMatrixAdmin, AnsibleMatrixJsonLines, \
+    room_filter
+from ansible_collections.eraga.matrix.plugins.module_utils.client_model import AnsibleMatrixClient
+from ansible_collections.eraga.matrix.plugins.module_utils.errors import AnsibleMatrixError
+from ansible_collections.eraga.matrix.plugins.module_utils.profiling import run_async_module
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.0',
+    'status': ['preview'],
+    'supported_by': 'curated'
+}
+
+DOCUMENTATION = '''
+module: rooms_info
+short_description: List rooms of a Synapse homeserver
+description:
+    - Page through the Synapse admin room list and return compact room records
+notes:
+    - Requires an access token of a homeserver admin
+    - Pages are fetched one at a time, only a single page is held in memory when
+      records are written to C(dest)
+options:
+    matrix_uri:
+        description: Matrix homeserver URI
+        required: true
+        type: str
+    matrix_user:
+        description: Matrix user to authenticate as
+        required: false
+        type: str
+    matrix_token:
+        description: Matrix access token
+        required: true
+        type: str
+    matrix_domain:
+        description: Matrix server domain
+        required: true
+        type: str
+    search_term:
+        description: Server side filter on room name, canonical alias and room ID
+        required: false
+        type: str
+    order_by:
+        description: Server side sort order
+        required: false
+        type: str
+    direction:
+        description: Sort direction, C(f) forwards or C(b) backwards
+        required: false
+        choices: [ f, b ]
+        type: str
+    empty:
+        description: Only rooms without (true) or with (false) joined members
+        required: false
+        type: bool
+    encrypted:
+        description: Only encrypted (true) or unencrypted (false) rooms
+        required: false
+        type: bool
+    public:
+        description: Only rooms published (true) or not published (false) in the room directory
+        required: false
+        type: bool
+    federatable:
+        description: Only federated (true) or local only (false) rooms
+        required: false
+        type: bool
+    min_members:
+        description: Only rooms with at least this many joined members
+        required: false
+        type: int
+    max_members:
+        description: Only rooms with at most this many joined members
+        required: false
+        type: int
+    limit:
+        description: Stop after this many matching rooms
+        required: false
+        type: int
+    page_size:
+        description: Number of rooms requested per page
+        default: 500
+        type: int
+    dest:
+        description:
+            - Write one JSON record per line to this file instead of returning the list
+            - The file is only replaced, and the task only changed, when its content differs
+            - Nothing is written in check mode, changed tells whether the file would change
+        required: false
+        type: path
+'''
+
+EXAMPLES = '''
+- name: Find empty rooms
+  eraga.matrix.rooms_info:
+    matrix_uri: "https://matrix.example.com"
+    matrix_token: "{{token}}"
+    matrix_domain: example.com
+    empty: yes
+  register: empty_rooms
+
+- name: Dump every unencrypted room to a file
+  eraga.matrix.rooms_info:
+    matrix_uri: "https://matrix.example.com"
+    matrix_token: "{{token}}"
+    matrix_domain: example.com
+    encrypted: no
+    order_by: joined_members
+    direction: b
+    dest: /tmp/unencrypted_rooms.jsonl
+'''
+
+RETURN = '''
+rooms:
+    description: Matching rooms, empty when C(dest) is set
+    returned: always
+    type: list
+    elements: dict
+count:
+    description: Number of matching rooms
+    returned: always
+    type: int
+'''
+
+
+async def run_module():
+    module_args = dict(
+        matrix_uri=dict(type="str", required=True),
+        matrix_user=dict(type="str", default=None),
+        matrix_domain=dict(type="str", required=True),
+        matrix_token=dict(type="str", required=True, no_log=True),
+
+        search_term=dict(type='str', default=None),
+        order_by=dict(type='str', default=None),
+        direction=dict(type='str', default=None, choices=["f", "b"]),
+
+        empty=dict(type='bool', default=None),
+        encrypted=dict(type='bool', default=None),
+        public=dict(type='bool', default=None),
+        federatable=dict(type='bool', default=None),
+        min_members=dict(type='int', default=None),
+        max_members=dict(type='int', default=None),
+
+        limit=dict(type='int', default=None),
+        page_size=dict(type='int', default=500),
+        dest=dict(type='path', default=None),
+    )
+
+    result = dict(
+        rooms=[],
+        count=0,
+        changed=False
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    matrix_client = AnsibleMatrixClient(
+        domain=module.params["matrix_domain"],
+        uri=module.params['matrix_uri'],
+        token=module.params['matrix_token'],
+        user=module.params['matrix_user']
+    )
+
+    accept = room_filter(
+        empty=module.params['empty'],
+        encrypted=module.params['encrypted'],
+        public=module.params['public'],
+        federatable=module.params['federatable'],
+        min_members=module.params['min_members'],
+        max_members=module.params['max_members']
+    )
+
+    dest = None
+    async with AnsibleMatrixAdmin(matrix_client, page_size=module.params['page_size']) as admin:
+        try:
+            if module.params['dest'] is not None:
+                dest = AnsibleMatrixJsonLines(module.params['dest'], check_mode=module.check_mode)
+
+            async for room in admin.iter_rooms(
+                    search_term=module.params['search_term'],
+                    order_by=module.params['order_by'],
+                    direction=module.params['direction'],
+                    accept=accept):
+                if dest is not None:
+                    dest.write(room)
+                else:
+                    result['rooms'].append(room)
+
+                result['count'] += 1
+                if module.params['limit'] is not None and result['count'] >= module.params['limit']:
+                    break
+
+            if dest is not None:
+                result['changed'] = dest.commit()
+
+        except AnsibleMatrixError as e:
+            module.fail_json(msg='MatrixError={}'.format(e), **result)
+        finally:
+            if dest is not None:
+                dest.discard()
+
+    module.exit_json(**result)
+
+
+def main():
+    run_async_module(run_module, "rooms_info")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
-import asyncio
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.eraga.matrix.plugins.module_utils.room import *
+from ansible_collections.eraga.matrix.plugins.module_utils.profiling import run_async_module
 
 ANSIBLE_METADATA = {
     'metadata_version': '1.0',
@@ -18,6 +18,64 @@ ANSIBLE_METADATA = {
     room: example_room 
     text: Example Room
     notice: yes    
+
+- name: Send text keeping the bot's crypto keys between runs
+  eraga.matrix.send:
+    matrix_uri: "https://matrix.example.com"
+    matrix_user:  ansiblebot
+    matrix_token: "{{token}}"
+    matrix_domain: example.com
+    # sqlite olm store per user and device, locked while a task uses it
+    matrix_store_path: ~/.local/share/ansible-matrix/store
+    # the megolm session is reused across runs and only shared with new devices,
+    # it is rotated after a week or 100 messages unless lower limits are given
+    megolm_rotation_messages: 50
+    megolm_rotation_period: 86400
+    # the bot can't verify devices, unverified devices of encrypted rooms get the
+    # session key unless this is false, then nio refuses to send to such rooms
+    ignore_unverified_devices: yes
+    room: example_room
+    text: Example Room
+
+- name: Send an alert once, however often the play is re-run or retried
+  eraga.matrix.send:
+    matrix_uri: "https://matrix.example.com"
+    matrix_user:  ansiblebot
+    matrix_token: "{{token}}"
+    matrix_domain: example.com
+    room: example_room
+    text: "Deployment {{ release }} finished"
+    # transaction ID derived from room, text and key, sent event IDs are kept locally
+    idempotency_key: "deploy-{{ release }}"
+    sent_db: ~/.cache/ansible-matrix/sent.db
+    # retries of 5xx responses and dropped connections with exponential backoff
+    send_retries: 5
+
+- name: Keep a single status message up to date instead of posting a new one per update
+  eraga.matrix.send:
+    matrix_uri: "https://matrix.example.com"
+    matrix_user:  ansiblebot
+    matrix_token: "{{token}}"
+    matrix_domain: example.com
+    room: example_room
+    text: "Deployment {{ release }}: {{ deploy_status }}"
+    # first run sends, later runs edit that message, unchanged text is not sent at all
+    upsert_key: deploy-status
+    sent_db: ~/.cache/ansible-matrix/sent.db
+
+- name: Send a build report to many rooms, uploading it only once
+  eraga.matrix.send:
+    matrix_uri: "https://matrix.example.com"
+    matrix_user:  ansiblebot
+    matrix_token: "{{token}}"
+    matrix_domain: example.com
+    room: "{{ item }}"
+    # local path or http(s) URL, streamed into the upload
+    attachment: build/report.pdf
+    text: "Build report of {{ release }}"
+    # uploads are deduplicated by content hash, URLs by ETag and Last-Modified
+    sent_db: ~/.cache/ansible-matrix/sent.db
+  loop: "{{ release_rooms }}"
 """
 
 
@@ -29,11 +87,21 @@ async def run_module():
         matrix_user=dict(type="str", required=True),
         matrix_domain=dict(type="str", required=True),
         matrix_token=dict(type="str", required=True, no_log=True),
+        matrix_store_path=dict(type="path", default=None),
+        megolm_rotation_messages=dict(type="int", default=None),
+        megolm_rotation_period=dict(type="int", default=None),
+        ignore_unverified_devices=dict(type="bool", default=True),
 
         room=dict(type='str', required=True),
 
-        text=dict(type='str', required=True),
+        text=dict(type='str', default=None),
+        attachment=dict(type='str', default=None),
+        attachment_name=dict(type='str', default=None),
         notice=dict(type='bool', default=False),
+        idempotency_key=dict(type='str', default=None),
+        upsert_key=dict(type='str', default=None),
+        sent_db=dict(type='path', default=None),
+        send_retries=dict(type='int', default=ANSIBLE_MATRIX_SEND_RETRIES),
     )
 
     # seed the result dict in the object
@@ -43,6 +111,8 @@ async def run_module():
     # for consumption, for example, in a subsequent task
     result = dict(
         room={},
+        event_id=None,
+        attachment_event_id=None,
         changed=False,
         changed_fields={}
     )
@@ -56,11 +126,22 @@ async def run_module():
         supports_check_mode=True
     )
 
+    if module.params['text'] is None and module.params['attachment'] is None:
+        module.fail_json(msg='One of text or attachment is required', **result)
+        return
+
+    if module.params['upsert_key'] is not None and module.params['sent_db'] is None:
+        module.fail_json(msg='upsert_key requires sent_db to remember the message between runs', **result)
+        return
+
     matrix_client = AnsibleMatrixClient(
         domain=module.params["matrix_domain"],
         uri=module.params['matrix_uri'],
         token=module.params['matrix_token'],
-        user=module.params['matrix_user']
+        user=module.params['matrix_user'],
+        store_path=module.params['matrix_store_path'],
+        megolm_rotation_messages=module.params['megolm_rotation_messages'],
+        megolm_rotation_period=module.params['megolm_rotation_period']
     )
 
     room = AnsibleMatrixRoom(
@@ -69,6 +150,10 @@ async def run_module():
         changes=result['changed_fields']
     )
 
+    sent_events = None
+    if module.params['sent_db'] is not None:
+        sent_events = AnsibleMatrixSentEvents(module.params['sent_db'])
+
     async with room:
         try:
             room_exists = room.matrix_room_exists()
@@ -82,15 +167,41 @@ async def run_module():
                 module.exit_json(**result)
                 return result
 
-            await room.send_text(
-                message=module.params['text'],
-                notice=module.params['notice']
-            )
+            if module.params['attachment'] is not None:
+                result['attachment_event_id'] = await room.send_attachment(
+                    source=module.params['attachment'],
+                    name=module.params['attachment_name'],
+                    idempotency_key=module.params['idempotency_key'],
+                    sent_events=sent_events,
+                    retries=module.params['send_retries'],
+                    ignore_unverified_devices=module.params['ignore_unverified_devices']
+                )
+
+            if module.params['text'] is not None and module.params['upsert_key'] is not None:
+                result['event_id'] = await room.upsert_text(
+                    message=module.params['text'],
+                    key=module.params['upsert_key'],
+                    sent_events=sent_events,
+                    notice=module.params['notice'],
+                    retries=module.params['send_retries'],
+                    ignore_unverified_devices=module.params['ignore_unverified_devices']
+                )
+            elif module.params['text'] is not None:
+                result['event_id'] = await room.send_text(
+                    message=module.params['text'],
+                    notice=module.params['notice'],
+                    idempotency_key=module.params['idempotency_key'],
+                    sent_events=sent_events,
+                    retries=module.params['send_retries'],
+                    ignore_unverified_devices=module.params['ignore_unverified_devices']
+                )
             result['changed'] = bool(result['changed_fields'])
 
         except AnsibleMatrixError as e:
             module.fail_json(msg='MatrixError={}'.format(e), **result)
         finally:
+            if sent_events is not None:
+                sent_events.close()
             await room.__aexit__()
 
     # print(result)
@@ -98,7 +209,7 @@ async def run_module():
 
 
 def main():
-    asyncio.get_event_loop().run_until_complete(run_module())
+    run_async_module(run_module, "send")
 
 
 if __name__ == '__main__':
@@ -3,7 +3,9 @@ import copy
 from ansible.module_utils.basic import AnsibleModule
 
 from ansible_collections.eraga.matrix.plugins.module_utils.space import AnsibleMatrixSpace
+from ansible_collections.eraga.matrix.plugins.module_utils.snapshot import AnsibleMatrixSnapshots
 from ansible_collections.eraga.matrix.plugins.module_utils.room import *
+from ansible_collections.eraga.matrix.plugins.module_utils.profiling import run_async_module
 
 ANSIBLE_METADATA = {
     'metadata_version': '1.0',
@@ -63,6 +65,14 @@ options:
         description: List of users to invite
         required: false
         type: list
+    snapshot_db:
+        description: Path to a local SQLite snapshot database, check mode runs are answered from it while fresh
+        required: false
+        type: path
+    snapshot_ttl:
+        description: Maximum age in seconds of a snapshot used instead of reading the space
+        default: 300
+        type: int
     state:
         description: Whether the space should exist or not
         default: present
@@ -114,6 +124,9 @@ async def run_module():
         rooms=dict(type='list', default=None),
         members=dict(type='list', default=None),
 
+        snapshot_db=dict(type='path', default=None),
+        snapshot_ttl=dict(type='int', default=300),
+
         state=dict(type="str", default="present",
                    choices=["present", "absent"])
     )
@@ -144,11 +157,27 @@ async def run_module():
         changes=result['changed_fields']
     )
 
+    snapshots = None
+    if module.params['snapshot_db'] is not None:
+        snapshots = AnsibleMatrixSnapshots(module.params['snapshot_db'])
+
+        if module.check_mode:
+            # Only snapshots written by this module have the shape of get_state(),
+            # partial ones from the inventory fall back to a live read
+            snapshot = snapshots.get_room(room_id=space.space_id, ttl=module.params['snapshot_ttl'])
+            if snapshot is not None and all(key in snapshot for key in ('members', 'rooms')):
+                result['space'] = snapshot
+                snapshots.close()
+                module.exit_json(**result)
+                return result
+
     async with space:
         try:
             exists = await space.exists()
             if exists:
                 result['space'] = await space.get_state()
+                if snapshots is not None:
+                    snapshots.put_room(space.space_id, None, result['space'])
 
             if module.check_mode:
                 module.exit_json(**result)
@@ -161,6 +190,8 @@ async def run_module():
             del params['matrix_token']
             del params['localpart']
             del params['state']
+            del params['snapshot_db']
+            del params['snapshot_ttl']
 
             if state == 'present':
                 await space.create_or_update(**params)
@@ -175,17 +206,26 @@ async def run_module():
                 module.fail_json(msg='Unsupported state={}'.format(state), **result)
 
             if result['changed']:
-                result['space'] = await space.get_state()
+                if state == 'absent':
+                    if snapshots is not None:
+                        snapshots.delete_room(room_id=space.space_id)
+                else:
+                    result['space'] = await space.get_state()
+                    if snapshots is not None:
+                        snapshots.put_room(space.space_id, None, result['space'])
 
         except AnsibleMatrixError as e:
             result['changed'] = bool(result['changed_fields'])
             module.fail_json(msg='MatrixError={}'.format(e), **result)
+        finally:
+            if snapshots is not None:
+                snapshots.close()
 
     module.exit_json(**result)
 
 
 def main():
-    asyncio.get_event_loop().run_until_complete(run_module())
+    run_async_module(run_module, "space")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,146 @@
+from ansible.module_utils.basic import AnsibleModule
+
+from ansible_collections.eraga.matrix.plugins.module_utils.space import AnsibleMatrixSpace
+from ansible_collections.eraga.matrix.plugins.module_utils.room import *
+from ansible_collections.eraga.matrix.plugins.module_utils.profiling import run_async_module
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.0',
+    'status': ['preview'],
+    'supported_by': 'curated'
+}
+
+DOCUMENTATION = '''
+module: space_hierarchy
+short_description: Read the tree of a Matrix Space
+description:
+    - Walk a Matrix Space and all of its nested sub-spaces with the C(/hierarchy) API
+      and return every room of the tree as a flat list
+notes:
+    - Each level of the tree is requested concurrently and C(next_batch) pagination
+      is followed until the level is complete
+    - Rooms referenced by several spaces are returned once, with all parents listed
+    - This module never changes anything on the server
+options:
+    matrix_uri:
+        description: Matrix homeserver URI
+        required: true
+        type: str
+    matrix_user:
+        description: Matrix user to authenticate as
+        required: false
+        type: str
+    matrix_token:
+        description: Matrix access token
+        required: true
+        type: str
+    matrix_domain:
+        description: Matrix server domain
+        required: true
+        type: str
+    space:
+        description: Root space, either a room ID (!id:domain), an alias (#alias:domain) or an alias localpart
+        required: true
+        type: str
+    max_depth:
+        description: How many levels below the root space to descend, unlimited when omitted
+        required: false
+        type: int
+    suggested_only:
+        description: Only follow children marked as suggested
+        default: false
+        type: bool
+    limit:
+        description: Page size of a single /hierarchy request
+        default: 50
+        type: int
+'''
+
+EXAMPLES = '''
+- name: Read the whole org space tree
+  eraga.matrix.space_hierarchy:
+    matrix_uri: "https://matrix.example.com"
+    matrix_user: ansiblebot
+    matrix_token: "{{token}}"
+    matrix_domain: example.com
+    space: "#org:example.com"
+  register: org_tree
+
+- name: Only the first two levels
+  eraga.matrix.space_hierarchy:
+    matrix_uri: "https://matrix.example.com"
+    matrix_user: ansiblebot
+    matrix_token: "{{token}}"
+    matrix_domain: example.com
+    space: "!AbCdEfGh:example.com"
+    max_depth: 2
+'''
+
+RETURN = '''
+hierarchy:
+    description: Flattened space tree, root first, then level by level
+    returned: always
+    type: list
+    elements: dict
+'''
+
+
+async def run_module():
+    module_args = dict(
+        matrix_uri=dict(type="str", required=True),
+        matrix_user=dict(type="str", default=None),
+        matrix_domain=dict(type="str", required=True),
+        matrix_token=dict(type="str", required=True, no_log=True),
+
+        space=dict(type='str', required=True),
+        max_depth=dict(type='int', default=None),
+        suggested_only=dict(type='bool', default=False),
+        limit=dict(type='int', default=50),
+    )
+
+    result = dict(
+        hierarchy=[],
+        changed=False
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    matrix_client = AnsibleMatrixClient(
+        domain=module.params["matrix_domain"],
+        uri=module.params['matrix_uri'],
+        token=module.params['matrix_token'],
+        user=module.params['matrix_user']
+    )
+
+    space_id = matrix_client.room_alias_to_mx_alias(module.params['space'])
+
+    async with AnsibleMatrixSpace(matrix_client=matrix_client, localpart=space_id, changes={}) as space:
+        try:
+            if space_id.startswith("#"):
+                alias_response = await matrix_client.room_resolve_alias(space_id)
+                if not isinstance(alias_response, RoomResolveAliasResponse):
+                    module.fail_json(msg='No space with alias="{}"'.format(space_id), **result)
+                    return
+                space.space_id = alias_response.room_id
+
+            result['hierarchy'] = await space.get_hierarchy(
+                max_depth=module.params['max_depth'],
+                suggested_only=module.params['suggested_only'],
+                limit=module.params['limit']
+            )
+
+        except AnsibleMatrixError as e:
+            module.fail_json(msg='MatrixError={}'.format(e), **result)
+
+    module.exit_json(**result)
+
+
+def main():
+    run_async_module(run_module, "space_hierarchy")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,3 @@
-import asyncio
 import copy
 
 import aiohttp
@@ -6,7 +5,9 @@ from ansible.module_utils.basic import AnsibleModule
 
 from ansible_collections.eraga.matrix.plugins.module_utils.errors import AnsibleMatrixWarning
 from ansible_collections.eraga.matrix.plugins.module_utils.room import *
+from ansible_collections.eraga.matrix.plugins.module_utils.snapshot import AnsibleMatrixSnapshots
 from ansible_collections.eraga.matrix.plugins.module_utils.user import AnsibleMatrixUser
+from ansible_collections.eraga.matrix.plugins.module_utils.profiling import run_async_module
 
 ANSIBLE_METADATA = {
     'metadata_version': '1.0',
@@ -64,9 +65,13 @@ async def run_module():
         login=dict(type='str', required=True),
         displayname=dict(type='str', default=None),
         avatar=dict(type='str', default=None),
+        avatar_normalize=dict(type='dict', default=None, options=AVATAR_NORMALIZE_OPTIONS),
 
         admin=dict(type='bool', default=None),
 
+        snapshot_db=dict(type='path', default=None),
+        snapshot_ttl=dict(type='int', default=300),
+
         state=dict(type="str", default="present",
                    choices=["present", "deactivated"])
     )
@@ -88,13 +93,24 @@ async def run_module():
         domain=module.params["matrix_domain"],
         uri=module.params['matrix_uri'],
         token=module.params['matrix_token'],
-        user=module.params['matrix_user']
+        user=module.params['matrix_user'],
+        image_normalization=module.params['avatar_normalize']
     )
 
+    snapshots = None
+    snapshot = None
+    if module.params['snapshot_db'] is not None:
+        snapshots = AnsibleMatrixSnapshots(module.params['snapshot_db'])
+        # Writes are always decided against the live account, snapshots only answer read-only runs
+        if module.check_mode:
+            snapshot = snapshots.get_user(matrix_client.login_to_id(module.params['login']),
+                                          ttl=module.params['snapshot_ttl'])
+
     user = AnsibleMatrixUser(
         matrix_client=matrix_client,
         login=module.params['login'],
-        changes=result['changed_fields']
+        changes=result['changed_fields'],
+        snapshot=snapshot
     )
 
     async with user:
@@ -102,6 +118,8 @@ async def run_module():
             exists = user.account is not None
             if exists:
                 result['user'] = user.account.dict()
+                if snapshots is not None and snapshot is None:
+                    snapshots.put_user(user.mxid, user.account.dict())
 
             if module.check_mode:
                 module.exit_json(**result)
@@ -114,6 +132,9 @@ async def run_module():
             del params['matrix_token']
             del params['login']
             del params['state']
+            del params['avatar_normalize']
+            del params['snapshot_db']
+            del params['snapshot_ttl']
 
             if state == 'present':
                 await user.update(**params)
@@ -129,6 +150,12 @@ async def run_module():
 
             if result['changed']:
                 result['user'] = user.account.dict()
+                if snapshots is not None:
+                    if state == 'deactivated':
+                        # account is not re-read after deactivation
+                        snapshots.delete_user(user.mxid)
+                    else:
+                        snapshots.put_user(user.mxid, user.account.dict())
 
         except AnsibleMatrixError as e:
             result['changed'] = bool(result['changed_fields'])
@@ -137,6 +164,8 @@ async def run_module():
             result['changed'] = False
             module.exit_json(skipped=True, msg=f"{type(e).__name__}: {str(e)}")
         finally:
+            if snapshots is not None:
+                snapshots.close()
             await user.__aexit__()
 
     # print(result)
@@ -144,7 +173,7 @@ async def run_module():
 
 
 def main():
-    asyncio.get_event_loop().run_until_complete(run_module())
+    run_async_module(run_module, "user")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,211 @@
+from ansible.module_utils.basic import AnsibleModule
+
+from ansible_collections.eraga.matrix.plugins.module_utils.admin import AnsibleMatrixAdmin, AnsibleMatrixJsonLines, \
+    DEFAULT_ENRICH_CONCURRENCY
+from ansible_collections.eraga.matrix.plugins.module_utils.client_model import AnsibleMatrixClient
+from ansible_collections.eraga.matrix.plugins.module_utils.errors import AnsibleMatrixError
+from ansible_collections.eraga.matrix.plugins.module_utils.profiling import run_async_module
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.0',
+    'status': ['preview'],
+    'supported_by': 'curated'
+}
+
+DOCUMENTATION = '''
+module: users_info
+short_description: List accounts of a Synapse homeserver
+description:
+    - Page through the Synapse admin user list and return compact account records,
+      optionally enriched with last seen timestamps and joined rooms
+notes:
+    - Requires an access token of a homeserver admin
+    - Enrichment requests are made concurrently for every page
+    - Pages are fetched one at a time, only a single page is held in memory when
+      records are written to C(dest)
+options:
+    matrix_uri:
+        description: Matrix homeserver URI
+        required: true
+        type: str
+    matrix_user:
+        description: Matrix user to authenticate as
+        required: false
+        type: str
+    matrix_token:
+        description: Matrix access token
+        required: true
+        type: str
+    matrix_domain:
+        description: Matrix server domain
+        required: true
+        type: str
+    name:
+        description: Server side filter on user ID localpart and display name
+        required: false
+        type: str
+    guests:
+        description: Include guest accounts
+        default: true
+        type: bool
+    deactivated:
+        description: Only deactivated accounts (true) or only active accounts (false)
+        default: false
+        type: bool
+    admins:
+        description: Only admins (true) or only non-admins (false), requires Synapse 1.95 or newer
+        required: false
+        type: bool
+    order_by:
+        description: Server side sort order
+        required: false
+        type: str
+    direction:
+        description: Sort direction, C(f) forwards or C(b) backwards
+        required: false
+        choices: [ f, b ]
+        type: str
+    enrich:
+        description: Additional per-user details to fetch
+        default: []
+        choices: [ whois, joined_rooms ]
+        type: list
+        elements: str
+    limit:
+        description: Stop after this many accounts
+        required: false
+        type: int
+    page_size:
+        description: Number of accounts requested per page
+        default: 500
+        type: int
+    concurrency:
+        description: Enrichment requests sent to the homeserver at once
+        default: 10
+        type: int
+    dest:
+        description:
+            - Write one JSON record per line to this file instead of returning the list
+            - The file is only replaced, and the task only changed, when its content differs
+            - Nothing is written in check mode, changed tells whether the file would change
+        required: false
+        type: path
+'''
+
+EXAMPLES = '''
+- name: Audit deactivated accounts
+  eraga.matrix.users_info:
+    matrix_uri: "https://matrix.example.com"
+    matrix_token: "{{token}}"
+    matrix_domain: example.com
+    deactivated: yes
+  register: deactivated_users
+
+- name: Dump all real accounts with their last activity and rooms
+  eraga.matrix.users_info:
+    matrix_uri: "https://matrix.example.com"
+    matrix_token: "{{token}}"
+    matrix_domain: example.com
+    guests: no
+    enrich:
+      - whois
+      - joined_rooms
+    dest: /tmp/users.jsonl
+'''
+
+RETURN = '''
+users:
+    description: Matching accounts, empty when C(dest) is set
+    returned: always
+    type: list
+    elements: dict
+count:
+    description: Number of matching accounts
+    returned: always
+    type: int
+'''
+
+
+async def run_module():
+    module_args = dict(
+        matrix_uri=dict(type="str", required=True),
+        matrix_user=dict(type="str", default=None),
+        matrix_domain=dict(type="str", required=True),
+        matrix_token=dict(type="str", required=True, no_log=True),
+
+        name=dict(type='str', default=None),
+        guests=dict(type='bool', default=True),
+        deactivated=dict(type='bool', default=False),
+        admins=dict(type='bool', default=None),
+        order_by=dict(type='str', default=None),
+        direction=dict(type='str', default=None, choices=["f", "b"]),
+        enrich=dict(type='list', elements='str', default=[], choices=["whois", "joined_rooms"]),
+
+        limit=dict(type='int', default=None),
+        page_size=dict(type='int', default=500),
+        concurrency=dict(type='int', default=DEFAULT_ENRICH_CONCURRENCY),
+        dest=dict(type='path', default=None),
+    )
+
+    result = dict(
+        users=[],
+        count=0,
+        changed=False
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    matrix_client = AnsibleMatrixClient(
+        domain=module.params["matrix_domain"],
+        uri=module.params['matrix_uri'],
+        token=module.params['matrix_token'],
+        user=module.params['matrix_user']
+    )
+
+    dest = None
+    async with AnsibleMatrixAdmin(matrix_client, page_size=module.params['page_size'],
+                                  concurrency=module.params['concurrency']) as admin:
+        try:
+            if module.params['dest'] is not None:
+                dest = AnsibleMatrixJsonLines(module.params['dest'], check_mode=module.check_mode)
+
+            async for user in admin.iter_users(
+                    name=module.params['name'],
+                    guests=module.params['guests'],
+                    deactivated=module.params['deactivated'],
+                    admins=module.params['admins'],
+                    order_by=module.params['order_by'],
+                    direction=module.params['direction'],
+                    # the server only adds deactivated accounts to the listing
+                    accept=(lambda it: it.deactivated) if module.params['deactivated'] else None,
+                    enrich=module.params['enrich']):
+                if dest is not None:
+                    dest.write(user.dict())
+                else:
+                    result['users'].append(user.dict())
+
+                result['count'] += 1
+                if module.params['limit'] is not None and result['count'] >= module.params['limit']:
+                    break
+
+            if dest is not None:
+                result['changed'] = dest.commit()
+
+        except AnsibleMatrixError as e:
+            module.fail_json(msg='MatrixError={}'.format(e), **result)
+        finally:
+            if dest is not None:
+                dest.discard()
+
+    module.exit_json(**result)
+
+
+def main():
+    run_async_module(run_module, "users_info")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import os
+import stat
+from urllib.parse import parse_qsl, urlsplit
+
+import pytest
+
+pytest.importorskip("nio")
+
+from ansible_collections.eraga.matrix.plugins.module_utils.admin import AnsibleMatrixAdmin, AnsibleMatrixJsonLines, \
+    room_filter
+
+
+class JsonResponse(object):
+
+    def __init__(self, body, status=200):
+        self.body = body
+        self.status = status
+
+    async def json(self):
+        return self.body
+
+    async def text(self):
+        return json.dumps(self.body)
+
+
+class PagingMatrixClient(object):
+    """Serves admin list pages from fixed lists, answers per-user requests."""
+
+    domain = "example.com"
+
+    def __init__(self, rooms=(), users=(), state=None):
+        self.rooms = list(rooms)
+        self.users = list(users)
+        self.state = state or {}
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send_json(self, method, path, data=None):
+        self.requests.append(path)
+        parts = urlsplit(path)
+        query = dict(parse_qsl(parts.query))
+
+        if parts.path == "/_synapse/admin/v1/rooms":
+            return JsonResponse(self._page(self.rooms, query, 'rooms', 'next_batch'))
+        if parts.path == "/_synapse/admin/v2/users":
+            return JsonResponse(self._page(self.users, query, 'users', 'next_token'))
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0)
+        finally:
+            self.in_flight -= 1
+
+        if parts.path.endswith("/joined_rooms"):
+            return JsonResponse({'joined_rooms': ["!room:example.com"]})
+        if parts.path.endswith("/state"):
+            return JsonResponse({'state': self.state.get(parts.path.split("/")[-2], [])})
+        return JsonResponse({'errcode': "M_NOT_FOUND"}, status=404)
+
+    @staticmethod
+    def _page(entries, query, key, next_key):
+        start = int(query.get('from', 0))
+        end = start + int(query['limit'])
+        page = {key: entries[start:end]}
+        if end < len(entries):
+            page[next_key] = str(end)
+        return page
+
+    async def close(self):
+        pass
+
+
+def collect(iterator):
+    async def run():
+        return [item async for item in iterator]
+
+    return asyncio.run(run())
+
+
+def test_rooms_are_read_page_by_page():
+    rooms = [{'room_id': "!{}:example.com".format(i), 'joined_members': i} for i in range(5)]
+    matrix_client = PagingMatrixClient(rooms=rooms)
+
+    listed = collect(AnsibleMatrixAdmin(matrix_client, page_size=2).iter_rooms())
+
+    assert [room['room_id'] for room in listed] == [room['room_id'] for room in rooms]
+    assert len(matrix_client.requests) == 3
+
+
+def test_rooms_are_filtered_client_side():
+    rooms = [
+        {'room_id': "!empty:example.com", 'joined_members': 0, 'encryption': None},
+        {'room_id': "!small:example.com", 'joined_members': 2, 'encryption': "m.megolm.v1.aes-sha2"},
+        {'room_id': "!large:example.com", 'joined_members': 50, 'encryption': None},
+    ]
+    matrix_client = PagingMatrixClient(rooms=rooms)
+    admin = AnsibleMatrixAdmin(matrix_client)
+
+    assert [room['room_id'] for room in collect(admin.iter_rooms(accept=room_filter(empty=True)))] == \
+        ["!empty:example.com"]
+    assert [room['room_id'] for room in collect(admin.iter_rooms(accept=room_filter(encrypted=True)))] == \
+        ["!small:example.com"]
+    assert [room['room_id'] for room in collect(admin.iter_rooms(accept=room_filter(min_members=1, max_members=10)))] == \
+        ["!small:example.com"]
+
+
+def test_users_follow_next_token_and_enrichment_is_bounded():
+    users = [{'name': "@user{}:example.com".format(i)} for i in range(7)]
+    matrix_client = PagingMatrixClient(users=users)
+    admin = AnsibleMatrixAdmin(matrix_client, page_size=3, concurrency=2)
+
+    listed = collect(admin.iter_users(enrich=['joined_rooms']))
+
+    assert [user.mxid for user in listed] == [user['name'] for user in users]
+    assert all(user.joined_rooms == ["!room:example.com"] for user in listed)
+    assert matrix_client.max_in_flight == 2
+
+
+def test_space_children_are_read_with_bounded_concurrency():
+    state = {
+        "!space{}:example.com".format(i): [
+            {'type': "m.space.child", 'state_key': "!child{}:example.com".format(i), 'content': {'via': ["example.com"]}},
+            {'type': "m.space.child", 'state_key': "!removed:example.com", 'content': {}},
+        ]
+        for i in range(5)
+    }
+    matrix_client = PagingMatrixClient(state=state)
+    admin = AnsibleMatrixAdmin(matrix_client, concurrency=2)
+
+    children = asyncio.run(admin.spaces_children(sorted(state)))
+
+    assert children == {space_id: ["!child{}:example.com".format(i)] for i, space_id in enumerate(sorted(state))}
+    assert matrix_client.max_in_flight == 2
+
+
+def test_json_lines_are_replaced_only_when_changed(tmp_path):
+    path = str(tmp_path / "rooms.jsonl")
+
+    dest = AnsibleMatrixJsonLines(path)
+    dest.write({'room_id': "!a:example.com"})
+    assert dest.commit() is True
+    first = os.stat(path)
+
+    dest = AnsibleMatrixJsonLines(path)
+    dest.write({'room_id': "!a:example.com"})
+    assert dest.commit() is False
+    assert os.stat(path).st_ino == first.st_ino
+
+    with open(path) as f:
+        assert [json.loads(line) for line in f] == [{'room_id': "!a:example.com"}]
+    assert os.listdir(str(tmp_path)) == ["rooms.jsonl"]
+
+
+def test_json_lines_keep_the_mode_of_dest(tmp_path):
+    path = str(tmp_path / "rooms.jsonl")
+    with open(path, "w") as f:
+        f.write("old\n")
+    os.chmod(path, 0o644)
+
+    dest = AnsibleMatrixJsonLines(path)
+    dest.write({'room_id': "!a:example.com"})
+    assert dest.commit() is True
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+
+
+def test_json_lines_are_not_written_in_check_mode(tmp_path):
+    path = str(tmp_path / "rooms.jsonl")
+
+    dest = AnsibleMatrixJsonLines(path, check_mode=True)
+    dest.write({'room_id': "!a:example.com"})
+
+    assert dest.commit() is True
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_discarded_json_lines_leave_nothing_behind(tmp_path):
+    dest = AnsibleMatrixJsonLines(str(tmp_path / "rooms.jsonl"))
+    dest.write({'room_id': "!a:example.com"})
+    dest.discard()
+
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from ansible_collections.eraga.matrix.plugins.module_utils.cassette import AnsibleMatrixCassette, \
+    CASSETTE_SCRUBBED, cassette_path_key
+from ansible_collections.eraga.matrix.plugins.module_utils.errors import AnsibleMatrixError
+
+
+class RecordedResponse(object):
+
+    def __init__(self, status, body, headers=None, reason="OK"):
+        self.status = status
+        self.reason = reason
+        self.headers = headers or {'Content-Type': "application/json"}
+        self._body = body
+
+    async def read(self):
+        return self._body
+
+
+def test_path_key_drops_transaction_ids_scrubs_tokens_and_sorts_query():
+    assert cassette_path_key("/_matrix/client/r0/rooms/!a/send/m.room.message/ansible-123?b=2&access_token=x&a=1") == \
+        "/_matrix/client/r0/rooms/!a/send/m.room.message/{txn}?a=1&access_token=%3Cscrubbed%3E&b=2"
+
+
+def test_recorded_exchanges_are_replayed_in_order_without_secrets(tmp_path):
+    path = str(tmp_path / "cassette.json.gz")
+
+    async def record():
+        cassette = AnsibleMatrixCassette(path, mode="record")
+        await cassette.record("POST", "/_matrix/client/r0/login", json.dumps({'password': "hunter2"}),
+                              RecordedResponse(200, b'{"access_token": "secret", "user_id": "@bot:example.com"}'), 0.5)
+        await cassette.record("GET", "/_matrix/client/r0/sync?since=1",
+                              None, RecordedResponse(200, b'{"next_batch": "2"}'), 0.1)
+        await cassette.record("GET", "/_matrix/client/r0/sync?since=1",
+                              None, RecordedResponse(200, b'{"next_batch": "3"}'), 0.1)
+        await cassette.record("GET", "/_matrix/media/r0/download/example.com/logo",
+                              None, RecordedResponse(200, b'\x89PNG', {'Content-Type': "image/png"}), 0.2)
+        cassette.save()
+
+    asyncio.run(record())
+
+    async def replay():
+        cassette = AnsibleMatrixCassette(path, mode="replay", latency=0)
+        assert cassette.interactions[0]['request'] == {'password': CASSETTE_SCRUBBED}
+
+        login = await cassette.replay("POST", "/_matrix/client/r0/login")
+        first = await cassette.replay("GET", "/_matrix/client/r0/sync?since=1")
+        second = await cassette.replay("GET", "/_matrix/client/r0/sync?since=1")
+        media = await cassette.replay("GET", "/_matrix/media/r0/download/example.com/logo")
+
+        assert await login.json() == {'access_token': CASSETTE_SCRUBBED, 'user_id': "@bot:example.com"}
+        assert (await first.json())['next_batch'] == "2"
+        assert (await second.json())['next_batch'] == "3"
+        assert await media.read() == b'\x89PNG'
+        assert media.content_type == "image/png"
+
+        with pytest.raises(AnsibleMatrixError):
+            await cassette.replay("GET", "/_matrix/client/r0/sync?since=1")
+
+    asyncio.run(replay())
+
+
+def test_unknown_mode_is_refused(tmp_path):
+    with pytest.raises(AnsibleMatrixError):
+        AnsibleMatrixCassette(str(tmp_path / "cassette.json"), mode="rewind")
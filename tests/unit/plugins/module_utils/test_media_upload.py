@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+
+import pytest
+
+pytest.importorskip("nio")
+pytest.importorskip("aiofiles")
+
+from ansible_collections.eraga.matrix.plugins.module_utils import client_model
+from ansible_collections.eraga.matrix.plugins.module_utils.client_model import AnsibleMatrixClient
+from ansible_collections.eraga.matrix.plugins.module_utils.sent import AnsibleMatrixSentEvents
+
+URL = "https://example.com/report.pdf"
+BODY = b"%PDF-1.4 report"
+
+
+class UploadingClient(object):
+    """The upload logic of AnsibleMatrixClient over a media repository that counts uploads."""
+
+    upload_media = AnsibleMatrixClient.upload_media
+    _upload_file = AnsibleMatrixClient._upload_file
+    _upload_url = AnsibleMatrixClient._upload_url
+    _body = staticmethod(AnsibleMatrixClient._body)
+
+    def __init__(self):
+        self.uploads = []
+
+    async def _upload_stream(self, data, mimetype, filename, size, encrypt):
+        if isinstance(data, bytes):
+            body = data
+        elif hasattr(data, "read"):
+            body = await data.read()
+        else:
+            body = b"".join([chunk async for chunk in data])
+        self.uploads.append(body)
+        return "mxc://example.com/{}".format(len(self.uploads)), None
+
+
+class Response(object):
+
+    def __init__(self, status, body=b"", headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+        self.content_type = "application/pdf"
+        self.content_length = None
+
+    async def read(self):
+        return self.body
+
+    def raise_for_status(self):
+        assert self.status < 400
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class ConditionalServer(object):
+    """Serves a single body with an ETag and answers matching If-None-Match with 304."""
+
+    def __init__(self):
+        self.body = BODY
+        self.etag = '"v1"'
+        self.requests = []
+
+    def session(self):
+        server = self
+
+        class Session(object):
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *args):
+                pass
+
+            def get(self, url, headers=None):
+                server.requests.append(dict(headers or {}))
+                if (headers or {}).get('If-None-Match') == server.etag:
+                    return Response(304)
+                return Response(200, server.body, {'ETag': server.etag})
+
+        return Session
+
+
+@pytest.fixture
+def media(tmp_path):
+    store = AnsibleMatrixSentEvents(str(tmp_path / "sent.db"))
+    yield store
+    store.close()
+
+
+def test_same_file_is_uploaded_once(tmp_path, media):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(BODY)
+    matrix_client = UploadingClient()
+
+    first = asyncio.run(matrix_client.upload_media(str(path), media=media))
+    second = asyncio.run(matrix_client.upload_media(str(path), media=media, filename="copy.pdf"))
+
+    assert matrix_client.uploads == [BODY]
+    assert first.uploaded and not second.uploaded
+    assert second.content_uri == first.content_uri
+    assert second.filename == "copy.pdf"
+    assert second.sha256 == hashlib.sha256(BODY).hexdigest()
+
+
+def test_encrypted_uploads_are_never_reused(tmp_path, media):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(BODY)
+    matrix_client = UploadingClient()
+
+    asyncio.run(matrix_client.upload_media(str(path), media=media, encrypt=True))
+    asyncio.run(matrix_client.upload_media(str(path), media=media, encrypt=True))
+
+    assert len(matrix_client.uploads) == 2
+
+
+def test_unmodified_url_is_fetched_conditionally_and_not_uploaded_again(monkeypatch, media):
+    server = ConditionalServer()
+    monkeypatch.setattr(client_model, "ClientSession", server.session())
+    matrix_client = UploadingClient()
+
+    first = asyncio.run(matrix_client.upload_media(URL, media=media))
+    second = asyncio.run(matrix_client.upload_media(URL, media=media))
+
+    assert matrix_client.uploads == [BODY]
+    assert server.requests[1] == {'If-None-Match': '"v1"'}
+    assert not second.uploaded
+    assert second.content_uri == first.content_uri
+
+
+def test_url_with_known_content_reuses_the_upload_of_a_file(tmp_path, monkeypatch, media):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(BODY)
+    server = ConditionalServer()
+    monkeypatch.setattr(client_model, "ClientSession", server.session())
+    matrix_client = UploadingClient()
+
+    from_file = asyncio.run(matrix_client.upload_media(str(path), media=media))
+    from_url = asyncio.run(matrix_client.upload_media(URL, media=media))
+
+    assert matrix_client.uploads == [BODY]
+    assert from_url.content_uri == from_file.content_uri
+
+
+def test_modified_url_is_uploaded_again(monkeypatch, media):
+    server = ConditionalServer()
+    monkeypatch.setattr(client_model, "ClientSession", server.session())
+    matrix_client = UploadingClient()
+
+    asyncio.run(matrix_client.upload_media(URL, media=media))
+    server.body, server.etag = b"%PDF-1.4 report v2", '"v2"'
+    second = asyncio.run(matrix_client.upload_media(URL, media=media))
+
+    assert matrix_client.uploads == [BODY, b"%PDF-1.4 report v2"]
+    assert second.uploaded
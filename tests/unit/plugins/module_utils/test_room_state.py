@@ -0,0 +1,99 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("nio")
+
+from nio import RoomPutStateError
+
+from ansible_collections.eraga.matrix.plugins.module_utils.errors import AnsibleMatrixError
+from ansible_collections.eraga.matrix.plugins.module_utils.room_state import AnsibleMatrixRoomState
+
+ROOM_ID = "!room:example.com"
+
+
+class StateMatrixClient(object):
+    """Serves the state of a single room and records every state write."""
+
+    domain = "example.com"
+
+    def __init__(self, events, failing=()):
+        self.events = events
+        self.failing = failing
+        self.writes = []
+
+    async def room_get_state(self, room_id):
+        return SimpleNamespace(events=self.events)
+
+    async def room_put_state(self, room_id, event_type, content, state_key=""):
+        if event_type in self.failing:
+            return RoomPutStateError(message="Forbidden", status_code="M_FORBIDDEN")
+        self.writes.append((event_type, state_key, content))
+        return SimpleNamespace(event_id="$event")
+
+    async def close(self):
+        pass
+
+
+CURRENT_STATE = [
+    {'type': "m.room.guest_access", 'state_key': "", 'content': {'guest_access': "can_join"}},
+    {'type': "m.room.power_levels", 'state_key': "", 'content': {'users': {"@bot:example.com": 100}}},
+    {'type': "com.example.deployment", 'state_key': "production", 'content': {'release': "1"}},
+]
+
+
+def room_state(matrix_client):
+    state = AnsibleMatrixRoomState(matrix_client, ROOM_ID, changes={})
+    asyncio.run(state.load())
+    return state
+
+
+def test_only_differing_events_are_reported_power_levels_last():
+    state = room_state(StateMatrixClient(CURRENT_STATE))
+
+    differing = state.diff([
+        {'type': "m.room.power_levels", 'content': {'users': {"@bot:example.com": 100, "@ops:example.com": 50}}},
+        {'type': "m.room.guest_access", 'content': {'guest_access': "forbidden"}},
+        {'type': "com.example.deployment", 'state_key': "production", 'content': {'release': "1"}},
+        {'type': "m.room.server_acl", 'content': {'allow': ["*"]}},
+    ])
+
+    assert [change['type'] for change in differing] == \
+        ["m.room.guest_access", "m.room.server_acl", "m.room.power_levels"]
+    assert differing[0]['old'] == {'guest_access': "can_join"}
+    assert differing[1]['old'] is None
+
+
+def test_empty_content_matches_missing_event():
+    state = room_state(StateMatrixClient(CURRENT_STATE))
+
+    assert state.diff([{'type': "m.room.server_acl", 'content': {}}]) == []
+
+
+def test_power_levels_are_written_after_everything_else():
+    matrix_client = StateMatrixClient(CURRENT_STATE)
+    state = room_state(matrix_client)
+
+    asyncio.run(state.apply([
+        {'type': "m.room.power_levels", 'content': {'users': {}}},
+        {'type': "m.room.guest_access", 'content': {'guest_access': "forbidden"}},
+        {'type': "com.example.deployment", 'state_key': "production", 'content': {'release': "2"}},
+    ]))
+
+    assert [write[0] for write in matrix_client.writes][-1] == "m.room.power_levels"
+    assert len(matrix_client.writes) == 3
+    assert state.diff([{'type': "m.room.guest_access", 'content': {'guest_access': "forbidden"}}]) == []
+
+
+def test_failed_writes_are_reported_and_power_levels_are_not_lowered():
+    matrix_client = StateMatrixClient(CURRENT_STATE, failing=("m.room.guest_access",))
+    state = room_state(matrix_client)
+
+    with pytest.raises(AnsibleMatrixError, match="m.room.guest_access"):
+        asyncio.run(state.apply([
+            {'type': "m.room.power_levels", 'content': {'users': {}}},
+            {'type': "m.room.guest_access", 'content': {'guest_access': "forbidden"}},
+        ]))
+
+    assert matrix_client.writes == []
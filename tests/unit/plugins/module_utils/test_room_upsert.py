@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("nio")
+pytest.importorskip("markdown")
+
+from nio import RoomSendResponse
+
+from ansible_collections.eraga.matrix.plugins.module_utils.room import AnsibleMatrixRoom
+from ansible_collections.eraga.matrix.plugins.module_utils.sent import AnsibleMatrixSentEvents
+
+ROOM_ID = "!room:example.com"
+
+
+class DedupingMatrixClient(object):
+    """Answers a reused transaction ID with the original event, like a homeserver."""
+
+    domain = "example.com"
+
+    def __init__(self):
+        self.transactions = {}
+        self.sent = []
+
+    async def room_send_retrying(self, room_id, message_type, content, tx_id=None, **kwargs):
+        if tx_id not in self.transactions:
+            event_id = "$event{}".format(len(self.sent))
+            self.sent.append(content)
+            self.transactions[tx_id] = event_id
+        return RoomSendResponse(self.transactions[tx_id], room_id)
+
+
+@pytest.fixture
+def sent_events(tmp_path):
+    store = AnsibleMatrixSentEvents(str(tmp_path / "sent.db"))
+    yield store
+    store.close()
+
+
+def _room(matrix_client):
+    room = AnsibleMatrixRoom(matrix_client, "status", changes={})
+    room.matrix_room_id = ROOM_ID
+    return room
+
+
+def test_upsert_cycle_sends_every_edit(sent_events):
+    matrix_client = DedupingMatrixClient()
+
+    async def cycle():
+        return [await _room(matrix_client).upsert_text(message, "status", sent_events)
+                for message in ("A", "B", "A", "B")]
+
+    event_ids = asyncio.run(cycle())
+
+    assert event_ids == ["$event0"] * 4
+    assert [content.get("m.new_content", content)["body"] for content in matrix_client.sent] == ["A", "B", "A", "B"]
+    assert sent_events.get_upsert(ROOM_ID, "status")[2] == "$event3"
+
+
+def test_upsert_unchanged_sends_nothing(sent_events):
+    matrix_client = DedupingMatrixClient()
+
+    async def repeat():
+        for _ in range(3):
+            await _room(matrix_client).upsert_text("A", "status", sent_events)
+
+    asyncio.run(repeat())
+
+    assert len(matrix_client.sent) == 1
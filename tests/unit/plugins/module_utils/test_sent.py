@@ -0,0 +1,71 @@
+import sqlite3
+
+import pytest
+
+from ansible_collections.eraga.matrix.plugins.module_utils.sent import AnsibleMatrixSentEvents, content_hash, \
+    transaction_id
+
+ROOM_ID = "!room:example.com"
+
+
+@pytest.fixture
+def sent_events(tmp_path):
+    store = AnsibleMatrixSentEvents(str(tmp_path / "sent.db"))
+    yield store
+    store.close()
+
+
+def test_transaction_id_depends_on_room_content_and_key():
+    content = {"msgtype": "m.text", "body": "hello"}
+
+    assert transaction_id(ROOM_ID, content, "key") == transaction_id(ROOM_ID, dict(content), "key")
+    assert transaction_id(ROOM_ID, content, "key") != transaction_id(ROOM_ID, content, "other")
+    assert transaction_id(ROOM_ID, content, "key") != transaction_id("!other:example.com", content, "key")
+    assert transaction_id(ROOM_ID, content, "key") != transaction_id(ROOM_ID, {"msgtype": "m.text"}, "key")
+
+
+def test_content_hash_ignores_key_order():
+    assert content_hash({"a": 1, "b": 2}) == content_hash({"b": 2, "a": 1})
+
+
+def test_sent_event_is_remembered(sent_events):
+    assert sent_events.get("ansible-txn") is None
+
+    sent_events.put("ansible-txn", ROOM_ID, "$event")
+
+    assert sent_events.get("ansible-txn") == "$event"
+
+
+def test_upsert_latest_event_defaults_to_the_original(sent_events):
+    sent_events.put_upsert(ROOM_ID, "status", "$original", "hash-a")
+    assert sent_events.get_upsert(ROOM_ID, "status") == ("$original", "hash-a", "$original")
+
+    sent_events.put_upsert(ROOM_ID, "status", "$original", "hash-b", "$edit")
+    assert sent_events.get_upsert(ROOM_ID, "status") == ("$original", "hash-b", "$edit")
+
+
+def test_upserts_of_older_databases_get_the_latest_event_column(tmp_path):
+    path = str(tmp_path / "sent.db")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE upserts (room_id TEXT NOT NULL, key TEXT NOT NULL, event_id TEXT NOT NULL, "
+        "content_hash TEXT NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (room_id, key))"
+    )
+    db.execute("INSERT INTO upserts VALUES (?, ?, ?, ?, ?)", (ROOM_ID, "status", "$original", "hash-a", 0))
+    db.commit()
+    db.close()
+
+    sent_events = AnsibleMatrixSentEvents(path)
+    try:
+        assert sent_events.get_upsert(ROOM_ID, "status") == ("$original", "hash-a", "$original")
+    finally:
+        sent_events.close()
+
+
+def test_media_and_url_validators_are_remembered(sent_events):
+    sent_events.put_media("sha", "mxc://example.com/media", "image/png", 42)
+    sent_events.put_media_url("https://example.com/logo.png", '"etag"', None, "sha")
+
+    assert sent_events.get_media("sha") == ("mxc://example.com/media", "image/png", 42)
+    assert sent_events.get_media_url("https://example.com/logo.png") == ('"etag"', None, "sha")
+    assert sent_events.get_media("other") is None
@@ -0,0 +1,66 @@
+import pytest
+
+from ansible_collections.eraga.matrix.plugins.module_utils import snapshot as snapshot_utils
+from ansible_collections.eraga.matrix.plugins.module_utils.snapshot import AnsibleMatrixSnapshots, \
+    room_record_to_snapshot
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(snapshot_utils.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def snapshots(tmp_path):
+    store = AnsibleMatrixSnapshots(str(tmp_path / "snapshots.db"))
+    yield store
+    store.close()
+
+
+def test_snapshot_is_returned_within_ttl_only(snapshots, clock):
+    snapshots.put_room("!room:example.com", "#room:example.com", {'id': "!room:example.com"})
+
+    clock[0] += 299
+    assert snapshots.get_room(alias="#room:example.com", ttl=300) == {'id': "!room:example.com"}
+
+    clock[0] += 2
+    assert snapshots.get_room(alias="#room:example.com", ttl=300) is None
+    assert snapshots.get_room(room_id="!room:example.com") == {'id': "!room:example.com"}
+
+
+def test_latest_room_snapshot_wins_for_an_alias(snapshots, clock):
+    snapshots.put_room("!old:example.com", "#room:example.com", {'id': "!old:example.com"})
+    clock[0] += 1
+    snapshots.put_room("!new:example.com", "#room:example.com", {'id': "!new:example.com"})
+
+    assert snapshots.get_room(alias="#room:example.com")['id'] == "!new:example.com"
+
+
+def test_password_hash_is_never_stored(snapshots):
+    snapshots.put_user("@maria:example.com", {'name': "@maria:example.com", 'password_hash': "$2b$secret"})
+
+    assert snapshots.get_user("@maria:example.com") == {'name': "@maria:example.com"}
+
+
+def test_prune_deletes_expired_entries_under_prefix(snapshots, clock):
+    snapshots.put("lookup:old", 1)
+    snapshots.put("other:old", 2)
+    clock[0] += 100
+    snapshots.put("lookup:new", 3)
+
+    snapshots.prune("lookup:", 50)
+
+    assert snapshots.get("lookup:old") is None
+    assert snapshots.get("other:old") == 2
+    assert snapshots.get("lookup:new") == 3
+
+
+def test_room_record_snapshot_is_partial():
+    snapshot = room_record_to_snapshot({'room_id': "!room:example.com", 'federatable': True, 'encryption': None})
+
+    assert snapshot['id'] == "!room:example.com"
+    assert snapshot['federate'] is True
+    assert snapshot['encrypted'] is False
+    assert 'power_levels' not in snapshot